@@ -7,10 +7,20 @@ This Streamlit app demonstrates cohort analysis using the RepeatRadar package.
 
 import streamlit as st
 import pandas as pd
-from repeatradar import generate_cohort_data, plot_cohort_heatmap
-from utils.load_and_clean_sample_data import load_ecommerce_data, load_ecommerce_data_sample1, load_ecommerce_data_sample2, get_dataset_columns
-from utils.helper_functions import handle_generate_cohort_data
-from utils.loading_screen import show_simple_loading
+from utils.analysis_runs import cancel_analysis, is_analysis_running, show_analysis_status, start_analysis
+from utils.cache_info import display_cache_info
+from utils.dataset_manager import get_dataset_profile, get_likely_next_datasets, get_session_memory_figure, get_user_activity, is_dataset_loaded, load_ecommerce_data, prefetch_datasets
+from utils.dataset_registry import DATASET_REGISTRY, get_auto_columns, get_value_columns
+from utils.helper_functions import cached_cohort_heatmap, display_ready_table, format_bytes, show_paginated_table
+from utils.loading_screen import show_author_card, show_loading_progress
+from utils.profiling import start_rerun_profile
+from utils.warmup import get_warmup_progress, record_selection, schedule_warmup
+
+# Datasets and results are shared by reference across sessions (see utils.dataset_manager).
+# Copy-on-write makes every shallow view of them safe to modify: the first write copies the
+# touched column for that view only, so the shared frames never change. It is a process-wide
+# pandas option, so it is set here, at the entry point, rather than on import of a module.
+pd.set_option("mode.copy_on_write", True)
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -20,6 +30,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Stage timings of this rerun, recorded when ?profile=1 is in the URL (see utils.profiling)
+profiler = start_rerun_profile("home")
+
 # --- Header and Introduction ---
 st.title("📡 RepeatRadar: Interactive Cohort Analysis")
 
@@ -90,118 +103,89 @@ with st.expander("🚀 Getting Started with RepeatRadar in Python", expanded=Fal
     ```
     """)
 
-# --- Initial Data Loading with Caching ---
-@st.cache_data(ttl=86400)  # Cache both datasets for 24 hours
-def initialize_datasets():
-    """
-    Pre-load both datasets using caching for efficient access across sessions.
-    This runs once every 24 hours and is shared across all users.
-    """
-    data1 = load_ecommerce_data_sample1()
-    data2 = load_ecommerce_data_sample2()
-    cols1 = get_dataset_columns("E-commerce Data 1")
-    cols2 = get_dataset_columns("E-commerce Data 2")
-    
-    return {
-        "E-commerce Data 1": {"data": data1, "columns": cols1},
-        "E-commerce Data 2": {"data": data2, "columns": cols2}
-    }
-
-# Initialize cached datasets
-@st.cache_data(ttl=86400)
-def get_cached_datasets():
-    """Get all datasets with 24-hour caching."""
-    return initialize_datasets()
-
-# Check if datasets are already cached to show loading screen if needed
-if "datasets_loaded" not in st.session_state:
-    # Show loading screen while datasets are being cached for the first time
-    show_simple_loading()
-    st.info("🔄 Loading datasets into cache... This happens once every 24 hours and is shared across all users.")
-    
-    # Load datasets into cache (this only happens once every 24 hours)
-    cached_datasets = get_cached_datasets()
-    
-    # Mark as loaded to avoid showing loading screen again
-    st.session_state.datasets_loaded = True
-    st.rerun()
-else:
-    # Datasets are already cached, load them quickly
-    cached_datasets = get_cached_datasets()
-
-# --- Auto-detect columns for cohort analysis (moved here to be available for sidebar) ---
-def get_auto_columns(dataset_name, columns):
-    """Automatically get the date, customer, and value columns for the selected dataset."""
-    if not columns:
-        return None, None, None
-    if dataset_name == "E-commerce Data 1":
-        date_col = "InvoiceDateTime" if "InvoiceDateTime" in columns else columns[0]
-        cust_col = "CustomerID" if "CustomerID" in columns else columns[0]
-        value_col = "TotalPrice" if "TotalPrice" in columns else None
-    elif dataset_name == "E-commerce Data 2":
-        date_col = "OrderedDateTime" if "OrderedDateTime" in columns else columns[0]
-        cust_col = "Customer_Id" if "Customer_Id" in columns else columns[0]
-        value_col = None  # No default value column for Data 2
-    else:
-        date_col, cust_col, value_col = None, None, None
-    return date_col, cust_col, value_col
-
-# Get columns list for current dataset - now from cached data
-def get_current_dataset_info(selected_dataset):
-    """Get current dataset info from cache"""
-    if selected_dataset in cached_datasets:
-        return cached_datasets[selected_dataset]["columns"]
-    return []
+# --- Lazy Dataset Loading ---
+# Only the selected dataset is loaded, on first use, and it is then shared across all sessions
 
 # Initialize default dataset in session state if not present
 if "current_dataset" not in st.session_state:
-    st.session_state.current_dataset = "E-commerce Data 1"
-
-# Set current dataset data from cache
-current_dataset_info = cached_datasets.get(st.session_state.current_dataset, {})
-if current_dataset_info:
-    st.session_state.ecommerce_data_raw = current_dataset_info.get("data")
-    st.session_state.ecommerce_data_raw_columns = current_dataset_info.get("columns", [])
+    st.session_state.current_dataset = next(iter(DATASET_REGISTRY))
+
+with profiler.span("Dataset retrieval"):
+    if not is_dataset_loaded(st.session_state.current_dataset):
+        # Show the live progress of the first load; the page renders as soon as the dataset is ready
+        show_author_card()
+        load_ecommerce_data(st.session_state.current_dataset, progress=show_loading_progress(st.session_state.current_dataset))
+        st.rerun()
+    else:
+        # Dataset is already in memory, just point the session at it
+        load_ecommerce_data(st.session_state.current_dataset)
+
+with profiler.span("Prefetch and warm-up scheduling"):
+    # Load the datasets the user is likely to switch to next in the background
+    prefetch_datasets(get_likely_next_datasets(st.session_state.current_dataset))
+
+    # Compute every period combination of the default columns into the result cache in the background
+    current_schema = DATASET_REGISTRY[st.session_state.current_dataset]
+    schedule_warmup(
+        st.session_state.current_dataset,
+        st.session_state.get("ecommerce_data_raw"),
+        st.session_state.get("ecommerce_data_version"),
+        current_schema["date_column"],
+        current_schema["user_column"],
+        user_activity=get_user_activity(st.session_state.current_dataset, st.session_state.get("ecommerce_data_version"), current_schema["date_column"], current_schema["user_column"])
+    )
 
 columns_list = st.session_state.get("ecommerce_data_raw_columns", [])
 
 # --- Sidebar Controls ---
-with st.sidebar:
+with profiler.span("Sidebar"), st.sidebar:
     st.header("⚙️ Dashboard Controls")
     
     # Dataset Selection
     st.subheader("📊 Dataset Selection")
     selected_dataset = st.selectbox(
         "Choose a sample dataset:",
-        options=["E-commerce Data 1", "E-commerce Data 2", "Upload Your Own (Coming Soon)"],
-        index=0 if st.session_state.current_dataset == "E-commerce Data 1" else 1,
+        options=list(DATASET_REGISTRY) + ["Upload Your Own"],
+        index=list(DATASET_REGISTRY).index(st.session_state.current_dataset),
         key="main_dataset_selector",
         help="Select which dataset to analyze"
     )
     
     if st.button("📥 Load Dataset", type="primary", use_container_width=True):
-        with st.spinner(f"Loading {selected_dataset}..."):
-            # Update session state with cached data
-            if selected_dataset in cached_datasets:
-                st.session_state.current_dataset = selected_dataset
-                st.session_state.ecommerce_data_raw = cached_datasets[selected_dataset]["data"]
-                st.session_state.ecommerce_data_raw_columns = cached_datasets[selected_dataset]["columns"]
-                
-                # Clear existing analysis when switching datasets
-                if "cohort_data" in st.session_state:
-                    del st.session_state.cohort_data
-                if "cohort_data_percent" in st.session_state:
-                    del st.session_state.cohort_data_percent
-                
-                # Update columns list after loading new dataset
-                columns_list = st.session_state.get("ecommerce_data_raw_columns", [])
-                st.success(f"✅ {selected_dataset} loaded!")
-            else:
-                st.error("Dataset not available in cache.")
+        if selected_dataset in DATASET_REGISTRY:
+            load_ecommerce_data(selected_dataset, progress=show_loading_progress(selected_dataset))
+            st.session_state.current_dataset = selected_dataset
+            
+            # Clear existing analysis when switching datasets
+            cancel_analysis(forget=True)
+            if "cohort_data" in st.session_state:
+                del st.session_state.cohort_data
+            if "cohort_data_percent" in st.session_state:
+                del st.session_state.cohort_data_percent
+            
+            # Update columns list after loading new dataset
+            columns_list = st.session_state.get("ecommerce_data_raw_columns", [])
+            st.success(f"✅ {selected_dataset} loaded!")
+        else:
+            # Uploads are streamed on their own page instead of being loaded into memory
+            st.switch_page("pages/upload_your_own.py")
         st.rerun()  # Refresh to update the sidebar options
     
     st.caption("Once you switch datasets, press the button above to load it, and wait a bit.")
     
+    memory_figure = get_session_memory_figure(st.session_state.current_dataset, st.session_state.get("ecommerce_data_raw"))
+    if memory_figure:
+        st.caption(
+            f"💾 {format_bytes(memory_figure['shared_bytes'])} in memory, shared by all sessions. "
+            f"This session adds {format_bytes(memory_figure['session_bytes'])} instead of "
+            f"copying {format_bytes(memory_figure['saved_bytes'])} on every rerun."
+        )
+    
+    display_cache_info()
+    warmup_progress = get_warmup_progress(st.session_state.get("ecommerce_data_version"), current_schema["date_column"], current_schema["user_column"])
+    if warmup_progress:
+        st.caption(f"🔥 Warm-up: {warmup_progress[0]} of {warmup_progress[1]} period combinations precomputed")
+    
     
     # Display Options
     st.subheader("👁️ Display Options")
@@ -211,13 +195,8 @@ with st.sidebar:
     st.subheader("⚡ Advanced Analysis")
     st.caption("Configure value-based cohort analysis")
     
-    # Restrict value column options based on dataset
-    if selected_dataset == "E-commerce Data 1":
-        allowed_value_cols = [col for col in ['InvoiceNo', 'Quantity', 'StockCode', 'TotalPrice'] if col in columns_list]
-    elif selected_dataset == "E-commerce Data 2":
-        allowed_value_cols = [col for col in ['Sales', 'Profit', 'Product'] if col in columns_list]
-    else:
-        allowed_value_cols = []
+    # Restrict value column options to the ones registered for the dataset
+    allowed_value_cols = get_value_columns(selected_dataset, columns_list)
     
     value_column_options = [None] + allowed_value_cols
     
@@ -251,27 +230,42 @@ if st.session_state.get("ecommerce_data_raw") is not None:
     
     # --- Dataset Overview ---
     if show_dataset_overview:
-        st.header("📊 Dataset Overview")
+        with profiler.span("Dataset overview"):
+            st.header("📊 Dataset Overview")
         
-        # Create metrics in a nice layout
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            st.metric("📋 Dataset", selected_dataset)
-        with col2:
-            st.metric("📝 Transactions", f"{st.session_state.ecommerce_data_raw.shape[0]:,}")
-        with col3:
-            st.metric("📊 Columns", st.session_state.ecommerce_data_raw.shape[1])
-        with col4:
-            unique_customers = st.session_state.ecommerce_data_raw.iloc[:, 1].nunique() if st.session_state.ecommerce_data_raw.shape[1] > 1 else "N/A"
-            st.metric("👥 Customers", f"{unique_customers:,}" if unique_customers != "N/A" else "N/A")
+            # All figures come from the profile computed when the dataset was ingested
+            dataset_profile = get_dataset_profile(st.session_state.current_dataset)
         
-        with st.expander("📋 Raw Data Preview", expanded=True):
-            rows_to_show = st.slider("Number of rows to display:", min_value=5, max_value=500, value=100, step=5)
-            st.dataframe(
-                st.session_state.ecommerce_data_raw.head(rows_to_show),
-                use_container_width=True,
-                hide_index=True
-            )
+            # Create metrics in a nice layout
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("📋 Dataset", st.session_state.current_dataset)
+            with col2:
+                st.metric("📝 Transactions", f"{dataset_profile['row_count']:,}" if dataset_profile else "N/A")
+            with col3:
+                st.metric("📊 Columns", len(dataset_profile["column_stats"]) if dataset_profile else "N/A")
+            with col4:
+                unique_customers = dataset_profile["user_count"] if dataset_profile else None
+                st.metric("👥 Customers", f"{'~' if dataset_profile['approximate'] else ''}{unique_customers:,}" if unique_customers is not None else "N/A")
+        
+            if dataset_profile and dataset_profile["date_min"]:
+                st.caption(f"📅 Transactions from {dataset_profile['date_min'][:10]} to {dataset_profile['date_max'][:10]}")
+        
+            if dataset_profile:
+                with st.expander("🧮 Column Profile"):
+                    st.dataframe(
+                        pd.DataFrame.from_dict(dataset_profile["column_stats"], orient="index").rename_axis("column").reset_index(),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+        
+            with st.expander("📋 Raw Data Preview", expanded=True):
+                rows_to_show = st.slider("Number of rows to display:", min_value=5, max_value=500, value=100, step=5)
+                st.dataframe(
+                    st.session_state.ecommerce_data_raw.head(rows_to_show),
+                    use_container_width=True,
+                    hide_index=True
+                )
 
     # --- Auto-detect columns for cohort analysis ---
     date_column, customer_id_column, default_value_col = get_auto_columns(selected_dataset, columns_list)
@@ -306,41 +300,46 @@ if st.session_state.get("ecommerce_data_raw") is not None:
     # --- Generate Analysis ---
     can_generate = date_column is not None and customer_id_column is not None
 
+    def start_cohort_analysis():
+        # Analyses run in the background, so the page stays responsive (see utils.analysis_runs)
+        return start_analysis(
+            data=st.session_state.get("ecommerce_data_raw"),
+            date_column=date_column,
+            customer_id_column=customer_id_column,
+            cohort_period=cohort_period,
+            period_duration=period_duration,
+            value_column=value_column,
+            aggregation_function=aggregation_function,
+            dataset_version=st.session_state.get("ecommerce_data_version"),
+            user_activity=get_user_activity(st.session_state.current_dataset, st.session_state.get("ecommerce_data_version"), date_column, customer_id_column),
+            profiler=profiler
+        )
+
     # Auto-run analysis on first load or when user clicks button
-    if can_generate and "cohort_data" not in st.session_state:
-        with st.spinner("🔬 Generating initial cohort analysis..."):
-            handle_generate_cohort_data(
-                data=st.session_state.get("ecommerce_data_raw"),
-                date_column=date_column,
-                customer_id_column=customer_id_column,
-                cohort_period=cohort_period,
-                period_duration=period_duration,
-                value_column=value_column,
-                aggregation_function=aggregation_function,
-                output_format="pivot"
-            )
+    if can_generate and "cohort_data" not in st.session_state and "analysis_run" not in st.session_state:
+        record_selection(cohort_period, period_duration)
+        # Times the hand-off to the background pool; the computation is added as a span when published
+        with profiler.span("Analysis start"):
+            start_cohort_analysis()
+    elif can_generate and is_analysis_running():
+        # Settings changed while an analysis is in flight supersede it
+        start_cohort_analysis()
 
     # Create action buttons - two full width columns
     button_col1, button_col2 = st.columns(2)
     
     with button_col1:
         if st.button("🔄 Generate Analysis", type="primary", disabled=not can_generate, use_container_width=True):
-            with st.spinner("🔬 Calculating cohorts..."):
-                handle_generate_cohort_data(
-                    data=st.session_state.get("ecommerce_data_raw"),
-                    date_column=date_column,
-                    customer_id_column=customer_id_column,
-                    cohort_period=cohort_period,
-                    period_duration=period_duration,
-                    value_column=value_column,
-                    aggregation_function=aggregation_function,
-                    output_format="pivot"
-                )
-            st.success("✅ Analysis updated, see the heatmap and the data bellow!")
+            record_selection(cohort_period, period_duration)
+            with profiler.span("Analysis start"):
+                analysis_run = start_cohort_analysis()
+            if analysis_run is not None and analysis_run.published and analysis_run.error is None:
+                st.success("✅ Analysis updated, see the heatmap and the data bellow!")
     
     with button_col2:
         if st.button("🔄 Reset to Defaults", type="secondary", use_container_width=True):
             # Clear session state for fresh start
+            cancel_analysis(forget=True)
             if "cohort_data" in st.session_state:
                 del st.session_state.cohort_data
             if "cohort_data_percent" in st.session_state:
@@ -350,6 +349,9 @@ if st.session_state.get("ecommerce_data_raw") is not None:
     if not can_generate:
         st.error("⚠️ Could not auto-detect required columns for cohort analysis. Please check your dataset, maybe you switched dataset and did not click the 'Load Dataset' button.")
 
+    # Progress of an analysis in flight; its results replace the ones below when it finishes
+    show_analysis_status(profiler)
+
     # --- Results Display ---
     if st.session_state.get("cohort_data") is not None:
         st.header("📈 Analysis Results")
@@ -379,13 +381,15 @@ if st.session_state.get("ecommerce_data_raw") is not None:
                 show_colorscale = st.checkbox("Show Legend", value=False, key="show_colorscale")
 
         final_color_scale = f"{color_scale}{'_r' if reverse_colors else ''}"
-        cohort_heatmap = plot_cohort_heatmap(
-            cohort_data=st.session_state.cohort_data,
-            title=heatmap_title,
-            color_scale=final_color_scale,
-            show_colorscale=show_colorscale
-        )
-        st.plotly_chart(cohort_heatmap, use_container_width=True)
+        with profiler.span("Heatmap: main"):
+            cohort_heatmap = cached_cohort_heatmap(
+                "main",
+                cohort_data=st.session_state.cohort_data,
+                title=heatmap_title,
+                color_scale=final_color_scale,
+                show_colorscale=show_colorscale
+            )
+            st.plotly_chart(cohort_heatmap, use_container_width=True)
 
         # Interpretation guide
         with st.expander("💡 How to Interpret This Heatmap"):
@@ -414,9 +418,8 @@ if st.session_state.get("ecommerce_data_raw") is not None:
 
         # Show the main cohort data right after the heatmap
         st.subheader(f"📋 Data: {main_metric_label}")
-        df_display = st.session_state.cohort_data.copy().reset_index()
-        df_display['cohort_period'] = df_display['cohort_period'].dt.date
-        st.dataframe(df_display, use_container_width=True, hide_index=True)
+        with profiler.span("Table: main"):
+            show_paginated_table("main_table", display_ready_table(st.session_state.cohort_data))
 
 
 
@@ -442,19 +445,20 @@ if st.session_state.get("ecommerce_data_raw") is not None:
                     retention_show_colorscale = st.checkbox("Show Legend", value=False, key="retention_show_colorscale")
 
             retention_final_color_scale = f"{retention_color_scale}{'_r' if retention_reverse_colors else ''}"
-            retention_heatmap = plot_cohort_heatmap(
-                cohort_data=st.session_state.cohort_data_percent,
-                title="User Retention Rate (%)",
-                color_scale=retention_final_color_scale,
-                show_colorscale=retention_show_colorscale
-            )
-            st.plotly_chart(retention_heatmap, use_container_width=True)
+            with profiler.span("Heatmap: retention"):
+                retention_heatmap = cached_cohort_heatmap(
+                    "retention",
+                    cohort_data=st.session_state.cohort_data_percent,
+                    title="User Retention Rate (%)",
+                    color_scale=retention_final_color_scale,
+                    show_colorscale=retention_show_colorscale
+                )
+                st.plotly_chart(retention_heatmap, use_container_width=True)
             
             # Show retention data right after the retention heatmap
             st.subheader(f"📋 Data: {main_metric_label} Retention Percentages")
-            df_percent_display = st.session_state.cohort_data_percent.copy().reset_index()
-            df_percent_display['cohort_period'] = df_percent_display['cohort_period'].dt.date
-            st.dataframe(df_percent_display, use_container_width=True, hide_index=True)
+            with profiler.span("Table: retention"):
+                show_paginated_table("retention_table", display_ready_table(st.session_state.cohort_data_percent))
 
 # Since data is now cached and always available, we don't need the fallback loading screen
 
@@ -466,3 +470,5 @@ with st.sidebar:
     st.markdown("📚 [Documentation](https://krinya.github.io/repeatradar/)")
     st.markdown("👤 [My LinkedIn](https://www.linkedin.com/in/kristof-menyhert/)")
     st.markdown("💻 [Dashboard Code](https://github.com/krinya/repeatradar_demo)")
+
+profiler.finish()
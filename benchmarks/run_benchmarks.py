@@ -0,0 +1,269 @@
+"""
+Offline benchmark suite for the dashboard's data paths.
+
+Suites:
+    ingest  the load_ecommerce_data_sample* loaders, from CSV (cold) and from snapshot (warm)
+    cohort  handle_generate_cohort_data for every period, duration and aggregation in Home.py
+    render  plot_cohort_heatmap and the dashboard's cached heatmap, first render (cold) and
+            colour scale change (restyle), including JSON serialization
+
+Every suite runs on synthetic data at each requested scale and appends one JSON line per
+benchmark to the output file, with all timings and the library versions, so runs can be
+compared across upgrades:
+
+    python -m benchmarks.run_benchmarks --scales 100k,1M --output before.jsonl
+    python -m benchmarks.run_benchmarks --scales 100k,1M --output after.jsonl
+    python -m benchmarks.run_benchmarks --compare before.jsonl after.jsonl
+
+Run from the repository root. Nothing is downloaded: the data comes from
+utils.synthetic_data, and the generated CSVs are kept in benchmarks/.data for reuse.
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from importlib import metadata
+
+import plotly.io as pio
+import streamlit as st
+
+from repeatradar import plot_cohort_heatmap
+from utils import snapshot_cache
+from utils.cohort_engine import AGGREGATION_FUNCTIONS, COHORT_PERIODS, PERIOD_DURATIONS, compute_cohort_tables
+from utils.dataset_registry import DATASET_REGISTRY
+from utils.helper_functions import cached_cohort_heatmap, handle_generate_cohort_data
+from utils.load_and_clean_sample_data import load_ecommerce_data_sample1, load_ecommerce_data_sample2
+from utils.synthetic_data import parse_row_count, write_synthetic_csv
+
+SUITES = ["ingest", "cohort", "render"]
+
+AGGREGATIONS = [None] + AGGREGATION_FUNCTIONS
+
+DATA_DIR = os.path.join("benchmarks", ".data")
+
+LOADERS = {
+    "E-commerce Data 1": load_ecommerce_data_sample1,
+    "E-commerce Data 2": load_ecommerce_data_sample2,
+}
+
+
+def environment():
+    """Describe the machine and library versions a run used."""
+    versions = {}
+    for package in ["pandas", "numpy", "pyarrow", "streamlit", "plotly", "repeatradar"]:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "commit": commit,
+        "versions": versions,
+        "settings": {name: value for name, value in os.environ.items() if name.startswith("REPEATRADAR_")},
+    }
+
+
+def measure(function, repeat, setup=None):
+    """
+    Time a function.
+
+    Args:
+        function (callable): Code to time; its last return value is returned
+        repeat (int): Number of timed runs
+        setup (callable, optional): Untimed code run before each timed run
+
+    Returns:
+        tuple: (times in seconds, last return value)
+    """
+    times, result = [], None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return times, result
+
+
+class Recorder:
+    """Appends benchmark results as JSON lines and echoes a summary to the console."""
+
+    def __init__(self, path):
+        self.path = path
+        self.environment = environment()
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def record(self, suite, benchmark, scale, params, times, **extra):
+        result = {
+            "suite": suite,
+            "benchmark": benchmark,
+            "scale": scale,
+            "params": params,
+            "times_s": times,
+            "min_s": min(times),
+            "median_s": statistics.median(times),
+            "extra": extra,
+            "run_started_at": self.started_at,
+            "environment": self.environment,
+        }
+        with open(self.path, "a") as f:
+            f.write(json.dumps(result) + "\n")
+        print(f"{suite:7} {benchmark:28} {scale:>10,} {json.dumps(params):60} {result['median_s'] * 1000:10.1f} ms")
+
+
+@contextlib.contextmanager
+def synthetic_source(dataset_name, scale, seed):
+    """Point a registered dataset at a synthetic CSV of the given scale while benchmarking it."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    schema = DATASET_REGISTRY[dataset_name]
+    path = os.path.join(DATA_DIR, f"{schema['snapshot_name']}-{scale}-{seed}.csv")
+    if not os.path.exists(path):
+        print(f"Generating {path}...")
+        write_synthetic_csv(path, dataset_name, scale, seed)
+    original_path = schema["source_path"]
+    schema["source_path"] = path
+    try:
+        yield path
+    finally:
+        schema["source_path"] = original_path
+
+
+def clear_snapshots():
+    """Remove all snapshots so the next load ingests from CSV."""
+    for file_name in os.listdir(snapshot_cache.SNAPSHOT_DIR):
+        os.remove(os.path.join(snapshot_cache.SNAPSHOT_DIR, file_name))
+
+
+def bench_ingest(recorder, scale, args):
+    for dataset_name, loader in LOADERS.items():
+        with synthetic_source(dataset_name, scale, args.seed):
+            times, data = measure(loader, args.repeat, setup=clear_snapshots)
+            recorder.record("ingest", f"{loader.__name__}:csv", scale, {"dataset": dataset_name}, times, rows_out=len(data))
+            times, _ = measure(loader, args.repeat)
+            recorder.record("ingest", f"{loader.__name__}:snapshot", scale, {"dataset": dataset_name}, times, rows_out=len(data))
+
+
+def load_cleaned(dataset_name, scale, args):
+    """Load a synthetic dataset through its loader, for the suites that need cleaned data."""
+    with synthetic_source(dataset_name, scale, args.seed):
+        return LOADERS[dataset_name]()
+
+
+def bench_cohort(recorder, scale, args):
+    dataset_name = "E-commerce Data 1"
+    schema = DATASET_REGISTRY[dataset_name]
+    data = load_cleaned(dataset_name, scale, args)
+    for cohort_period in COHORT_PERIODS:
+        for period_duration in PERIOD_DURATIONS:
+            for aggregation_function in AGGREGATIONS:
+                value_column = schema["default_value_column"] if aggregation_function else None
+                params = {"cohort_period": cohort_period, "period_duration": period_duration,
+                          "value_column": value_column, "aggregation_function": aggregation_function}
+                # No dataset version, so nothing is served from the result cache
+                times, _ = measure(lambda: handle_generate_cohort_data(
+                    data, schema["date_column"], schema["user_column"], cohort_period, period_duration,
+                    value_column=value_column, aggregation_function=aggregation_function), args.repeat)
+                recorder.record("cohort", "handle_generate_cohort_data", scale, params, times,
+                                cohorts=len(st.session_state.cohort_data), periods=st.session_state.cohort_data.shape[1])
+
+
+def bench_render(recorder, scale, args):
+    dataset_name = "E-commerce Data 1"
+    schema = DATASET_REGISTRY[dataset_name]
+    data = load_cleaned(dataset_name, scale, args)
+    for cohort_period in COHORT_PERIODS:
+        for period_duration in PERIOD_DURATIONS:
+            counts = compute_cohort_tables(data, schema["date_column"], schema["user_column"], cohort_period, period_duration)["counts"]
+            params = {"cohort_period": cohort_period, "period_duration": period_duration, "cells": int(counts.size)}
+
+            times, payload = measure(lambda: pio.to_json(plot_cohort_heatmap(counts, title="Benchmark"), validate=False), args.repeat)
+            recorder.record("render", "plot_cohort_heatmap+json", scale, params, times, payload_bytes=len(payload))
+
+            def render_cached(color_scale="Blues"):
+                return pio.to_json(cached_cohort_heatmap("benchmark", counts, title="Benchmark", color_scale=color_scale), validate=False)
+
+            def forget_figures():
+                st.session_state.pop("heatmap_figures", None)
+            times, payload = measure(render_cached, args.repeat, setup=forget_figures)
+            recorder.record("render", "cached_cohort_heatmap+json", scale, params, times, payload_bytes=len(payload))
+
+            # A colour scale change on the same matrix, which restyles the session's figure
+            def prime_figure():
+                forget_figures()
+                render_cached("Blues")
+            times, payload = measure(lambda: render_cached("Viridis"), args.repeat, setup=prime_figure)
+            recorder.record("render", "cached_cohort_heatmap+json:restyle", scale, params, times, payload_bytes=len(payload))
+
+
+BENCHMARKS = {"ingest": bench_ingest, "cohort": bench_cohort, "render": bench_render}
+
+
+def compare(old_path, new_path, threshold):
+    """
+    Compare the median times of two result files.
+
+    Returns:
+        int: Number of benchmarks slower than threshold times their old median
+    """
+    def load(path):
+        with open(path) as f:
+            results = [json.loads(line) for line in f if line.strip()]
+        return {(r["suite"], r["benchmark"], r["scale"], json.dumps(r["params"], sort_keys=True)): r["median_s"] for r in results}
+
+    old, new = load(old_path), load(new_path)
+    regressions = 0
+    for key in sorted(old.keys() & new.keys(), key=lambda key: new[key] / old[key], reverse=True):
+        ratio = new[key] / old[key]
+        flag = "SLOWER" if ratio > threshold else ("faster" if ratio < 1 / threshold else "")
+        regressions += ratio > threshold
+        suite, benchmark, scale, params = key
+        print(f"{ratio:6.2f}x {flag:7} {suite:7} {benchmark:28} {scale:>10,} {params}")
+    print(f"{len(old.keys() & new.keys())} benchmarks compared, {regressions} slower than {threshold}x")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0], formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="100k,1M", help="Comma-separated row counts, e.g. 100k,1M,10M")
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"Comma-separated suites out of {', '.join(SUITES)}")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data")
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results", f"{datetime.now():%Y%m%d-%H%M%S}.jsonl"),
+                        help="JSON lines file results are appended to")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return 1 if compare(*args.compare, args.threshold) else 0
+
+    # Streamlit functions run in bare mode here and warn about the missing runtime on every call
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+    recorder = Recorder(args.output)
+    with tempfile.TemporaryDirectory(prefix="repeatradar-snapshots-") as snapshot_dir:
+        snapshot_cache.SNAPSHOT_DIR = snapshot_dir
+        for scale in [parse_row_count(scale) for scale in args.scales.split(",")]:
+            for suite in args.suites.split(","):
+                BENCHMARKS[suite](recorder, scale, args)
+    print(f"Results written to {recorder.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
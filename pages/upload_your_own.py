@@ -0,0 +1,129 @@
+import streamlit as st
+from utils.cohort_engine import INCREMENTAL_AGGREGATIONS
+from utils.helper_functions import cached_cohort_heatmap, display_ready_table, format_bytes, show_paginated_table
+from utils.upload_ingest import UPLOAD_CHUNK_ROWS, infer_upload_schema, read_upload_sample, stream_upload
+
+# Page configuration
+st.set_page_config(
+    page_title="Upload Your Own | RepeatRadar",
+    page_icon="📤",
+    layout="wide"
+)
+
+st.title("📤 Upload Your Own Data")
+
+st.markdown(f"""
+Upload a CSV export with one row per transaction. It needs at least a **date column** and a
+**user ID column**; a numeric column (e.g. revenue) enables value-based analysis.
+
+The file is streamed in chunks of {UPLOAD_CHUNK_ROWS:,} rows and never loaded whole: memory
+grows with the number of customers and their active periods, not with the number of rows.
+""")
+
+uploaded_file = st.file_uploader("Transactions CSV", type=["csv"])
+if uploaded_file is None:
+    st.info("💡 Upload a CSV file to get started.")
+    st.stop()
+
+sample = read_upload_sample(uploaded_file)
+inferred_schema = infer_upload_schema(sample)
+columns = list(sample.columns)
+
+# --- Schema ---
+st.header("🧾 Schema")
+st.caption(f"Detected from the first {len(sample):,} rows of {uploaded_file.name} ({format_bytes(uploaded_file.size)}). Adjust if needed.")
+
+schema_col1, schema_col2, schema_col3 = st.columns(3)
+with schema_col1:
+    date_column = st.selectbox(
+        "📅 Date Column",
+        options=columns,
+        index=columns.index(inferred_schema["date_column"]) if inferred_schema["date_column"] in columns else 0,
+        help="Column with the transaction date or timestamp"
+    )
+with schema_col2:
+    date_format = st.text_input(
+        "Date Format (optional)",
+        value=inferred_schema["date_format"] or "",
+        placeholder="e.g. %m/%d/%Y %H:%M",
+        help="strftime format of the date column, detected from the first rows; leave empty to detect it per value, which is much slower"
+    )
+with schema_col3:
+    user_column = st.selectbox(
+        "👥 User ID Column",
+        options=columns,
+        index=columns.index(inferred_schema["user_column"]) if inferred_schema["user_column"] in columns else 0,
+        help="Column identifying the user or customer"
+    )
+
+with st.expander("📋 Upload Preview"):
+    st.dataframe(sample.head(20), use_container_width=True, hide_index=True)
+
+# --- Analysis Configuration ---
+st.header("🔧 Analysis Configuration")
+
+config_col1, config_col2, config_col3, config_col4 = st.columns(4)
+with config_col1:
+    period_options = {"Daily": "D", "Weekly": "W", "Monthly": "M", "Quarterly": "Q", "Yearly": "Y"}
+    selected_period_display = st.selectbox("Cohort Grouping Period", options=list(period_options.keys()), index=2)
+    cohort_period = period_options[selected_period_display]
+with config_col2:
+    period_duration = st.selectbox("Period Duration (days)", options=[1, 7, 30, 90, 180, 365], index=2)
+with config_col3:
+    value_options = [None] + [column for column in inferred_schema["value_columns"] if column not in (date_column, user_column)]
+    value_column = st.selectbox("💰 Value Column (Optional)", options=value_options, index=0)
+with config_col4:
+    aggregation_function = st.selectbox(
+        "Aggregation Function",
+        options=list(INCREMENTAL_AGGREGATIONS),
+        disabled=value_column is None,
+        help="Medians need the whole column at once, so they are not available for streamed uploads"
+    )
+
+if st.button("🔄 Analyze Upload", type="primary", use_container_width=True, disabled=date_column == user_column):
+    schema = {"date_column": date_column, "user_column": user_column, "date_format": date_format or None}
+    progress_bar = st.progress(0.0, text="Reading upload...")
+
+    def report_progress(message, fraction):
+        progress_bar.progress(fraction if fraction is not None else 0.0, text=message)
+
+    try:
+        state = stream_upload(
+            uploaded_file,
+            schema,
+            cohort_period=cohort_period,
+            period_duration=period_duration,
+            value_column=value_column,
+            aggregation_function=aggregation_function,
+            progress=report_progress,
+        )
+    except (ValueError, TypeError) as e:
+        progress_bar.empty()
+        st.error(f"⚠️ Could not analyze the upload: {e}")
+    else:
+        progress_bar.progress(1.0, text=f"✅ {state.row_count:,} transactions of {state.user_count:,} users analyzed")
+        st.session_state.upload_tables = state.tables()
+        st.session_state.upload_skipped_rows = state.skipped_row_count
+        st.session_state.upload_value_label = f"{aggregation_function.title()} of {value_column}" if value_column else None
+
+# --- Results Display ---
+upload_tables = st.session_state.get("upload_tables")
+if upload_tables is not None and upload_tables["counts"].empty:
+    st.warning(
+        f"⚠️ No transactions to analyze: {st.session_state.get('upload_skipped_rows', 0):,} rows were skipped because "
+        "their date or user ID could not be read. Check the date column, date format and user ID column."
+    )
+elif upload_tables is not None:
+    st.header("📈 Analysis Results")
+    value_label = st.session_state.get("upload_value_label")
+    main_table = upload_tables["values"] if value_label else upload_tables["counts"]
+    main_metric_label = value_label or "User Count"
+
+    st.subheader(f"Cohort Analysis: {main_metric_label}")
+    st.plotly_chart(cached_cohort_heatmap("upload_main", main_table, title=f"Cohort Analysis: {main_metric_label}"), use_container_width=True)
+    st.subheader(f"📋 Data: {main_metric_label}")
+    show_paginated_table("upload_main_table", display_ready_table(main_table))
+
+    st.subheader("📊 User Retention Rate Analysis")
+    st.plotly_chart(cached_cohort_heatmap("upload_retention", upload_tables["retention"], title="User Retention Rate (%)"), use_container_width=True)
+    show_paginated_table("upload_retention_table", display_ready_table(upload_tables["retention"]))
@@ -0,0 +1,23 @@
+import sys
+
+import pandas as pd
+import pytest
+from utils.synthetic_data import generate_transactions
+
+
+@pytest.fixture(scope="session")
+def transactions():
+    """Synthetic E-commerce Data 1 transactions over two years, with guest rows without a CustomerID."""
+    return pd.concat(generate_transactions("E-commerce Data 1", 20_000, seed=1), ignore_index=True)
+
+
+@pytest.fixture(scope="session")
+def customer_transactions(transactions):
+    """The synthetic transactions of identified customers, as repeatradar needs them."""
+    return transactions.dropna(subset=["CustomerID"]).reset_index(drop=True)
+
+
+@pytest.fixture(autouse=True)
+def restore_main_module(monkeypatch):
+    """Undo AppTest replacing __main__ with its script, which spawned pool workers would rerun."""
+    monkeypatch.setitem(sys.modules, "__main__", sys.modules["__main__"])
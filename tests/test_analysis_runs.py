@@ -0,0 +1,33 @@
+import time
+
+from streamlit.testing.v1 import AppTest
+
+
+def analysis_page():
+    import pandas as pd
+    import streamlit as st
+    from utils.analysis_runs import show_analysis_status, start_analysis
+
+    if "analysis_run" not in st.session_state:
+        data = pd.DataFrame({"date": pd.to_datetime(["2024-01-01", "2024-02-01"]), "user": [1, 2]})
+        start_analysis(data, "date", "user", "M", 30, dataset_version="v1")
+    show_analysis_status()
+
+
+def test_unexpected_failures_are_shown_as_the_run_error(monkeypatch):
+    def fail(**kwargs):
+        raise MemoryError("out of memory")
+
+    monkeypatch.setattr("utils.analysis_runs.cached_cohort_tables", fail)
+    at = AppTest.from_function(analysis_page)
+    at.run()
+    # A run that did not finish within the inline wait is published by a later rerun
+    for _ in range(50):
+        if at.error:
+            break
+        time.sleep(0.1)
+        at.run()
+
+    assert not at.exception
+    assert [error.value for error in at.error] == ["The analysis failed: out of memory"]
+    assert at.session_state.analysis_run.compute_seconds is not None
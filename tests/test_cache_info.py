@@ -0,0 +1,57 @@
+import json
+import os
+import threading
+
+import utils.cache_info as cache_info
+import utils.precompute as precompute
+from utils.cohort_engine import compute_cohort_tables
+
+
+def test_precomputed_hits_are_counted(tmp_path, monkeypatch, customer_transactions):
+    tables = compute_cohort_tables(customer_transactions, "InvoiceDate", "CustomerID", "M", 30)
+    entries = []
+    for name in ["counts", "retention"]:
+        precompute.write_cohort_table(tables[name], str(tmp_path / f"{name}.parquet"))
+        entries.append({"version": "v1", "date_column": "InvoiceDate", "user_column": "CustomerID", "cohort_period": "M",
+                        "period_duration": 30, "value_column": None, "aggregation_function": None, "table": name,
+                        "path": f"{name}.parquet", "seconds": 1.5})
+    (tmp_path / precompute.MANIFEST_NAME).write_text(json.dumps({"datasets": {}, "tables": entries}))
+    monkeypatch.setattr(precompute, "_manifest_index", {"path": None, "mtime": None, "entries": {}, "bytes": 0})
+    monkeypatch.setattr(precompute, "_lookup_stats", {"hits": 0, "misses": 0, "compute_seconds_saved": 0.0})
+
+    assert precompute.load_precomputed_tables("v1", "InvoiceDate", "CustomerID", "M", 30, output_dir=str(tmp_path)) is not None
+    assert precompute.load_precomputed_tables("v1", "InvoiceDate", "CustomerID", "W", 7, output_dir=str(tmp_path)) is None
+    assert precompute.load_precomputed_tables("v1", "InvoiceDate", "CustomerID", "M", 30, output_dir=str(tmp_path), record=False) is not None
+
+    stats = precompute.get_precomputed_stats(str(tmp_path))
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["compute_seconds_saved"]) == (1, 1, 2, 1.5)
+    assert stats["current_bytes"] == sum(os.path.getsize(tmp_path / entry["path"]) for entry in entries)
+
+
+def test_metrics_report_every_cache():
+    metrics = cache_info.collect_cache_metrics()
+    assert list(metrics) == ["datasets", "results", "precomputed", "store"]
+    assert 'repeatradar_cache_hits_total{cache="precomputed"}' in cache_info.format_prometheus(metrics)
+
+
+def test_appended_metrics_leave_out_the_entries(tmp_path):
+    path = str(tmp_path / "metrics.jsonl")
+    cache_info.export_cache_metrics(path)
+    cache_info.export_cache_metrics(path)
+    with open(path) as f:
+        lines = [json.loads(line) for line in f]
+    assert len(lines) == 2 * 4
+    assert all("entry_stats" not in line and "hits" in line for line in lines)
+
+
+def test_metrics_file_has_a_single_writer(monkeypatch):
+    started = []
+    monkeypatch.setattr(cache_info, "_exporter", None)
+    monkeypatch.setattr(cache_info, "_export_periodically", lambda path, interval: started.append((path, interval)))
+    threads = [threading.Thread(target=cache_info.start_metrics_export, args=("metrics.prom", 15)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    cache_info._exporter.join(5)
+    assert started == [("metrics.prom", 15)]
@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+from repeatradar import generate_cohort_data
+from utils.cohort_engine import compute_cohort_tables
+
+
+@pytest.mark.parametrize("cohort_period", ["D", "W", "M", "Q", "Y"])
+@pytest.mark.parametrize("period_duration", [1, 7, 30, "M"])
+@pytest.mark.parametrize("output_format", ["pivot", "long"])
+def test_counts_and_retention_match_repeatradar(customer_transactions, cohort_period, period_duration, output_format):
+    tables = compute_cohort_tables(customer_transactions, "InvoiceDate", "CustomerID", cohort_period, period_duration, output_format=output_format)
+    for name, calculate_retention_rate in [("counts", False), ("retention", True)]:
+        expected = generate_cohort_data(customer_transactions, "InvoiceDate", "CustomerID", cohort_period=cohort_period,
+                                        period_duration=period_duration, output_format=output_format,
+                                        calculate_retention_rate=calculate_retention_rate)
+        pd.testing.assert_frame_equal(tables[name], expected)
+
+
+@pytest.mark.parametrize("value_column, aggregation_function", [
+    ("UnitPrice", "sum"),
+    ("UnitPrice", "mean"),
+    ("UnitPrice", "median"),
+    ("UnitPrice", "nunique"),
+    ("Quantity", "sum"),
+    ("Quantity", "mean"),
+    ("Quantity", "count"),
+    ("Quantity", "nunique"),
+    ("Description", "count"),
+    ("Description", "nunique"),
+])
+@pytest.mark.parametrize("cohort_period, period_duration", [("W", 7), ("M", 30), ("Q", 90)])
+@pytest.mark.parametrize("output_format", ["pivot", "long"])
+def test_values_match_repeatradar(customer_transactions, value_column, aggregation_function, cohort_period, period_duration, output_format):
+    tables = compute_cohort_tables(customer_transactions, "InvoiceDate", "CustomerID", cohort_period, period_duration,
+                                   value_column, aggregation_function, output_format)
+    expected = generate_cohort_data(customer_transactions, "InvoiceDate", "CustomerID", value_column=value_column,
+                                    aggregation_function=aggregation_function, cohort_period=cohort_period,
+                                    period_duration=period_duration, output_format=output_format)
+    pd.testing.assert_frame_equal(tables["values"], expected)
+
+
+@pytest.mark.parametrize("workers, aggregation_function", [(2, "sum"), (3, "mean")])
+def test_parallel_partitions_match_single_process(transactions, monkeypatch, workers, aggregation_function):
+    monkeypatch.setattr("utils.cohort_engine.PARALLEL_MIN_ROWS", 0)
+    single = compute_cohort_tables(transactions, "InvoiceDate", "CustomerID", "M", 30, "Quantity", aggregation_function, workers=1)
+    parallel = compute_cohort_tables(transactions, "InvoiceDate", "CustomerID", "M", 30, "Quantity", aggregation_function, workers=workers)
+    for name in ["counts", "retention", "values"]:
+        pd.testing.assert_frame_equal(parallel[name], single[name])
+
+
+def test_rejects_the_same_inputs_as_repeatradar(transactions):
+    with pytest.raises(ValueError, match="not found"):
+        compute_cohort_tables(transactions, "Missing", "CustomerID")
+    with pytest.raises(TypeError, match="datetime"):
+        compute_cohort_tables(transactions, "Country", "CustomerID")
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+from utils.cohort_engine import CohortState, compute_cohort_tables
+
+
+def batches(data, n_batches):
+    bounds = np.linspace(0, len(data), n_batches + 1).astype(int)
+    return [data.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def assert_same_tables(expected, actual):
+    for name in ["counts", "retention", "values"]:
+        if expected[name] is None:
+            assert actual[name] is None
+        else:
+            # Float sums and means may differ in the last bits from the summation order
+            pd.testing.assert_frame_equal(actual[name], expected[name], check_exact=False, rtol=1e-9)
+
+
+@pytest.fixture(scope="module")
+def by_date(transactions):
+    return transactions.sort_values("InvoiceDate", kind="stable").reset_index(drop=True)
+
+
+@pytest.mark.parametrize("cohort_period, period_duration", [("D", 1), ("W", 7), ("M", 30), ("Q", "M")])
+@pytest.mark.parametrize("value_column, aggregation_function", [
+    (None, "sum"),
+    ("UnitPrice", "sum"),
+    ("UnitPrice", "mean"),
+    ("UnitPrice", "nunique"),
+    ("Quantity", "sum"),
+    ("Quantity", "count"),
+    ("Quantity", "nunique"),
+    ("Description", "count"),
+    ("Description", "nunique"),
+])
+def test_batches_in_date_order_match_full_recompute(by_date, cohort_period, period_duration, value_column, aggregation_function):
+    state = CohortState("InvoiceDate", "CustomerID", cohort_period, period_duration, value_column, aggregation_function)
+    for batch in batches(by_date, 7):
+        state.update(batch)
+    expected = compute_cohort_tables(by_date, "InvoiceDate", "CustomerID", cohort_period, period_duration,
+                                     value_column, aggregation_function)
+    assert_same_tables(expected, state.tables())
+    assert state.row_count == by_date["CustomerID"].notna().sum()
+
+
+@pytest.mark.parametrize("output_format", ["pivot", "long"])
+def test_tables_after_every_batch_match_recompute_of_the_rows_so_far(by_date, output_format):
+    state = CohortState("InvoiceDate", "CustomerID", "W", 7, "UnitPrice", "nunique")
+    seen = 0
+    for batch in batches(by_date, 4):
+        state.update(batch)
+        seen += len(batch)
+        expected = compute_cohort_tables(by_date.iloc[:seen], "InvoiceDate", "CustomerID", "W", 7, "UnitPrice", "nunique", output_format)
+        assert_same_tables(expected, state.tables(output_format))
+
+
+def test_seeded_first_seen_dates_allow_batches_in_any_order(transactions):
+    shuffled = transactions.sample(frac=1, random_state=0)
+    state = CohortState("InvoiceDate", "CustomerID", "M", 30, "Quantity", "mean")
+    state.seed_first_seen(transactions.groupby("CustomerID")["InvoiceDate"].min())
+    for batch in batches(shuffled, 5):
+        state.update(batch)
+    expected = compute_cohort_tables(transactions, "InvoiceDate", "CustomerID", "M", 30, "Quantity", "mean")
+    assert_same_tables(expected, state.tables())
+
+
+def test_rows_predating_a_known_user_are_rejected(by_date):
+    state = CohortState("InvoiceDate", "CustomerID").update(by_date.iloc[len(by_date) // 2:])
+    with pytest.raises(ValueError, match="predate"):
+        state.update(by_date.iloc[:len(by_date) // 2])
+
+
+def test_empty_state_has_empty_tables():
+    tables = CohortState("InvoiceDate", "CustomerID").tables()
+    assert tables["counts"].empty and tables["retention"].empty and tables["values"] is None
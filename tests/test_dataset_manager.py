@@ -0,0 +1,77 @@
+import threading
+import time
+
+import pytest
+import utils.dataset_manager as dataset_manager
+
+DATASET = "E-commerce Data 1"
+
+
+@pytest.fixture(scope="module")
+def cleaned(customer_transactions):
+    """The synthetic transactions with the columns of the cleaned dataset."""
+    return customer_transactions.rename(columns={"InvoiceDate": "InvoiceDateTime"})
+
+
+@pytest.fixture
+def store(monkeypatch, cleaned):
+    """The dataset store with loads served from the synthetic transactions."""
+    monkeypatch.setattr(dataset_manager, "get_dataset_version", lambda name: "v1")
+    monkeypatch.setattr(dataset_manager, "get_dataset_info", lambda name: None)
+    monkeypatch.setattr(dataset_manager, "load_dataset", lambda name, progress=None: cleaned)
+    dataset_manager.invalidate_dataset()
+    yield dataset_manager
+    dataset_manager.invalidate_dataset()
+
+
+def test_interrupted_load_is_retried_by_a_waiting_session(store, monkeypatch, cleaned):
+    waiting = threading.Event()
+    loads = []
+
+    def load_dataset(name, progress=None):
+        loads.append(name)
+        if len(loads) == 1:
+            # The loading session is interrupted while another one waits for it
+            assert waiting.wait(5)
+            time.sleep(0.2)
+            raise KeyboardInterrupt
+        return cleaned
+
+    monkeypatch.setattr(dataset_manager, "load_dataset", load_dataset)
+    results = []
+
+    def waiter():
+        while DATASET not in store._futures:
+            time.sleep(0.01)
+        waiting.set()
+        results.append(store.get_versioned_dataset(DATASET))
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    with pytest.raises(KeyboardInterrupt):
+        store.get_versioned_dataset(DATASET)
+    thread.join(10)
+
+    assert len(loads) == 2
+    assert len(results) == 1 and results[0][1] == "v1" and len(results[0][0]) == len(cleaned)
+    assert store.is_dataset_loaded(DATASET)
+
+
+def test_failed_load_is_forgotten_and_retried(store, monkeypatch):
+    def load_dataset(name, progress=None):
+        raise OSError("source missing")
+
+    monkeypatch.setattr(dataset_manager, "load_dataset", load_dataset)
+    with pytest.raises(OSError):
+        store.get_versioned_dataset(DATASET)
+    assert DATASET not in store._futures
+
+
+def test_failing_progress_listener_does_not_fail_the_load(store, caplog):
+    def listener(event):
+        raise RuntimeError("display gone")
+
+    data, version = store.get_versioned_dataset(DATASET, progress=listener)
+
+    assert version == "v1" and store.is_dataset_loaded(DATASET)
+    assert "Progress listener of the E-commerce Data 1 load failed" in caplog.text
@@ -0,0 +1,37 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from utils.dataset_profile import DISTINCT_SKETCH_SIZE, estimate_distinct, profile_dataset
+
+
+@pytest.mark.parametrize("n_distinct", [50_000, 300_000])
+def test_estimate_distinct_stays_within_three_standard_errors(n_distinct):
+    rng = np.random.default_rng(n_distinct)
+    values = pd.Series(rng.integers(0, n_distinct, size=2 * n_distinct)).astype(str)
+    exact = values.nunique()
+    estimate = estimate_distinct(values, chunk_size=100_000)
+    assert abs(estimate - exact) / exact < 3 / np.sqrt(DISTINCT_SKETCH_SIZE)
+
+
+def test_estimate_distinct_is_exact_below_the_sketch_size():
+    values = pd.Series([1.5, 2.5, None, 1.5, 3.0] * 100)
+    assert estimate_distinct(values, chunk_size=7) == 3
+
+
+def test_approximate_profile_matches_exact_one_on_small_frames(transactions):
+    exact = profile_dataset(transactions, "InvoiceDate", "CustomerID")
+    approximate = profile_dataset(transactions, "InvoiceDate", "CustomerID", approximate=True)
+
+    assert not exact["approximate"] and approximate["approximate"]
+    assert exact["user_count"] == transactions["CustomerID"].nunique()
+    for column, stats in exact["column_stats"].items():
+        estimated = dict(approximate["column_stats"][column])
+        distinct = estimated.pop("distinct")
+        assert abs(distinct - stats["distinct"]) <= 3 / np.sqrt(DISTINCT_SKETCH_SIZE) * stats["distinct"]
+        assert estimated == {name: value for name, value in stats.items() if name != "distinct"}
+    assert exact["row_count"] == len(transactions)
+    assert exact["date_min"] == transactions["InvoiceDate"].min().isoformat()
+    assert exact["column_stats"]["CustomerID"]["nulls"] == transactions["CustomerID"].isna().sum()
+    assert json.loads(json.dumps(exact)) == exact
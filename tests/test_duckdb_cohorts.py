@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+from utils.cohort_engine import compute_cohort_tables
+
+pytest.importorskip("duckdb")
+from utils.duckdb_cohorts import compute_cohort_tables_duckdb  # noqa: E402
+
+
+def assert_same_tables(expected, actual):
+    for name in ["counts", "retention", "values"]:
+        if expected[name] is None:
+            assert actual[name] is None
+        else:
+            pd.testing.assert_frame_equal(actual[name], expected[name], check_exact=False, rtol=1e-9)
+
+
+@pytest.mark.parametrize("cohort_period", ["D", "W", "M", "Q", "Y"])
+@pytest.mark.parametrize("period_duration", [7, 30, "Q"])
+@pytest.mark.parametrize("output_format", ["pivot", "long"])
+def test_counts_and_retention_match_pandas_engine(transactions, cohort_period, period_duration, output_format):
+    expected = compute_cohort_tables(transactions, "InvoiceDate", "CustomerID", cohort_period, period_duration, output_format=output_format)
+    actual = compute_cohort_tables_duckdb(transactions, "InvoiceDate", "CustomerID", cohort_period, period_duration, output_format=output_format)
+    assert_same_tables(expected, actual)
+
+
+@pytest.mark.parametrize("value_column, aggregation_function", [
+    ("UnitPrice", "sum"),
+    ("UnitPrice", "mean"),
+    ("UnitPrice", "median"),
+    ("Quantity", "sum"),
+    ("Quantity", "count"),
+    ("Quantity", "nunique"),
+    ("Description", "count"),
+    ("Description", "nunique"),
+])
+@pytest.mark.parametrize("output_format", ["pivot", "long"])
+def test_values_match_pandas_engine(transactions, value_column, aggregation_function, output_format):
+    expected = compute_cohort_tables(transactions, "InvoiceDate", "CustomerID", "M", 30, value_column, aggregation_function, output_format)
+    actual = compute_cohort_tables_duckdb(transactions, "InvoiceDate", "CustomerID", "M", 30, value_column, aggregation_function, output_format)
+    assert_same_tables(expected, actual)
+
+
+def test_reads_parquet_files_with_string_dates(transactions, tmp_path):
+    path = tmp_path / "transactions.parquet"
+    transactions.assign(InvoiceDate=transactions["InvoiceDate"].dt.strftime("%d/%m/%Y %H:%M")).to_parquet(path)
+    expected = compute_cohort_tables(transactions, "InvoiceDate", "CustomerID", "W", 7)
+    actual = compute_cohort_tables_duckdb(str(path), "InvoiceDate", "CustomerID", "W", 7, date_format="%d/%m/%Y %H:%M")
+    assert_same_tables(expected, actual)
+
+
+@pytest.mark.parametrize("memory_limit", ["4GB'; DROP TABLE x; --", "lots", "80%"])
+def test_rejects_invalid_memory_limit(transactions, memory_limit):
+    with pytest.raises(ValueError, match="memory_limit"):
+        compute_cohort_tables_duckdb(transactions, "InvoiceDate", "CustomerID", memory_limit=memory_limit)
+
+
+def test_date_format_is_not_spliced_into_sql(transactions):
+    data = transactions.assign(InvoiceDate=transactions["InvoiceDate"].dt.strftime("%Y-%m-%d'"))
+    tables = compute_cohort_tables_duckdb(data, "InvoiceDate", "CustomerID", date_format="%Y-%m-%d'")
+    assert tables["counts"].to_numpy().sum() > 0
@@ -0,0 +1,32 @@
+import numpy as np
+from utils.cohort_engine import assign_cohorts, precompute_user_activity
+from utils.parallel_cohorts import _partial_matrices, _share
+
+
+def shared_partition(transactions, cancelled):
+    assignment = assign_cohorts(precompute_user_activity(transactions, "InvoiceDate", "CustomerID"), "M", 30)
+    arrays = {name: assignment[name] for name in ("user_codes", "cohort_index", "period_number")}
+    arrays["cancelled"] = np.array([cancelled], dtype=np.uint8)
+    blocks, spec = _share(arrays)
+    n_periods = assignment["n_periods"]
+    return blocks, spec, len(assignment["user_codes"]), len(assignment["cohorts"]) * n_periods, n_periods
+
+
+def test_partition_stops_once_cancelled(transactions):
+    for cancelled, finished in [(0, True), (1, False)]:
+        blocks, spec, n_rows, n_cells, n_periods = shared_partition(transactions, cancelled)
+        try:
+            result = _partial_matrices(spec, 0, n_rows, n_cells, n_periods, None)
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+        assert (result is not None) == finished
+
+
+def test_partition_started_after_cleanup_returns_nothing(transactions):
+    blocks, spec, n_rows, n_cells, n_periods = shared_partition(transactions, 0)
+    for block in blocks:
+        block.close()
+        block.unlink()
+    assert _partial_matrices(spec, 0, n_rows, n_cells, n_periods, None) is None
@@ -0,0 +1,55 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+import utils.precompute as precompute
+from utils.cohort_engine import compute_cohort_tables
+
+
+@pytest.fixture
+def output_dir(tmp_path, monkeypatch, customer_transactions):
+    """A precomputed directory with the monthly tables of version v1, and a fresh manifest index."""
+    tables = compute_cohort_tables(customer_transactions, "InvoiceDate", "CustomerID", "M", 30)
+    for name in ["counts", "retention"]:
+        precompute.write_cohort_table(tables[name], str(tmp_path / f"{name}.parquet"))
+    monkeypatch.setattr(precompute, "_manifest_index", {"path": None, "mtime": None, "entries": {}, "bytes": 0})
+    monkeypatch.setattr(precompute, "_lookup_stats", {"hits": 0, "misses": 0, "compute_seconds_saved": 0.0})
+    return tmp_path, tables
+
+
+def _write_manifest(output_dir, text, mtime):
+    path = output_dir / precompute.MANIFEST_NAME
+    path.write_text(text)
+    os.utime(path, (mtime, mtime))
+
+
+def _manifest_text():
+    return json.dumps({"datasets": {}, "tables": [
+        {"version": "v1", "date_column": "InvoiceDate", "user_column": "CustomerID", "cohort_period": "M",
+         "period_duration": 30, "value_column": None, "aggregation_function": None, "table": name,
+         "path": f"{name}.parquet", "seconds": 1.0}
+        for name in ["counts", "retention"]
+    ]})
+
+
+def test_precomputed_tables_are_read_back(output_dir):
+    directory, tables = output_dir
+    _write_manifest(directory, _manifest_text(), 1_000_000)
+    main_table, retention_table = precompute.load_precomputed_tables("v1", "InvoiceDate", "CustomerID", "M", 30,
+                                                                     output_dir=str(directory))
+    pd.testing.assert_frame_equal(main_table, tables["counts"], check_names=False, check_index_type=False)
+    pd.testing.assert_frame_equal(retention_table, tables["retention"], check_names=False, check_index_type=False)
+
+
+@pytest.mark.parametrize("text", ['{"datasets": {}, "tables": [{"versi', '{"datasets": {}}', "[]"])
+def test_unreadable_manifest_counts_as_no_tables(output_dir, text, caplog):
+    directory, _ = output_dir
+    _write_manifest(directory, text, 1_000_000)
+    assert precompute.load_precomputed_tables("v1", "InvoiceDate", "CustomerID", "M", 30, output_dir=str(directory)) is None
+    assert "could not read" in caplog.text
+    assert precompute.get_precomputed_stats(str(directory))["entries"] == 0
+
+    # The next precompute run replaces the manifest, and its tables are used again
+    _write_manifest(directory, _manifest_text(), 1_000_001)
+    assert precompute.load_precomputed_tables("v1", "InvoiceDate", "CustomerID", "M", 30, output_dir=str(directory)) is not None
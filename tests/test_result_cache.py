@@ -0,0 +1,50 @@
+import pandas as pd
+from utils.result_cache import ResultCache, cohort_cache_key, estimate_size
+
+
+def frame(rows):
+    return pd.DataFrame({"value": range(rows)}, dtype="int64")
+
+
+def test_least_recently_used_entries_are_evicted_beyond_the_byte_budget():
+    entry_bytes = estimate_size(frame(100))
+    cache = ResultCache(3 * entry_bytes)
+    for key in "abc":
+        cache.put(key, frame(100))
+    # Reading a makes b the least recently used entry
+    assert cache.get("a") is not None
+    cache.put("d", frame(100))
+
+    assert [entry["key"] for entry in cache.entry_stats()] == ["c", "a", "d"]
+    assert cache.get("b") is None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["current_bytes"] == 3 * entry_bytes
+
+
+def test_values_larger_than_the_budget_are_not_cached():
+    cache = ResultCache(estimate_size(frame(10)))
+    cache.put("small", frame(10))
+    cache.put("large", frame(1000))
+    assert cache.get("large") is None
+    assert cache.get("small") is not None
+
+
+def test_hits_credit_the_compute_time_they_saved():
+    cache = ResultCache(1 << 20)
+    cache.put("a", {"counts": frame(10), "values": None}, compute_seconds=2.0)
+    cache.get("a")
+    cache.get("a")
+    cache.get("a", record=False)
+    cache.get("missing")
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["compute_seconds_saved"]) == (2, 1, 4.0)
+    assert cache.entry_stats()[0]["hits"] == 2
+
+
+def test_cache_key_covers_every_setting():
+    settings = ("v1", "InvoiceDate", "CustomerID", "M", 30, "Quantity", "sum", True, "pivot")
+    keys = {cohort_cache_key(*settings)}
+    for i, changed in enumerate(["v2", "Date", "User", "W", 7, "UnitPrice", "mean", False, "long"]):
+        keys.add(cohort_cache_key(*settings[:i], changed, *settings[i + 1:]))
+    assert len(keys) == len(settings) + 1
@@ -0,0 +1,63 @@
+import os
+
+import pandas as pd
+from utils.cohort_engine import compute_cohort_tables
+from utils.result_store import ResultStore
+
+
+def frame(rows):
+    return pd.DataFrame({"value": range(rows)}, dtype="int64")
+
+
+def test_stored_tables_are_read_back_and_credit_their_compute_time(tmp_path, customer_transactions):
+    table = compute_cohort_tables(customer_transactions, "InvoiceDate", "CustomerID", "M", 30)["retention"]
+    store = ResultStore(str(tmp_path), 1 << 30)
+    store.put(("v1", "retention"), table, compute_seconds=2.5)
+
+    pd.testing.assert_frame_equal(store.get(("v1", "retention")), table)
+    assert store.get(("v2", "retention")) is None
+    stats = store.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["compute_seconds_saved"]) == (1, 1, 1, 2.5)
+    # Files are moved into place, so no temporary file is left behind
+    assert [name for name in os.listdir(tmp_path) if not name.endswith(".arrow")] == []
+
+
+def test_least_recently_used_files_are_evicted_beyond_the_byte_budget(tmp_path):
+    probe = ResultStore(str(tmp_path / "probe"), 1 << 30)
+    probe.put("probe", frame(100))
+    file_bytes = probe.stats()["current_bytes"]
+
+    store = ResultStore(str(tmp_path / "store"), 3 * file_bytes)
+    for age, key in zip([30, 20, 10], "abc"):
+        store.put(key, frame(100))
+        # Modification times are the recency order; give each file a distinct one
+        modified_at = os.path.getmtime(store._path(key)) - age
+        os.utime(store._path(key), (modified_at, modified_at))
+    # Reading a refreshes its modification time, so b becomes the least recently used
+    assert store.get("a") is not None
+    store.put("d", frame(100))
+
+    assert store.get("b") is None
+    assert all(store.get(key) is not None for key in "acd")
+    assert store.stats()["evictions"] == 1
+    assert store.stats()["current_bytes"] <= 3 * file_bytes
+
+
+def test_unreadable_files_are_misses(tmp_path):
+    store = ResultStore(str(tmp_path), 1 << 30)
+    store.put("a", frame(10))
+    with open(store._path("a"), "r+b") as f:
+        f.truncate(16)
+
+    assert store.get("a") is None
+    assert store.stats()["misses"] == 1
+    # The next computation overwrites it
+    store.put("a", frame(10))
+    pd.testing.assert_frame_equal(store.get("a"), frame(10))
+
+
+def test_a_zero_budget_disables_the_store(tmp_path):
+    store = ResultStore(str(tmp_path / "store"), 0)
+    store.put("a", frame(10))
+    assert store.get("a") is None
+    assert not os.path.exists(tmp_path / "store")
@@ -0,0 +1,67 @@
+import os
+
+import pandas as pd
+import pytest
+import utils.snapshot_cache as snapshot_cache
+from utils.snapshot_cache import load_with_snapshot, read_snapshot_metadata, snapshot_path
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot_cache, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    path = tmp_path / "source.csv"
+    path.write_text("InvoiceDate,CustomerID\n")
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def cleaned(customer_transactions):
+    return customer_transactions.head(500).astype({"Country": "category"})
+
+
+def load(source, cleaned, cleaning_version, builds):
+    def build():
+        builds.append(cleaning_version)
+        return cleaned
+    return load_with_snapshot("sample", source, cleaning_version, build, "InvoiceDate", user_column="CustomerID")
+
+
+def test_snapshot_is_reused_until_the_cleaning_version_changes(source, cleaned):
+    builds = []
+    pd.testing.assert_frame_equal(load(source, cleaned, 1, builds), cleaned)
+    pd.testing.assert_frame_equal(load(source, cleaned, 1, builds), cleaned)
+    assert builds == [1]
+
+    load(source, cleaned, 2, builds)
+    assert builds == [1, 2]
+    # The stale snapshot of version 1 is replaced by the one of version 2
+    assert os.listdir(snapshot_cache.SNAPSHOT_DIR) == [os.path.basename(snapshot_path("sample", source, 2))]
+
+
+def test_changed_source_file_invalidates_the_snapshot(source, cleaned):
+    builds = []
+    load(source, cleaned, 1, builds)
+    with open(source, "a") as f:
+        f.write("12/01/2010 08:26,17850\n")
+    load(source, cleaned, 1, builds)
+    assert builds == [1, 1]
+
+
+def test_unreadable_snapshot_is_rebuilt(source, cleaned):
+    builds = []
+    load(source, cleaned, 1, builds)
+    path = snapshot_path("sample", source, 1)
+    with open(path, "r+b") as f:
+        f.truncate(100)
+    assert read_snapshot_metadata(path) is None
+    pd.testing.assert_frame_equal(load(source, cleaned, 1, builds), cleaned)
+    assert builds == [1, 1]
+
+
+def test_snapshot_footer_describes_the_frame_without_reading_rows(source, cleaned):
+    load(source, cleaned, 1, [])
+    metadata = read_snapshot_metadata(snapshot_path("sample", source, 1))
+    assert metadata["columns"] == list(cleaned.columns)
+    assert metadata["dtypes"]["Country"] == "category"
+    assert metadata["row_count"] == len(cleaned)
+    assert metadata["profile"]["row_count"] == len(cleaned)
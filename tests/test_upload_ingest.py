@@ -0,0 +1,73 @@
+import io
+
+import pandas as pd
+import pytest
+from streamlit.testing.v1 import AppTest
+from utils.cohort_engine import compute_cohort_tables
+from utils.upload_ingest import infer_date_format, infer_upload_schema, read_upload_sample, stream_upload
+
+
+class Upload(io.BytesIO):
+    """In-memory stand-in for the UploadedFile st.file_uploader returns."""
+
+    def __init__(self, content, name="transactions.csv"):
+        super().__init__(content)
+        self.name = name
+        self.size = len(content)
+
+
+@pytest.fixture(scope="module")
+def upload_csv(customer_transactions):
+    rows = customer_transactions[["InvoiceDate", "CustomerID", "UnitPrice"]].sample(frac=1, random_state=0)
+    rows = rows.assign(InvoiceDate=rows["InvoiceDate"].dt.strftime("%d/%m/%Y %H:%M"), CustomerID=rows["CustomerID"].astype(int))
+    return rows.to_csv(index=False).encode()
+
+
+def test_infer_date_format_reads_day_first_columns_day_first():
+    assert infer_date_format(pd.Series(["01/02/2011 08:26", "13/09/2011 10:00"])) == "%d/%m/%Y %H:%M"
+    assert infer_date_format(pd.Series(["2011-02-01", "not a date"])) is None
+
+
+def test_inferred_schema_of_an_upload(upload_csv):
+    schema = infer_upload_schema(read_upload_sample(Upload(upload_csv)))
+    assert schema["date_column"] == "InvoiceDate"
+    assert schema["user_column"] == "CustomerID"
+    assert schema["value_columns"] == ["UnitPrice"]
+    assert schema["date_format"] == "%d/%m/%Y %H:%M"
+
+
+def test_streamed_unsorted_upload_matches_full_recompute(upload_csv, customer_transactions):
+    schema = {"date_column": "InvoiceDate", "user_column": "CustomerID", "date_format": "%d/%m/%Y %H:%M"}
+    state = stream_upload(Upload(upload_csv), schema, "M", 30, "UnitPrice", "sum", chunk_rows=3000)
+
+    data = customer_transactions.assign(
+        InvoiceDate=customer_transactions["InvoiceDate"].dt.floor("min"),
+        CustomerID=customer_transactions["CustomerID"].astype(int).astype(str),
+    )
+    expected = compute_cohort_tables(data, "InvoiceDate", "CustomerID", "M", 30, "UnitPrice", "sum")
+    tables = state.tables()
+    pd.testing.assert_frame_equal(tables["counts"], expected["counts"])
+    pd.testing.assert_frame_equal(tables["values"], expected["values"], check_exact=False, rtol=1e-9)
+    assert state.row_count == len(customer_transactions)
+    assert state.skipped_row_count == 0
+
+
+def test_all_invalid_upload_gives_empty_tables():
+    content = b"date,user,amount\nnot a date,1,2.5\n2011-01-04,,3\n,2,1\n"
+    state = stream_upload(Upload(content), {"date_column": "date", "user_column": "user"})
+    assert state.tables()["counts"].empty
+    assert state.row_count == 0
+    assert state.skipped_row_count == 3
+
+
+def test_upload_page_warns_instead_of_plotting_an_all_invalid_upload(monkeypatch):
+    content = b"date,user,amount\nnot a date,1,2.5\nneither,2,3\n2011-01-04,,1\n"
+    monkeypatch.setattr("streamlit.file_uploader", lambda *args, **kwargs: Upload(content))
+
+    app = AppTest.from_file("../pages/upload_your_own.py", default_timeout=30).run()
+    app.button[0].click().run()
+
+    assert not app.exception
+    assert len(app.warning) == 1
+    assert "3 rows were skipped" in app.warning[0].value
+    assert not app.get("plotly_chart")
@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import Counter
+
+import pytest
+import utils.helper_functions as helper_functions
+import utils.warmup as warmup
+from utils.result_cache import ResultCache
+from utils.result_store import ResultStore
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    """A fresh result cache behind cached_cohort_tables, with no store or precomputed tables."""
+    cache = ResultCache(64 << 20)
+    monkeypatch.setattr(helper_functions, "get_result_cache", lambda: cache)
+    monkeypatch.setattr(helper_functions, "get_result_store", lambda: ResultStore("unused", 0))
+    monkeypatch.setattr(helper_functions, "load_precomputed_tables", lambda *args, **kwargs: None)
+    return cache
+
+
+@pytest.fixture
+def slow_computations(monkeypatch):
+    """Count computations and make each take long enough for callers to overlap."""
+    started = []
+    compute_cohort_tables = helper_functions.compute_cohort_tables
+
+    def slow_compute(**kwargs):
+        started.append(kwargs["cohort_period"])
+        time.sleep(0.3)
+        return compute_cohort_tables(**kwargs)
+
+    monkeypatch.setattr(helper_functions, "compute_cohort_tables", slow_compute)
+    return started
+
+
+def tables(transactions, background=False):
+    return helper_functions.cached_cohort_tables(transactions, "v1", "InvoiceDate", "CustomerID", "M", 30, background=background)
+
+
+def test_claim_is_shared_until_released():
+    cache = ResultCache(1 << 20)
+    future, is_owner = cache.claim("key")
+    assert is_owner
+    assert cache.claim("key") == (future, False)
+    future.set_result("tables")
+    cache.release("key", future)
+    assert cache.claim("key")[1]
+
+
+def test_callers_wait_for_the_computation_in_flight(cache, slow_computations, transactions):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(tables(transactions))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert slow_computations == ["M"]
+    assert len(results) == 3 and all(result is results[0] for result in results)
+
+
+def test_background_callers_skip_tables_in_flight_and_are_not_counted(cache, slow_computations, transactions):
+    owner = threading.Thread(target=tables, args=(transactions,))
+    owner.start()
+    while not slow_computations:
+        time.sleep(0.01)
+    assert tables(transactions, background=True) is None
+    owner.join(10)
+
+    assert tables(transactions, background=True) is not None
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (0, 2)
+
+
+def test_warmup_fills_the_cache_with_every_combination(cache, monkeypatch, transactions):
+    monkeypatch.setattr(warmup, "WARMUP_ENABLED", True)
+    monkeypatch.setattr(warmup, "get_dataset_entry", lambda name: {"version": "v1"})
+    warmup.schedule_warmup("E-commerce Data 1", transactions, "v1", "InvoiceDate", "CustomerID")
+    deadline = time.monotonic() + 60
+    while warmup.get_warmup_progress("v1", "InvoiceDate", "CustomerID") != (30, 30):
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+    # The main (counts) and retention table of each combination
+    assert cache.stats()["entries"] == 2 * 30
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (0, 0)
+    assert tables(transactions) is not None
+    assert cache.stats()["hits"] == 2
+
+
+def test_warmup_order_follows_selections(monkeypatch):
+    monkeypatch.setattr(warmup, "_selection_counts", Counter())
+    assert warmup.get_warmup_order()[0] == ("M", 30)
+    warmup.record_selection("D", 365)
+    assert warmup.get_warmup_order()[0] == ("D", 365)
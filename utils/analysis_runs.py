@@ -0,0 +1,207 @@
+"""
+Non-blocking, cancellable cohort analysis runs.
+
+An analysis started with start_analysis is computed on a background thread pool, so the
+script run that started it finishes right away and the page stays responsive. Each
+session has at most one run: starting an analysis with a new configuration cancels the
+session's in-flight run, which drops it from the queue if it has not started and
+otherwise stops it at the next step of the cohort engine (see check_cancelled), so no CPU
+is spent on results nobody will see.
+
+Analyses that finish within ANALYSIS_INLINE_SECONDS, such as result cache hits, are
+shown in the same rerun. Slower ones are polled by show_analysis_status, a fragment that
+reruns on its own every ANALYSIS_POLL_SECONDS while the run is in flight, publishes the
+tables to st.session_state.cohort_data and cohort_data_percent when it finishes, and
+then reruns the page once to show them.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor, wait
+
+import streamlit as st
+from utils.helper_functions import cached_cohort_tables, resolve_value_analysis
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of analyses computed at the same time, across all sessions
+ANALYSIS_WORKERS = int(os.environ.get("REPEATRADAR_ANALYSIS_WORKERS", "2"))
+
+# Analyses finishing within this many seconds are shown without waiting for a poll
+ANALYSIS_INLINE_SECONDS = 0.2
+
+# Seconds between two checks of an analysis in flight
+ANALYSIS_POLL_SECONDS = 0.5
+
+_PERIOD_NAMES = {"D": "daily", "W": "weekly", "M": "monthly", "Q": "quarterly", "Y": "yearly"}
+
+_executor = ThreadPoolExecutor(max_workers=max(ANALYSIS_WORKERS, 1), thread_name_prefix="cohort-analysis")
+
+
+class AnalysisRun:
+    """
+    A cohort analysis submitted to the background pool.
+
+    Args:
+        config (tuple): Everything that determines the result, to tell runs apart
+        label (str): Short description shown while the run is in flight
+        cancel_event (threading.Event): Set to stop the computation
+        future (concurrent.futures.Future, optional): Future of (main_table,
+            retention_table); set once the run is submitted
+    """
+
+    def __init__(self, config, label, cancel_event, future=None):
+        self.config = config
+        self.label = label
+        self.cancel_event = cancel_event
+        self.future = future
+        self.started_at = time.perf_counter()
+        # Time the computation took on the pool, queueing excluded; None until it ends
+        self.compute_seconds = None
+        self.published = False
+        self.error = None
+
+    @property
+    def running(self):
+        return not self.future.done()
+
+    def cancel(self):
+        """Drop the run from the queue, or stop it at its next cancellation check."""
+        self.cancel_event.set()
+        self.future.cancel()
+
+
+def _compute(run, **kwargs):
+    """Compute the tables of a run on the pool, recording how long the computation took."""
+    started_at = time.perf_counter()
+    try:
+        return cached_cohort_tables(cancel_event=run.cancel_event, **kwargs)
+    finally:
+        run.compute_seconds = time.perf_counter() - started_at
+
+
+def _publish(run, profiler=None):
+    """Store the tables of a finished run in the session, or the reason there are none."""
+    run.published = True
+    if profiler is not None and run.compute_seconds is not None:
+        profiler.record_span("Cohort computation (background)", run.compute_seconds)
+    try:
+        st.session_state.cohort_data, st.session_state.cohort_data_percent = run.future.result()
+    except CancelledError:
+        pass
+    except Exception as e:
+        # Any failure of the computation is the run's outcome; the page keeps working
+        logger.exception("Cohort analysis %s failed", run.label)
+        run.error = f"⚠️ The analysis failed: {e}"
+
+
+def start_analysis(data, date_column, customer_id_column, cohort_period, period_duration, value_column=None,
+                   aggregation_function=None, dataset_version=None, user_activity=None, profiler=None):
+    """
+    Start a cohort analysis in the background, superseding the session's in-flight run.
+
+    Starting the configuration that is already in flight keeps that run. Arguments are as
+    for handle_generate_cohort_data; the output is always in pivot format. A profiler
+    (see utils.profiling) gets the computation time as a span if the run finishes inline.
+
+    Returns:
+        AnalysisRun or None: The session's run, or None if the selection is invalid
+    """
+    try:
+        value_column, aggregation_function = resolve_value_analysis(data, value_column, aggregation_function)
+    except ValueError as e:
+        st.error(f"⚠️ {e}")
+        return None
+
+    config = (dataset_version, date_column, customer_id_column, cohort_period, period_duration, value_column, aggregation_function)
+    run = st.session_state.get("analysis_run")
+    if run is not None and run.config == config and run.running:
+        return run
+    if run is not None and run.running:
+        run.cancel()
+
+    measure = f"{aggregation_function} of {value_column}" if value_column is not None else "active users"
+    label = f"{measure} of {_PERIOD_NAMES.get(cohort_period, cohort_period)} cohorts over {period_duration}-day periods"
+    run = AnalysisRun(config, label, threading.Event())
+    run.future = _executor.submit(
+        _compute,
+        run,
+        data=data,
+        dataset_version=dataset_version,
+        date_column=date_column,
+        user_column=customer_id_column,
+        cohort_period=cohort_period,
+        period_duration=period_duration,
+        value_column=value_column,
+        aggregation_function=aggregation_function,
+        user_activity=user_activity,
+    )
+    st.session_state.analysis_run = run
+
+    # Cache hits finish at once and are shown in this rerun
+    if not wait([run.future], timeout=ANALYSIS_INLINE_SECONDS).not_done:
+        _publish(run, profiler)
+    return run
+
+
+def is_analysis_running():
+    """Whether the session has an analysis in flight."""
+    run = st.session_state.get("analysis_run")
+    return run is not None and run.running
+
+
+def cancel_analysis(forget=False):
+    """
+    Cancel the session's analysis in flight, if any.
+
+    Args:
+        forget (bool): Also drop the run from the session, e.g. when the dataset is
+            switched or the analysis reset, so the next one starts afresh
+    """
+    run = st.session_state.get("analysis_run")
+    if run is not None and run.running:
+        run.cancel()
+        run.published = True
+    if forget:
+        st.session_state.pop("analysis_run", None)
+
+
+@st.fragment(run_every=ANALYSIS_POLL_SECONDS)
+def _poll_analysis(run):
+    """Show the progress of a run in flight, and rerun the page once it finished."""
+    if not run.running:
+        # The page rerun publishes the tables (or shows the run that superseded this one)
+        st.rerun()
+    with st.container(border=True):
+        status_col, cancel_col = st.columns([4, 1])
+        with status_col:
+            st.markdown(f"⏳ **Computing {run.label}...** {time.perf_counter() - run.started_at:.1f}s")
+            st.caption("You can keep changing the settings: a new configuration replaces this run.")
+        with cancel_col:
+            if st.button("✖️ Cancel", key="cancel_analysis", use_container_width=True):
+                cancel_analysis()
+                st.rerun()
+
+
+def show_analysis_status(profiler=None):
+    """
+    Show the session's analysis in flight and publish its tables once it finishes, or
+    the error of the last analysis.
+
+    Nothing polls while no analysis is in flight.
+
+    Args:
+        profiler (optional): Profiler of the rerun (see utils.profiling), which gets the
+            computation time of a run published now as a span
+    """
+    run = st.session_state.get("analysis_run")
+    if run is None:
+        return
+    if not run.published and not run.running:
+        _publish(run, profiler)
+    if run.error is not None:
+        st.error(run.error)
+    if not run.published:
+        _poll_analysis(run)
@@ -1,48 +1,248 @@
-import streamlit as st
-from datetime import datetime, timedelta
+"""
+Metrics of the dashboard's process-wide caches.
+
+Four caches are instrumented: the dataset store (utils.dataset_manager), which holds
+each cleaned dataset with its user activity precomputation, the in-memory cohort result
+cache (utils.result_cache), the tables precomputed by utils.precompute, which are looked
+up next, and the persistent result store on disk behind them (utils.result_store). For
+each, collect_cache_metrics gathers hits, misses, evictions, entry count, resident
+bytes, the compute time hits saved and the age of every entry.
+
+The metrics are shown in the sidebar by display_cache_info and can be exported as
+Prometheus text or JSON lines. Set REPEATRADAR_METRICS_FILE to have one background
+thread per process write them to a file every METRICS_EXPORT_INTERVAL_SECONDS, however
+many sessions rerun: a path ending in .prom is atomically replaced with Prometheus text
+(for the node exporter's textfile collector), any other path gets one JSON line per
+cache appended, without the per-entry details, so the file grows with time only.
+"""
+
+import json
+import logging
+import os
+import threading
 import time
 
-@st.cache_data(ttl=86400)
-def get_cache_timestamp():
+import streamlit as st
+from utils.dataset_manager import get_dataset_entry_stats, get_dataset_store_stats
+from utils.helper_functions import format_bytes
+from utils.precompute import get_precomputed_stats
+from utils.result_cache import get_result_cache
+from utils.result_store import get_result_store
+
+logger = logging.getLogger(__name__)
+
+# Metrics file written periodically, or None
+METRICS_FILE = os.environ.get("REPEATRADAR_METRICS_FILE") or None
+
+# Seconds between two writes of METRICS_FILE
+METRICS_EXPORT_INTERVAL_SECONDS = float(os.environ.get("REPEATRADAR_METRICS_INTERVAL", "15"))
+
+# Caches in display order, with their sidebar labels
+_CACHE_LABELS = [("datasets", "Datasets"), ("results", "Results"), ("precomputed", "Precomputed"), ("store", "Disk store")]
+
+# The thread writing METRICS_FILE, once started
+_exporter = None
+_exporter_lock = threading.Lock()
+
+# name, type and help text of the Prometheus metrics exported per cache
+_PROMETHEUS_METRICS = [
+    ("hits", "counter", "Cache lookups served from the cache."),
+    ("misses", "counter", "Cache lookups that had to compute or load the value."),
+    ("evictions", "counter", "Entries removed to stay within budget or because they went stale."),
+    ("entries", "gauge", "Entries currently cached."),
+    ("current_bytes", "gauge", "Estimated resident size (or size on disk) of the cached entries."),
+    ("max_bytes", "gauge", "Size budget of the cache."),
+    ("compute_seconds_saved", "counter", "Compute or load time avoided by cache hits."),
+]
+
+
+def _result_key_label(key):
+    """Readable label of a result cache key (see cohort_cache_key), without the dataset version."""
+    _, date_column, user_column, cohort_period, period_duration, value_column, aggregation_function, retention, _ = key
+    if retention:
+        measure = "retention"
+    elif value_column is not None:
+        measure = f"{aggregation_function}({value_column})"
+    else:
+        measure = "users"
+    return f"{user_column}@{date_column} {cohort_period}/{period_duration}d {measure}"
+
+
+def collect_cache_metrics():
     """
-    Get the timestamp when data was first cached.
-    This helps track when the cache was last refreshed.
+    Gather the current metrics of every instrumented cache.
+
+    Returns:
+        dict: Cache name ("datasets", "results", "precomputed" or "store") to a dict
+        with hits, misses, evictions, entries, current_bytes, max_bytes (None if
+        unbounded), compute_seconds_saved, hit_ratio (None before the first lookup) and
+        entry_stats, a list of dicts with key, bytes, age_seconds, compute_seconds and hits
     """
-    return datetime.now()
+    result_cache, result_store = get_result_cache(), get_result_store()
+    caches = {
+        "datasets": (get_dataset_store_stats(), get_dataset_entry_stats()),
+        "results": (result_cache.stats(), [
+            {**entry, "key": _result_key_label(entry["key"])} for entry in result_cache.entry_stats()
+        ]),
+        # Precomputed tables are listed in their manifest, not per entry here
+        "precomputed": (get_precomputed_stats(), []),
+        "store": (result_store.stats(), result_store.entry_stats()),
+    }
+    metrics = {}
+    for name, (stats, entry_stats) in caches.items():
+        lookups = stats["hits"] + stats["misses"]
+        metrics[name] = {
+            **stats,
+            "hit_ratio": stats["hits"] / lookups if lookups else None,
+            "entry_stats": entry_stats,
+        }
+    return metrics
+
 
-@st.cache_data(ttl=86400)
-def get_cache_hit_counter():
+def _escape_label(value):
+    """Escape a Prometheus label value."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_prometheus(metrics):
     """
-    Simple counter to track cache hits.
-    This increments only when cache is refreshed (every 24 hours).
+    Render cache metrics in the Prometheus text exposition format.
+
+    Args:
+        metrics (dict): Output of collect_cache_metrics
+
+    Returns:
+        str: Metrics named repeatradar_cache_*, labelled by cache, plus the age of
+        every entry as repeatradar_cache_entry_age_seconds labelled by cache and key
     """
-    return 0
+    lines = []
+    for field, metric_type, help_text in _PROMETHEUS_METRICS:
+        name = f"repeatradar_cache_{field}" + ("_total" if metric_type == "counter" else "")
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for cache, cache_metrics in metrics.items():
+            if cache_metrics[field] is not None:
+                lines.append(f'{name}{{cache="{cache}"}} {cache_metrics[field]}')
+    lines.append("# HELP repeatradar_cache_entry_age_seconds Time since the entry was cached.")
+    lines.append("# TYPE repeatradar_cache_entry_age_seconds gauge")
+    for cache, cache_metrics in metrics.items():
+        for entry in cache_metrics["entry_stats"]:
+            lines.append(f'repeatradar_cache_entry_age_seconds{{cache="{cache}",key="{_escape_label(entry["key"])}"}} {entry["age_seconds"]:.3f}')
+    return "\n".join(lines) + "\n"
+
+
+def format_json_lines(metrics, timestamp=None, include_entries=True):
+    """
+    Render cache metrics as JSON lines, one line per cache.
+
+    Args:
+        metrics (dict): Output of collect_cache_metrics
+        timestamp (float, optional): Unix time recorded in every line; defaults to now
+        include_entries (bool): Keep each cache's entry_stats
+
+    Returns:
+        str: Newline-terminated JSON lines with timestamp, cache and the cache's metrics
+    """
+    timestamp = time.time() if timestamp is None else timestamp
+    return "".join(
+        json.dumps({
+            "timestamp": timestamp,
+            "cache": cache,
+            **{name: value for name, value in cache_metrics.items() if include_entries or name != "entry_stats"},
+        }) + "\n"
+        for cache, cache_metrics in metrics.items()
+    )
+
+
+def export_cache_metrics(path, metrics=None):
+    """
+    Write cache metrics to a file for monitoring.
+
+    Args:
+        path (str): Destination; a .prom file is atomically replaced with Prometheus
+            text, anything else gets JSON lines without per-entry details appended
+        metrics (dict, optional): Output of collect_cache_metrics; collected if None
+    """
+    metrics = collect_cache_metrics() if metrics is None else metrics
+    if path.endswith(".prom"):
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as f:
+            f.write(format_prometheus(metrics))
+        os.replace(temporary_path, path)
+    else:
+        with open(path, "a") as f:
+            f.write(format_json_lines(metrics, include_entries=False))
+
+
+def _export_periodically(path, interval):
+    """Write the metrics to path every interval seconds, for the life of the process."""
+    while True:
+        try:
+            export_cache_metrics(path)
+        except Exception:
+            # Keep exporting; the next write may succeed
+            logger.exception("Could not export cache metrics to %s", path)
+        time.sleep(interval)
+
+
+def start_metrics_export(path=METRICS_FILE, interval=METRICS_EXPORT_INTERVAL_SECONDS):
+    """
+    Start the thread exporting the cache metrics to a file, once per process.
+
+    Args:
+        path (str, optional): Destination (see export_cache_metrics); nothing is
+            exported if None
+        interval (float): Seconds between two writes
+    """
+    global _exporter
+    if path is None:
+        return
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = threading.Thread(target=_export_periodically, args=(path, interval), daemon=True,
+                                         name="cache-metrics-export")
+            _exporter.start()
+
 
 def display_cache_info():
     """
-    Display cache information in the sidebar including when data was cached
-    and when it will expire.
-    """
-    try:
-        cache_time = get_cache_timestamp()
-        expire_time = cache_time + timedelta(hours=24)
-        current_time = datetime.now()
-        
-        time_until_expire = expire_time - current_time
-        hours_left = max(0, time_until_expire.total_seconds() / 3600)
-        
-        with st.sidebar:
-            st.markdown("**⏰ Cache Info**")
-            st.caption(f"Cached: {cache_time.strftime('%Y-%m-%d %H:%M:%S')}")
-            st.caption(f"Expires in: {hours_left:.1f} hours")
-            
-            if hours_left < 1:
-                st.warning("⚠️ Cache expiring soon")
-            elif hours_left > 23:
-                st.info("🆕 Fresh cache")
-            
-            # Add performance tip
-            st.caption("💡 Cache shared across all users for optimal performance")
-            
-    except Exception as e:
-        st.sidebar.caption("Cache info unavailable")
+    Display the cache metrics in the sidebar, with downloads of the metrics as
+    Prometheus text and JSON lines, and start the metrics file export if configured.
+    """
+    start_metrics_export()
+    metrics = collect_cache_metrics()
+
+    with st.sidebar:
+        st.markdown("**🗄️ Cache Metrics**")
+        for cache, label in _CACHE_LABELS:
+            cache_metrics = metrics[cache]
+            hit_ratio = f"{cache_metrics['hit_ratio']:.0%}" if cache_metrics["hit_ratio"] is not None else "n/a"
+            size = format_bytes(cache_metrics["current_bytes"])
+            if cache_metrics["max_bytes"] is not None:
+                size += f" of {format_bytes(cache_metrics['max_bytes'])}"
+            st.caption(
+                f"{label}: {cache_metrics['hits']} hits, {cache_metrics['misses']} misses ({hit_ratio}), "
+                f"{cache_metrics['evictions']} evictions, {cache_metrics['entries']} entries ({size}), "
+                f"{cache_metrics['compute_seconds_saved']:.1f}s compute saved"
+            )
+
+        with st.expander("Cache Entries"):
+            for cache, label in _CACHE_LABELS:
+                entry_stats = metrics[cache]["entry_stats"]
+                if not entry_stats:
+                    continue
+                st.caption(label)
+                st.dataframe(
+                    [
+                        {"Key": entry["key"], "Age (s)": round(entry["age_seconds"]), "Size": format_bytes(entry["bytes"]),
+                         "Hits": entry["hits"], "Compute (s)": round(entry["compute_seconds"], 2)}
+                        for entry in reversed(entry_stats)
+                    ],
+                    hide_index=True,
+                    use_container_width=True,
+                )
+            download_col1, download_col2 = st.columns(2)
+            with download_col1:
+                st.download_button("Prometheus", format_prometheus(metrics), file_name="repeatradar_cache.prom", mime="text/plain")
+            with download_col2:
+                st.download_button("JSON lines", format_json_lines(metrics), file_name="repeatradar_cache.jsonl", mime="application/jsonl")
@@ -0,0 +1,596 @@
+"""
+Single-pass cohort engine.
+
+Produces the same tables as repeatradar.generate_cohort_data, but computes the user
+first-seen dates and period bucketing once and derives the active-user counts, the
+retention percentages and an optional value aggregation from that one pass, instead of
+rescanning the transactions for each table.
+
+The first-seen dates and day offsets do not depend on the period settings, so they can be
+precomputed once per dataset (precompute_user_activity) and re-binned cheaply for every
+cohort period and period duration (assign_cohorts).
+
+Large inputs can be split by user across worker processes (see utils.parallel_cohorts).
+"""
+
+from concurrent.futures import CancelledError
+
+import numpy as np
+import pandas as pd
+from utils.parallel_cohorts import COHORT_WORKERS, PARALLEL_MIN_ROWS, parallel_cohort_matrices, supports_parallel_values
+
+# Same mapping as repeatradar for period durations given as period strings
+PERIOD_DAYS = {'D': 1, 'W': 7, 'M': 30, 'Q': 90, 'Y': 365}
+
+# The cohort periods, period durations and value aggregations offered in the dashboard
+COHORT_PERIODS = ['D', 'W', 'M', 'Q', 'Y']
+PERIOD_DURATIONS = [1, 7, 30, 90, 180, 365]
+AGGREGATION_FUNCTIONS = ['sum', 'mean', 'count', 'median', 'nunique']
+
+
+def period_duration_days(period_duration):
+    """
+    Convert a period duration to days the way repeatradar does.
+
+    Args:
+        period_duration (int or str): Number of days, or 'D', 'W', 'M', 'Q', 'Y'
+
+    Returns:
+        int: Period duration in days (unknown strings count as 30)
+    """
+    if isinstance(period_duration, str):
+        return PERIOD_DAYS.get(period_duration, 30)
+    return period_duration
+
+
+def check_cancelled(cancel_event):
+    """
+    Stop a computation whose result is no longer wanted.
+
+    Args:
+        cancel_event (threading.Event or None): Set by whoever cancels the computation
+
+    Raises:
+        CancelledError: If cancel_event is set
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        raise CancelledError()
+
+
+def validate_cohort_inputs(data, date_column, user_column, value_column=None, output_format='pivot'):
+    """
+    Check the inputs with the same errors repeatradar.generate_cohort_data raises.
+
+    Raises:
+        ValueError: If a column is missing or output_format is invalid
+        TypeError: If date_column is not of datetime type
+    """
+    if date_column not in data.columns:
+        raise ValueError(f"Column '{date_column}' not found in data")
+    if user_column not in data.columns:
+        raise ValueError(f"Column '{user_column}' not found in data")
+    if not pd.api.types.is_datetime64_any_dtype(data[date_column]):
+        raise TypeError(f"Column '{date_column}' must be of datetime type")
+    if output_format not in ['long', 'pivot']:
+        raise ValueError("output_format must be either 'long' or 'pivot'")
+    if value_column is not None and value_column not in data.columns:
+        raise ValueError(f"Column '{value_column}' not found in data")
+
+
+def precompute_user_activity(data, date_column, user_column):
+    """
+    Precompute what cohort analysis needs from a dataset independently of the period settings.
+
+    Each user's first-seen timestamp and each transaction's day offset from it only depend
+    on the dataset and its date and user columns, so they can be computed once per dataset
+    and reused for every cohort period and period duration. Rows without a user or a date
+    are dropped, as they never reach a cohort cell.
+
+    Args:
+        data (pd.DataFrame): Transaction data
+        date_column (str): Datetime column
+        user_column (str): User column
+
+    Returns:
+        dict: columns (the (date_column, user_column) pair), first_seen (datetime64 per user
+        code), present_users (codes of users with kept rows), and per kept row the int32
+        user_codes and day_offset, plus the boolean row mask of kept rows
+    """
+    user_codes, _ = pd.factorize(data[user_column])
+    dates = data[date_column]
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    dates = dates.to_numpy()
+    mask = (user_codes >= 0) & ~np.isnat(dates)
+    user_codes = user_codes[mask]
+    dates = dates[mask]
+
+    first_seen = pd.Series(dates).groupby(user_codes).min()
+    first_seen_by_user = np.full(user_codes.max() + 1 if len(user_codes) else 0, np.array('NaT', dtype=dates.dtype))
+    first_seen_by_user[first_seen.index.to_numpy()] = first_seen.to_numpy()
+    day_offset = (dates - first_seen_by_user[user_codes]) // np.timedelta64(1, 'D')
+
+    return {
+        "columns": (date_column, user_column),
+        "first_seen": first_seen_by_user,
+        "present_users": first_seen.index.to_numpy(),
+        "user_codes": user_codes.astype(np.int32),
+        "day_offset": day_offset.astype(np.int32),
+        "mask": mask,
+    }
+
+
+def assign_cohorts(user_activity, cohort_period, period_duration):
+    """
+    Bin precomputed user activity into cohorts and periods since acquisition.
+
+    This is a cheap vectorized pass: cohorts are derived per user, not per transaction.
+
+    Args:
+        user_activity (dict): Output of precompute_user_activity
+        cohort_period (str): Cohort grouping period ('D', 'W', 'M', 'Q', 'Y')
+        period_duration (int or str): Period duration (see period_duration_days)
+
+    Returns:
+        dict: cohorts (sorted DatetimeIndex of cohort start dates), user_codes,
+        cohort_index (position in cohorts) and period_number per kept row, the boolean
+        row mask of kept rows, and n_periods
+    """
+    user_codes = user_activity["user_codes"]
+    user_cohorts = pd.DatetimeIndex(user_activity["first_seen"]).to_period(cohort_period).to_timestamp().to_numpy()
+    cohorts = pd.DatetimeIndex(np.unique(user_cohorts[user_activity["present_users"]]), name='cohort_period')
+
+    period_number = user_activity["day_offset"].astype(np.int64) // period_duration_days(period_duration)
+    cohort_index = np.searchsorted(cohorts.to_numpy(), user_cohorts[user_codes])
+
+    return {
+        "cohorts": cohorts,
+        "user_codes": user_codes,
+        "cohort_index": cohort_index,
+        "period_number": period_number,
+        "mask": user_activity["mask"],
+        "n_periods": int(period_number.max()) + 1 if len(period_number) else 0,
+    }
+
+
+def count_active_users(assignment):
+    """
+    Count distinct active users per cohort and period.
+
+    Args:
+        assignment (dict): Output of assign_cohorts
+
+    Returns:
+        np.ndarray: int64 matrix of shape (cohorts, periods)
+    """
+    n_cohorts, n_periods = len(assignment["cohorts"]), assignment["n_periods"]
+    # A user belongs to exactly one cohort, so distinct (user, period) pairs give the counts
+    pairs = np.unique(assignment["user_codes"].astype(np.int64) * n_periods + assignment["period_number"])
+    pair_users = pairs // n_periods
+    pair_periods = pairs % n_periods
+    user_cohort_index = np.empty(assignment["user_codes"].max() + 1 if len(pairs) else 0, dtype=np.int64)
+    user_cohort_index[assignment["user_codes"]] = assignment["cohort_index"]
+    cells = user_cohort_index[pair_users] * n_periods + pair_periods
+    return np.bincount(cells, minlength=n_cohorts * n_periods).reshape(n_cohorts, n_periods)
+
+
+def aggregate_values(data, value_column, aggregation_function, assignment):
+    """
+    Aggregate a value column per cohort and period, filling empty cells with 0.
+
+    Args:
+        data (pd.DataFrame): Transaction data
+        value_column (str): Column to aggregate
+        aggregation_function (str): pandas aggregation name ('sum', 'mean', 'nunique', ...)
+        assignment (dict): Output of assign_cohorts
+
+    Returns:
+        np.ndarray: Matrix of shape (cohorts, periods); NaN results of existing cells are kept
+    """
+    n_cohorts, n_periods = len(assignment["cohorts"]), assignment["n_periods"]
+    cells = assignment["cohort_index"] * n_periods + assignment["period_number"]
+    values = data[value_column][assignment["mask"]].reset_index(drop=True)
+    aggregated = values.groupby(cells).agg(aggregation_function)
+    aggregated = aggregated.reindex(range(n_cohorts * n_periods), fill_value=0)
+    return aggregated.to_numpy().reshape(n_cohorts, n_periods)
+
+
+def aggregated_dtype(column, aggregation_function, values):
+    """
+    Get the dtype pandas gives a groupby aggregation of a column with the given results.
+
+    Used when the results are computed in pieces and merged, to end up with the same
+    dtype as aggregating the whole column at once.
+
+    Args:
+        column (pd.Series): The aggregated column (one row is enough)
+        aggregation_function (str): pandas aggregation name
+        values (np.ndarray): The merged aggregation results
+
+    Returns:
+        np.dtype: Result dtype
+    """
+    dtype = column.dtype
+    if aggregation_function == 'sum' and pd.api.types.is_integer_dtype(dtype) and isinstance(dtype, np.dtype):
+        # pandas sums integers in 64 bits and downcasts the result only if it fits
+        limits = np.iinfo(dtype)
+        if values.size == 0 or (values.min() >= limits.min and values.max() <= limits.max):
+            return dtype
+        return np.dtype(np.uint64 if limits.min == 0 else np.int64)
+    sample = column.iloc[:1]
+    return sample.groupby(np.zeros(len(sample), dtype=np.int64)).agg(aggregation_function).dtype
+
+
+def retention_percentages(counts):
+    """
+    Turn active-user counts into retention percentages of each cohort's period 0.
+
+    Rounding uses Python's round so the values match repeatradar exactly.
+
+    Args:
+        counts (np.ndarray): Matrix from count_active_users
+
+    Returns:
+        np.ndarray: float64 matrix of percentages rounded to 2 decimals
+    """
+    period_0 = counts[:, :1].astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = counts / period_0 * 100
+    rounded = np.array([round(value, 2) for value in ratios.ravel().tolist()], dtype=np.float64)
+    rounded = rounded.reshape(counts.shape)
+    rounded[np.broadcast_to(period_0 == 0, counts.shape)] = 0.0
+    return rounded
+
+
+def _merge_value_matrices(matrices, aggregation_function):
+    """Turn merged partition sums and counts into the values of a sum, count or mean aggregation."""
+    if aggregation_function == 'sum':
+        return matrices["sums"]
+    if aggregation_function == 'count':
+        return matrices["value_counts"]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = matrices["sums"] / matrices["value_counts"]
+    # Like the reindexed groupby: NaN for cells whose values are all missing, 0 for empty cells
+    means[matrices["sizes"] == 0] = 0
+    return means
+
+
+def format_cohort_matrix(matrix, cohorts, output_format, pivot_dtype=None):
+    """Shape a (cohorts, periods) matrix like repeatradar's long or pivot output."""
+    n_cohorts, n_periods = matrix.shape
+    if output_format == 'long':
+        return pd.DataFrame({
+            'cohort_period': np.repeat(cohorts.to_numpy(), n_periods),
+            'period_number': np.tile(np.arange(n_periods, dtype=np.int64), n_cohorts),
+            'metric_value': matrix.ravel(),
+        })
+    pivot = pd.DataFrame(
+        matrix,
+        index=cohorts,
+        columns=pd.Index(np.arange(n_periods, dtype=np.int64), name='period_number'),
+    ).fillna(0)
+    return pivot.astype(pivot_dtype) if pivot_dtype is not None else pivot
+
+
+def compute_cohort_tables(data, date_column, user_column, cohort_period='M', period_duration=30,
+                          value_column=None, aggregation_function='sum', output_format='pivot',
+                          user_activity=None, workers=None, cancel_event=None):
+    """
+    Compute the active-user, retention and optional value cohort tables in one pass.
+
+    Each table is identical to what repeatradar.generate_cohort_data returns for the same
+    arguments (with calculate_retention_rate=True for the retention table).
+
+    Args:
+        data (pd.DataFrame): Transaction data
+        date_column (str): Datetime column
+        user_column (str): User column
+        cohort_period (str): Cohort grouping period ('D', 'W', 'M', 'Q', 'Y')
+        period_duration (int or str): Period duration in days, or a period string
+        value_column (str, optional): Column to aggregate for the value table
+        aggregation_function (str): Aggregation applied to value_column
+        output_format (str): 'pivot' or 'long'
+        user_activity (dict, optional): precompute_user_activity output for data and the
+            same date and user columns; computed on the fly if missing or for other columns
+        workers (int, optional): Processes to split inputs of at least PARALLEL_MIN_ROWS
+            rows across; defaults to COHORT_WORKERS
+        cancel_event (threading.Event, optional): Checked between the steps of the
+            computation and while waiting for parallel partitions; the computation stops
+            with CancelledError once it is set
+
+    Returns:
+        dict: counts, retention and values tables (values is None without value_column)
+    """
+    validate_cohort_inputs(data, date_column, user_column, value_column, output_format)
+    if user_activity is None or user_activity["columns"] != (date_column, user_column):
+        user_activity = precompute_user_activity(data, date_column, user_column)
+    check_cancelled(cancel_event)
+    assignment = assign_cohorts(user_activity, cohort_period, period_duration)
+    cohorts = assignment["cohorts"]
+    check_cancelled(cancel_event)
+
+    workers = COHORT_WORKERS if workers is None else workers
+    parallel = workers > 1 and len(assignment["user_codes"]) >= PARALLEL_MIN_ROWS
+    parallel_values = parallel and value_column is not None and supports_parallel_values(data[value_column], aggregation_function)
+    if parallel:
+        value_array = data[value_column][assignment["mask"]].to_numpy() if parallel_values else None
+        check_cancelled(cancel_event)
+        matrices = parallel_cohort_matrices(assignment, workers, value_array, cancel_event)
+        counts = matrices["counts"]
+    else:
+        counts = count_active_users(assignment)
+    tables = {
+        "counts": format_cohort_matrix(counts, cohorts, output_format, np.int32),
+        "retention": format_cohort_matrix(retention_percentages(counts), cohorts, output_format, np.float32),
+        "values": None,
+    }
+
+    if value_column is not None:
+        check_cancelled(cancel_event)
+        if parallel_values:
+            values = _merge_value_matrices(matrices, aggregation_function)
+            values = values.astype(aggregated_dtype(data[value_column], aggregation_function, values))
+        else:
+            values = aggregate_values(data, value_column, aggregation_function, assignment)
+        # repeatradar keeps count/nunique of non-float columns as integers in the pivot
+        integer_result = aggregation_function in ['count', 'nunique'] and not pd.api.types.is_float_dtype(data[value_column])
+        tables["values"] = format_cohort_matrix(values, cohorts, output_format, np.int32 if integer_result else None)
+
+    return tables
+
+
+# Aggregations whose per-cell results can be merged across batches of rows
+INCREMENTAL_AGGREGATIONS = ('sum', 'count', 'mean', 'nunique')
+
+
+def _insert_sorted_keys(stored, keys):
+    """
+    Insert sorted unique keys into a sorted array of keys, skipping those already in it.
+
+    Args:
+        stored (np.ndarray): Sorted unique int64 keys
+        keys (np.ndarray): Sorted unique int64 keys to insert
+
+    Returns:
+        tuple: (the new sorted array, boolean mask of the keys that were not stored yet)
+    """
+    position = np.searchsorted(stored, keys)
+    found = np.zeros(len(keys), dtype=bool)
+    if len(stored):
+        found = stored[np.minimum(position, len(stored) - 1)] == keys
+    new = ~found
+    return np.insert(stored, position[new], keys[new]), new
+
+
+class CohortState:
+    """
+    Cohort tables maintained incrementally over batches of appended transactions.
+
+    The state keeps each user's first-seen date, the (user, period) pairs already counted
+    as active and mergeable per-cell aggregates, so update only touches the cells the new
+    rows fall in and, apart from copying the sorted arrays of seen keys to insert new ones,
+    its cost scales with the batch, not the history. Seen (user, period) pairs, and for
+    nunique the distinct values of each cell, are kept as sorted int64 arrays of 8 bytes
+    per entry rather than Python sets, so the state stays small on long histories. Building a state
+    with one update over the full history gives the same tables as compute_cohort_tables
+    (float sums and means up to summation order).
+
+    New rows may add new users and fill any cell, but must not predate the first-seen
+    date of a user already in the state, as that would move the user's whole history to
+    another cohort; such batches raise ValueError and need a full rebuild.
+
+    Args:
+        date_column (str): Datetime column
+        user_column (str): User column
+        cohort_period (str): Cohort grouping period ('D', 'W', 'M', 'Q', 'Y')
+        period_duration (int or str): Period duration in days, or a period string
+        value_column (str, optional): Column to aggregate for the value table
+        aggregation_function (str): One of INCREMENTAL_AGGREGATIONS
+    """
+
+    def __init__(self, date_column, user_column, cohort_period='M', period_duration=30,
+                 value_column=None, aggregation_function='sum'):
+        if value_column is not None and aggregation_function not in INCREMENTAL_AGGREGATIONS:
+            raise ValueError(f"aggregation_function must be one of {', '.join(INCREMENTAL_AGGREGATIONS)} for incremental updates")
+        self.date_column = date_column
+        self.user_column = user_column
+        self.cohort_period = cohort_period
+        self.period_duration = period_duration
+        self.value_column = value_column
+        self.aggregation_function = aggregation_function
+        self.row_count = 0
+        self.skipped_row_count = 0
+        # User id -> (first-seen datetime64, cohort start datetime64)
+        self._users = {}
+        # Sorted encoded (user, period) pairs already counted as active
+        self._active = np.empty(0, dtype=np.int64)
+        # (cohort, period) -> sorted keys of the values already counted there, for nunique
+        self._distinct_values = {}
+        # Value -> key of non-numeric values, for nunique
+        self._value_codes = {}
+        # Per-cell Series indexed by (cohort, period): counts, and the value aggregates
+        self._counts = None
+        self._cells = {}
+        # One row of the value column, to derive the dtype of its aggregates
+        self._value_sample = None
+        self._integer_values = False
+
+    def _user_first_seen(self, users, first_dates):
+        """Register the users of a batch, returning their codes, first-seen dates and cohorts."""
+        codes = np.empty(len(users), dtype=np.int64)
+        first_seen = first_dates.copy()
+        cohorts = pd.DatetimeIndex(first_dates).to_period(self.cohort_period).to_timestamp().to_numpy().copy()
+        for i, (user, first_date) in enumerate(zip(users.tolist(), first_dates)):
+            known = self._users.get(user)
+            if known is None:
+                codes[i] = len(self._users)
+                self._users[user] = (codes[i], first_date, cohorts[i])
+            elif first_date < known[1]:
+                raise ValueError(f"New rows of user {user!r} predate the user's first-seen date; rebuild the state from the full history")
+            else:
+                codes[i], first_seen[i], cohorts[i] = known
+        return codes, first_seen, cohorts
+
+    @property
+    def user_count(self):
+        """Number of distinct users seen so far."""
+        return len(self._users)
+
+    def seed_first_seen(self, first_seen):
+        """
+        Register users' first-seen dates before any of their rows are folded in.
+
+        With every user's first-seen date known up front, batches may arrive in any
+        date order, e.g. when a file that is not sorted by date is streamed twice.
+
+        Args:
+            first_seen (pd.Series): First-seen datetime per user id
+
+        Raises:
+            ValueError: If rows were already folded in
+        """
+        if self._counts is not None:
+            raise ValueError("First-seen dates must be seeded before any rows are folded in")
+        dates = first_seen.to_numpy()
+        cohorts = pd.DatetimeIndex(dates).to_period(self.cohort_period).to_timestamp().to_numpy()
+        for user, first_date, cohort in zip(first_seen.index.tolist(), dates, cohorts):
+            self._users[user] = (len(self._users), first_date, cohort)
+
+    @staticmethod
+    def _merge(cells, delta):
+        """Add per-cell values of a batch to the stored ones."""
+        if cells is None:
+            return delta
+        # Alignment goes through float; cast back so large integer aggregates stay exact
+        return cells.add(delta, fill_value=0).astype(np.result_type(cells.dtype, delta.dtype))
+
+    def update(self, batch):
+        """
+        Fold a batch of new transactions into the state.
+
+        Args:
+            batch (pd.DataFrame): New rows with the state's date, user and value columns,
+                cleaned like the history (see utils.ingest.clean_dataset)
+
+        Returns:
+            CohortState: self, for chaining
+
+        Raises:
+            ValueError: If a column is missing or rows predate a known user's first-seen date
+            TypeError: If date_column is not of datetime type
+        """
+        validate_cohort_inputs(batch, self.date_column, self.user_column, self.value_column)
+        if self.value_column is not None and self._value_sample is None and len(batch) > 0:
+            column = batch[self.value_column]
+            self._value_sample = column.iloc[:1]
+            self._integer_values = self.aggregation_function in ['count', 'nunique'] and not pd.api.types.is_float_dtype(column)
+
+        batch_codes, users = pd.factorize(batch[self.user_column])
+        dates = batch[self.date_column]
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_localize(None)
+        dates = dates.to_numpy()
+        mask = (batch_codes >= 0) & ~np.isnat(dates)
+        batch_codes, dates = batch_codes[mask], dates[mask]
+        self.row_count += int(mask.sum())
+        self.skipped_row_count += int(len(mask) - mask.sum())
+        if len(dates) == 0:
+            return self
+
+        batch_first = pd.Series(dates).groupby(batch_codes).min()
+        present = batch_first.index.to_numpy()
+        codes, first_seen, cohorts = self._user_first_seen(np.asarray(users)[present], batch_first.to_numpy())
+        # Map batch user codes to positions among the users present in the batch
+        position = np.full(len(users), -1, dtype=np.int64)
+        position[present] = np.arange(len(present))
+        row_users = position[batch_codes]
+
+        period = ((dates - first_seen[row_users]) // np.timedelta64(1, 'D')) // period_duration_days(self.period_duration)
+        cells = pd.MultiIndex.from_arrays([cohorts[row_users], period])
+
+        # Only (user, period) pairs not seen before add an active user to their cell
+        pairs, first_rows = np.unique(codes[row_users] * (1 << 24) + period, return_index=True)
+        self._active, new_pairs = _insert_sorted_keys(self._active, pairs)
+        new_rows = first_rows[new_pairs]
+        delta = pd.Series(1, index=cells[new_rows]).groupby(level=[0, 1]).sum()
+        self._counts = self._merge(self._counts, delta).astype(np.int64)
+
+        if self.value_column is not None:
+            self._update_values(batch[self.value_column][mask].reset_index(drop=True), cells)
+        return self
+
+    def _update_values(self, values, cells):
+        """Merge the value aggregates of a batch into the stored cells."""
+        grouped = values.groupby([cells.get_level_values(0), cells.get_level_values(1)])
+        if self.aggregation_function == 'nunique':
+            triples = pd.DataFrame({'cohort': cells.get_level_values(0), 'period': cells.get_level_values(1), 'value': values})
+            triples = triples.dropna(subset=['value'])
+            value_keys = self._value_keys(triples['value'])
+            # Cells with rows but no new distinct value still belong to the table
+            delta = pd.Series(0, index=grouped.size().index, dtype=np.int64)
+            for cell, rows in triples.groupby(['cohort', 'period'], sort=False).indices.items():
+                stored = self._distinct_values.get(cell, np.empty(0, dtype=np.int64))
+                self._distinct_values[cell], new_keys = _insert_sorted_keys(stored, np.unique(value_keys[rows]))
+                delta.loc[cell] = int(new_keys.sum())
+            self._cells['nunique'] = self._merge(self._cells.get('nunique'), delta)
+            return
+        self._cells['count'] = self._merge(self._cells.get('count'), grouped.count())
+        if self.aggregation_function in ('sum', 'mean'):
+            self._cells['sum'] = self._merge(self._cells.get('sum'), grouped.sum())
+        if self.aggregation_function == 'mean':
+            self._cells['size'] = self._merge(self._cells.get('size'), grouped.size())
+
+    def _value_keys(self, values):
+        """
+        Encode values as int64 keys that are equal exactly when the values are.
+
+        Numbers are keyed by their float64 bits, so 1 and 1.0 count once like in pandas;
+        other values get the next code the first time they are seen.
+        """
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            # Adding 0.0 turns -0.0 into 0.0, which pandas counts as the same value
+            return (values.to_numpy(np.float64) + 0.0).view(np.int64)
+        codes = self._value_codes
+        return np.fromiter((codes.setdefault(value, len(codes)) for value in values.tolist()), dtype=np.int64, count=len(values))
+
+    def tables(self, output_format='pivot'):
+        """
+        Get the cohort tables of all rows folded in so far.
+
+        Args:
+            output_format (str): 'pivot' or 'long'
+
+        Returns:
+            dict: counts, retention and values tables as returned by compute_cohort_tables
+        """
+        if output_format not in ['long', 'pivot']:
+            raise ValueError("output_format must be either 'long' or 'pivot'")
+        if self._counts is None:
+            cohorts, n_periods = pd.DatetimeIndex([], name='cohort_period'), 0
+        else:
+            cohorts = pd.DatetimeIndex(self._counts.index.get_level_values(0).unique().sort_values(), name='cohort_period')
+            n_periods = int(self._counts.index.get_level_values(1).max()) + 1
+        grid = pd.MultiIndex.from_product([cohorts, range(n_periods)])
+
+        def matrix(cells, fill_value=0):
+            if cells is None:
+                return np.zeros((len(cohorts), n_periods))
+            return cells.reindex(grid, fill_value=fill_value).to_numpy().reshape(len(cohorts), n_periods)
+
+        counts = matrix(self._counts).astype(np.int64)
+        tables = {
+            "counts": format_cohort_matrix(counts, cohorts, output_format, np.int32),
+            "retention": format_cohort_matrix(retention_percentages(counts), cohorts, output_format, np.float32),
+            "values": None,
+        }
+        if self.value_column is not None:
+            if self.aggregation_function == 'mean':
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    values = matrix(self._cells.get('sum')) / matrix(self._cells.get('count'))
+                values[matrix(self._cells.get('size')) == 0] = 0
+            else:
+                values = matrix(self._cells.get(self.aggregation_function))
+            if self._value_sample is not None:
+                values = values.astype(aggregated_dtype(self._value_sample, self.aggregation_function, values))
+            tables["values"] = format_cohort_matrix(values, cohorts, output_format, np.int32 if self._integer_values else None)
+        return tables
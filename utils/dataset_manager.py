@@ -0,0 +1,464 @@
+"""
+Lazy, process-wide store of the registered datasets.
+
+A dataset is loaded the first time a session asks for it, not at startup, and is then
+shared by reference by every session of the server process: callers get a shallow,
+copy-on-write view instead of the deserialized copy st.cache_data hands out on every
+rerun, so a dataset is resident once no matter how many sessions use it. The views are
+only safe to modify with pandas' copy-on-write mode on, which Home.py turns on for the
+whole process. Concurrent requests for the same dataset wait for a single load instead
+of each starting their own; if the session running it is rerun or stopped meanwhile, a
+waiting session runs the load again.
+
+Entries live until they are older than DATASET_TTL_SECONDS, their source file or cleaning
+code changes (see get_dataset_version), or invalidate_dataset is called. Datasets a session
+is likely to switch to next can be prefetched on a background thread.
+
+Alongside each dataset the store keeps its user activity precomputation (first-seen dates
+and day offsets, see utils.cohort_engine.precompute_user_activity), built at load time for
+the registry's date and user columns and on first use for other columns, so changing the
+cohort period or duration only re-bins it.
+
+The store counts hits (requests served by a loaded or loading dataset, at most once per
+session and dataset version, as reruns of a session avoid no load), misses (requests
+that had to load it), evictions (datasets dropped as stale or invalidated) and the load
+time its hits saved; see get_dataset_store_stats and utils.cache_info.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from utils.cohort_engine import precompute_user_activity
+from utils.dataset_profile import profile_dataset
+from utils.dataset_registry import DATASET_REGISTRY, get_dataset_schema
+from utils.load_and_clean_sample_data import get_dataset_columns, get_dataset_info, get_dataset_version, load_dataset
+from utils.load_progress import LoadProgress
+
+# Set REPEATRADAR_PREFETCH=0 to only ever load the dataset a session selects
+PREFETCH_ENABLED = os.environ.get("REPEATRADAR_PREFETCH", "1") == "1"
+
+# Reload datasets once a day, matching the previous st.cache_data lifetime
+DATASET_TTL_SECONDS = 86400
+
+# How often a session waiting for another session's load checks its progress
+PROGRESS_POLL_SECONDS = 0.25
+
+# One future per dataset: pending while loading, resolved with (DataFrame, version) once loaded
+_futures = {}
+# Version, load time, resident size and profile of every loaded dataset
+_entries = {}
+# User activity precomputations by (dataset name, version, date column, user column)
+_user_activity = {}
+# Progress trackers of the latest load of every dataset, including background loads
+_load_progress = {}
+# Lookup counters of the store
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "compute_seconds_saved": 0.0}
+_lock = threading.Lock()
+_prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dataset-prefetch")
+
+
+class LoadInterrupted(RuntimeError):
+    """Raised to the waiters of a load that was interrupted rather than failed."""
+
+
+def _claim(dataset_name):
+    """
+    Get the future of a dataset, creating it if nobody has started loading it yet.
+
+    Returns:
+        tuple: (future, is_owner) where is_owner tells the caller it must run the load
+    """
+    with _lock:
+        future = _futures.get(dataset_name)
+        if future is not None:
+            return future, False
+        future = Future()
+        _futures[dataset_name] = future
+        return future, True
+
+
+def _forget(dataset_name, future):
+    """Drop the future of a failed load so the next request retries it."""
+    with _lock:
+        if _futures.get(dataset_name) is future:
+            del _futures[dataset_name]
+
+
+def _run_load(dataset_name, future, progress=None):
+    """Load a dataset into its future, forgetting the future on failure so it can be retried."""
+    tracker = LoadProgress(dataset_name, listener=progress)
+    with _lock:
+        _load_progress[dataset_name] = tracker
+    try:
+        started_at = time.perf_counter()
+        version = get_dataset_version(dataset_name)
+        data = load_dataset(dataset_name, progress=tracker)
+        entry = {
+            "version": version,
+            "loaded_at": time.time(),
+            "bytes": int(data.memory_usage(deep=True).sum()),
+            "hits": 0,
+        }
+        schema = get_dataset_schema(dataset_name)
+        # The profile is computed at ingest and read back from the snapshot footer
+        metadata = get_dataset_info(dataset_name)
+        entry["profile"] = metadata.get("profile") if metadata is not None else None
+        if entry["profile"] is None:
+            entry["profile"] = profile_dataset(data, schema["date_column"], schema["user_column"])
+        activity_key = (dataset_name, version, schema["date_column"], schema["user_column"])
+        tracker("Precomputing user first-seen dates", stage="activity")
+        activity = precompute_user_activity(data, schema["date_column"], schema["user_column"])
+        entry["load_seconds"] = time.perf_counter() - started_at
+    except Exception as e:
+        _forget(dataset_name, future)
+        future.set_exception(e)
+        return
+    except BaseException:
+        # KeyboardInterrupt, SystemExit or a Streamlit rerun or stop of the loading
+        # session: fail the load for its waiters, who retry it, and let the exception go on
+        _forget(dataset_name, future)
+        future.set_exception(LoadInterrupted(f"Loading {dataset_name} was interrupted"))
+        raise
+    with _lock:
+        if _futures.get(dataset_name) is future:
+            _entries[dataset_name] = entry
+            _store_user_activity(activity_key, activity)
+    tracker(f"{dataset_name} is ready", stage="done", rows=len(data))
+    future.set_result((data, version))
+
+
+def _store_user_activity(key, activity):
+    """Keep a user activity precomputation with its dataset; call with _lock held."""
+    if key in _user_activity:
+        return
+    _user_activity[key] = activity
+    entry = _entries.get(key[0])
+    if entry is not None:
+        entry["bytes"] += sum(value.nbytes for value in activity.values() if hasattr(value, "nbytes"))
+
+
+def _is_stale(dataset_name):
+    """Check whether a loaded dataset has outlived its TTL or its source has changed."""
+    entry = _entries.get(dataset_name)
+    if entry is None:
+        return False
+    if time.time() - entry["loaded_at"] > DATASET_TTL_SECONDS:
+        return True
+    try:
+        return get_dataset_version(dataset_name) != entry["version"]
+    except OSError:
+        # Keep serving the loaded frame if the source file is temporarily unavailable
+        return False
+
+
+def invalidate_dataset(dataset_name=None):
+    """
+    Drop a dataset from the store so the next request reloads it.
+
+    Sessions that already hold a view keep it until they ask for the dataset again.
+
+    Args:
+        dataset_name (str, optional): Dataset to drop; all datasets if None
+    """
+    with _lock:
+        names = list(_futures) if dataset_name is None else [dataset_name]
+        for name in names:
+            future = _futures.get(name)
+            # A load in progress finishes for its waiters but is not kept
+            if future is not None:
+                del _futures[name]
+            if _entries.pop(name, None) is not None:
+                _stats["evictions"] += 1
+            for key in [key for key in _user_activity if key[0] == name]:
+                del _user_activity[key]
+
+
+def is_dataset_loaded(dataset_name):
+    """
+    Check whether a current version of a dataset is already in memory.
+
+    Args:
+        dataset_name (str): Name of the dataset
+
+    Returns:
+        bool: True if get_dataset will return without loading
+    """
+    future = _futures.get(dataset_name)
+    return future is not None and future.done() and future.exception() is None and not _is_stale(dataset_name)
+
+
+def get_versioned_dataset(dataset_name, progress=None, held_version=None):
+    """
+    Get a read-safe view of a dataset and its version, loading it on first use or when stale.
+
+    Args:
+        dataset_name (str): Name of the dataset in utils.dataset_registry
+        progress (callable, optional): Called with every progress event of the load, also
+            when waiting for a load started elsewhere (see utils.load_progress)
+        held_version (str, optional): Version the caller already holds a view of, e.g. a
+            session on a rerun; getting that version again avoids no load, so it is not
+            counted as a hit
+
+    Returns:
+        tuple: (view, version) with a shallow copy-on-write view of the shared cleaned
+        dataset and the version it was loaded from (see get_dataset_version)
+    """
+    if _is_stale(dataset_name):
+        invalidate_dataset(dataset_name)
+    while True:
+        future, is_owner = _claim(dataset_name)
+        if is_owner:
+            with _lock:
+                _stats["misses"] += 1
+            _run_load(dataset_name, future, progress)
+        elif progress is not None:
+            # Relay the progress of the load another session or the prefetcher started
+            last_event = None
+            while not wait([future], timeout=PROGRESS_POLL_SECONDS).done:
+                event = get_load_progress(dataset_name)
+                if event is not None and event is not last_event:
+                    progress(event)
+                    last_event = event
+        try:
+            data, version = future.result()
+        except LoadInterrupted:
+            # The session running the load was rerun or stopped; load it again
+            continue
+        break
+    if not is_owner and version != held_version:
+        _record_hit(dataset_name)
+    return data.copy(deep=False), version
+
+
+def _record_hit(dataset_name):
+    """Count a request served without loading, crediting the load time it saved."""
+    with _lock:
+        _stats["hits"] += 1
+        entry = _entries.get(dataset_name)
+        if entry is not None:
+            entry["hits"] += 1
+            _stats["compute_seconds_saved"] += entry["load_seconds"]
+
+
+def get_dataset(dataset_name, progress=None):
+    """
+    Get a read-safe view of a dataset, loading it on first use or when stale.
+
+    Args:
+        dataset_name (str): Name of the dataset in utils.dataset_registry
+        progress (callable, optional): Called with every progress event of the load, also
+            when waiting for a load started elsewhere (see utils.load_progress)
+
+    Returns:
+        pd.DataFrame: Shallow copy-on-write view of the shared cleaned dataset
+    """
+    return get_versioned_dataset(dataset_name, progress)[0]
+
+
+def get_load_progress(dataset_name):
+    """
+    Get the latest progress event of a dataset's most recent load.
+
+    Args:
+        dataset_name (str): Name of the dataset
+
+    Returns:
+        dict or None: Latest event (see utils.load_progress.LoadProgress), or None if the
+        dataset was never loaded
+    """
+    tracker = _load_progress.get(dataset_name)
+    return tracker.latest if tracker is not None else None
+
+
+def get_user_activity(dataset_name, dataset_version, date_column, user_column):
+    """
+    Get the user activity precomputation of a loaded dataset, computing it on first use.
+
+    Args:
+        dataset_name (str): Name of the dataset
+        dataset_version (str): Version of the caller's view (see get_versioned_dataset);
+            nothing is returned for another version, so a reload never mixes datasets
+        date_column (str): Datetime column
+        user_column (str): User column
+
+    Returns:
+        dict or None: precompute_user_activity output, or None if that version of the
+        dataset is not loaded or the columns do not fit
+    """
+    key = (dataset_name, dataset_version, date_column, user_column)
+    activity = _user_activity.get(key)
+    if activity is not None:
+        return activity
+
+    future = _futures.get(dataset_name)
+    if future is None or not future.done() or future.exception() is not None:
+        return None
+    data, version = future.result()
+    if version != dataset_version or date_column not in data.columns or user_column not in data.columns:
+        return None
+    if not pd.api.types.is_datetime64_any_dtype(data[date_column]):
+        return None
+    activity = precompute_user_activity(data, date_column, user_column)
+    with _lock:
+        if _futures.get(dataset_name) is future:
+            _store_user_activity(key, activity)
+    return activity
+
+
+def get_dataset_entry(dataset_name):
+    """
+    Get the version, load time, resident size, lookups and profile of a loaded dataset.
+
+    Args:
+        dataset_name (str): Name of the dataset
+
+    Returns:
+        dict or None: Dict with version, loaded_at, bytes, load_seconds, hits and profile,
+        or None if not loaded
+    """
+    entry = _entries.get(dataset_name)
+    return dict(entry) if entry is not None else None
+
+
+def get_dataset_profile(dataset_name):
+    """
+    Get the profile of a loaded dataset, computed when it was ingested.
+
+    Args:
+        dataset_name (str): Name of the dataset
+
+    Returns:
+        dict or None: Profile (see utils.dataset_profile.profile_dataset), or None if not loaded
+    """
+    entry = _entries.get(dataset_name)
+    return entry["profile"] if entry is not None else None
+
+
+def get_dataset_store_stats():
+    """
+    Get the counters of the dataset store.
+
+    Returns:
+        dict: hits, misses, evictions, entries, current_bytes (datasets plus their user
+        activity precomputations), max_bytes (None, the store is not size-bounded) and
+        compute_seconds_saved (load time of the datasets served by hits)
+    """
+    with _lock:
+        return {
+            **{key: _stats[key] for key in ("hits", "misses", "evictions")},
+            "entries": len(_entries),
+            "current_bytes": sum(entry["bytes"] for entry in _entries.values()),
+            "max_bytes": None,
+            "compute_seconds_saved": _stats["compute_seconds_saved"],
+        }
+
+
+def get_dataset_entry_stats():
+    """
+    Describe every loaded dataset.
+
+    Returns:
+        list: Dicts with key (dataset name), bytes, age_seconds, compute_seconds (load
+        time) and hits
+    """
+    now = time.time()
+    with _lock:
+        return [
+            {"key": name, "bytes": entry["bytes"], "age_seconds": now - entry["loaded_at"],
+             "compute_seconds": entry["load_seconds"], "hits": entry["hits"]}
+            for name, entry in _entries.items()
+        ]
+
+
+def _column_buffer(column):
+    """The array holding a column's data, to tell whether two columns share memory."""
+    values = column.array
+    if isinstance(values, pd.Categorical):
+        return values.codes
+    return np.asarray(values)
+
+
+def get_session_memory_figure(dataset_name, session_data):
+    """
+    Compare what a session costs with the shared store against a per-session copy.
+
+    Args:
+        dataset_name (str): Name of the dataset the session uses
+        session_data (pd.DataFrame or None): The session's view of the dataset
+
+    Returns:
+        dict or None: Dict with shared_bytes (resident once per process), session_bytes
+        (memory of the session's columns that no longer share data with the stored frame,
+        e.g. after a write copied them) and saved_bytes (the copy each session would hold,
+        and deserialize on every rerun, with st.cache_data); None if the dataset is not
+        loaded
+    """
+    entry = _entries.get(dataset_name)
+    future = _futures.get(dataset_name)
+    if entry is None or future is None or not future.done() or future.exception() is not None:
+        return None
+    stored = future.result()[0]
+    session_bytes = 0
+    if session_data is not None:
+        for name in session_data.columns:
+            column = session_data[name]
+            if name not in stored.columns or not np.shares_memory(_column_buffer(column), _column_buffer(stored[name])):
+                session_bytes += int(column.memory_usage(index=False, deep=True))
+    return {"shared_bytes": entry["bytes"], "session_bytes": session_bytes, "saved_bytes": entry["bytes"]}
+
+
+def prefetch_datasets(dataset_names):
+    """
+    Start loading datasets on a background thread, if prefetching is enabled.
+
+    Datasets that are already loaded or loading are skipped.
+
+    Args:
+        dataset_names (list): Names of the datasets to prefetch
+    """
+    if not PREFETCH_ENABLED:
+        return
+    for dataset_name in dataset_names:
+        future, is_owner = _claim(dataset_name)
+        if is_owner:
+            _prefetch_executor.submit(_run_load, dataset_name, future)
+
+
+def get_likely_next_datasets(dataset_name):
+    """
+    Get the datasets a session viewing dataset_name is likely to switch to.
+
+    Args:
+        dataset_name (str): Name of the dataset currently in use
+
+    Returns:
+        list: Names of the other registered datasets, in registry order
+    """
+    return [name for name in DATASET_REGISTRY if name != dataset_name]
+
+
+def load_ecommerce_data(selected_dataset, progress=None):
+    """
+    Function to load the selected e-commerce dataset into the session state.
+    The session only holds a view of the dataset shared across all sessions.
+
+    Args:
+        selected_dataset (str): Name of the dataset to load
+        progress (callable, optional): Called with every progress event of the load, also
+            when waiting for a load started elsewhere (see utils.load_progress)
+    """
+    if get_dataset_schema(selected_dataset) is not None:
+        # Reruns get the version the session already holds, which is no hit of the store
+        data, version = get_versioned_dataset(selected_dataset, progress, held_version=st.session_state.get("ecommerce_data_version"))
+        st.session_state.ecommerce_data_raw = data
+        st.session_state.ecommerce_data_version = version
+        st.session_state.ecommerce_data_raw_columns = get_dataset_columns(selected_dataset)
+    else:
+        st.session_state.ecommerce_data_raw = None
+        st.session_state.ecommerce_data_version = None
+        st.session_state.ecommerce_data_raw_columns = None
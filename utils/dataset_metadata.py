@@ -0,0 +1,59 @@
+import pandas as pd
+from utils.dataset_registry import get_dataset_schema
+from utils.snapshot_cache import read_snapshot_metadata, snapshot_path
+
+
+def _metadata_from_csv_header(schema):
+    """
+    Describe a dataset from its CSV header and schema, reading no data rows.
+
+    Column names and schema-declared dtypes are exact; columns whose dtype is inferred at
+    read time get None, and row count and date range stay unknown until the dataset has
+    been ingested once and snapshotted.
+
+    Args:
+        schema (dict): Dataset schema from utils.dataset_registry
+
+    Returns:
+        dict: Dict with columns, dtypes, row_count, date_min, date_max and profile
+    """
+    header = pd.read_csv(schema["source_path"], nrows=0, **schema["read_options"]).columns.tolist()
+    dtypes = {column: schema["dtypes"].get(column) for column in header}
+    # Columns created by the ingest step, in the order utils.ingest.clean_dataset adds them
+    for column in schema["datetimes"]:
+        dtypes[column] = "datetime64[ns]"
+    for column in schema["dates"]:
+        dtypes[column] = "datetime64[ns]"
+    for column in schema["products"]:
+        dtypes[column] = "float64"
+    return {
+        "columns": list(dtypes),
+        "dtypes": dtypes,
+        "row_count": None,
+        "date_min": None,
+        "date_max": None,
+        "profile": None,
+    }
+
+
+def get_dataset_metadata(dataset_name, cleaning_version):
+    """
+    Describe a registered dataset without loading it.
+
+    The snapshot footer is used when a current snapshot exists, otherwise the CSV header.
+
+    Args:
+        dataset_name (str): Name of the dataset in utils.dataset_registry
+        cleaning_version (int): Cleaning-code version the snapshot must match
+
+    Returns:
+        dict or None: Dict with columns, dtypes, row_count, date_min, date_max and profile
+        (the last four may be None), or None if the dataset is not registered
+    """
+    schema = get_dataset_schema(dataset_name)
+    if schema is None:
+        return None
+    metadata = read_snapshot_metadata(snapshot_path(schema["snapshot_name"], schema["source_path"], cleaning_version))
+    if metadata is not None:
+        return metadata
+    return _metadata_from_csv_header(schema)
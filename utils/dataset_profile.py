@@ -0,0 +1,110 @@
+"""
+Dataset profiles: summary statistics computed once when a dataset is ingested.
+
+A profile holds the row count, the distinct users of the configured user column, the
+date range and, per column, null counts, cardinalities and numeric summaries. It is
+stored in the dataset's snapshot footer (see utils.snapshot_cache) and kept with the
+loaded dataset (see utils.dataset_manager), so reading it never touches the rows.
+
+Exact distinct counts need memory proportional to the number of distinct values, so
+frames of at least APPROXIMATE_PROFILE_MIN_ROWS rows get K-minimum-values estimates
+instead, which need a fixed DISTINCT_SKETCH_SIZE hashes per column.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+# Frames with at least this many rows get approximate distinct counts
+APPROXIMATE_PROFILE_MIN_ROWS = int(os.environ.get("REPEATRADAR_APPROX_PROFILE_ROWS", "10000000"))
+
+# Hashes kept per column by the distinct-count estimator; relative error is about 1/sqrt(k)
+DISTINCT_SKETCH_SIZE = 4096
+
+
+def estimate_distinct(values, k=DISTINCT_SKETCH_SIZE, chunk_size=1 << 20):
+    """
+    Estimate the number of distinct non-null values with a K-minimum-values sketch.
+
+    Values are hashed to 64 bits a chunk at a time, keeping only the k smallest distinct
+    hashes; with the k-th smallest at fraction u of the hash range, about (k - 1) / u
+    distinct values exist. Below k distinct hashes the count is exact.
+
+    Args:
+        values (pd.Series): Values to count
+        k (int): Sketch size
+        chunk_size (int): Number of values hashed at a time
+
+    Returns:
+        int: Estimated distinct count
+    """
+    values = values.dropna()
+    sketch = np.empty(0, dtype=np.uint64)
+    for start in range(0, len(values), chunk_size):
+        hashes = pd.util.hash_pandas_object(values.iloc[start:start + chunk_size], index=False).to_numpy()
+        sketch = np.union1d(sketch, hashes)[:k]
+    if len(sketch) < k:
+        return len(sketch)
+    kth = float(sketch[k - 1]) / float(np.iinfo(np.uint64).max)
+    return int(round((k - 1) / kth))
+
+
+def _to_json_number(value):
+    """Turn a numpy scalar into a JSON-friendly number, with None for NaN."""
+    if value is None or pd.isna(value):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+def profile_dataset(data, date_column=None, user_column=None, approximate=None):
+    """
+    Compute the profile of a cleaned dataset.
+
+    Args:
+        data (pd.DataFrame): Cleaned dataset
+        date_column (str, optional): Datetime column whose range is recorded
+        user_column (str, optional): Column whose distinct values are the users
+        approximate (bool, optional): Estimate distinct counts; by default only for
+            frames of at least APPROXIMATE_PROFILE_MIN_ROWS rows
+
+    Returns:
+        dict: JSON-serializable profile with row_count, date_min and date_max (ISO
+        strings or None), user_count, approximate, and column_stats mapping each column
+        to its dtype, nulls, distinct and, for numeric columns, min, max, mean and std
+    """
+    if approximate is None:
+        approximate = len(data) >= APPROXIMATE_PROFILE_MIN_ROWS
+    count_distinct = estimate_distinct if approximate else (lambda series: int(series.nunique()))
+
+    column_stats = {}
+    for column in data.columns:
+        series = data[column]
+        stats = {
+            "dtype": str(series.dtype),
+            "nulls": int(series.isna().sum()),
+            "distinct": count_distinct(series),
+        }
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            stats.update({
+                "min": _to_json_number(series.min()),
+                "max": _to_json_number(series.max()),
+                "mean": _to_json_number(series.mean()),
+                "std": _to_json_number(series.std()),
+            })
+        column_stats[column] = stats
+
+    profile = {
+        "row_count": len(data),
+        "date_min": None,
+        "date_max": None,
+        "user_count": None,
+        "approximate": approximate,
+        "column_stats": column_stats,
+    }
+    if date_column is not None and date_column in data.columns and data[date_column].notna().any():
+        profile["date_min"] = data[date_column].min().isoformat()
+        profile["date_max"] = data[date_column].max().isoformat()
+    if user_column is not None and user_column in column_stats:
+        profile["user_count"] = column_stats[user_column]["distinct"]
+    return profile
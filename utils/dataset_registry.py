@@ -0,0 +1,129 @@
+"""
+Declarative schemas for the datasets offered in the dashboard.
+
+Each entry describes how the raw CSV is typed and cleaned by utils.ingest, and which
+columns the dashboard uses for cohort analysis. Adding a dataset means adding an entry here.
+
+Schema keys:
+    source_path: CSV file to read
+    snapshot_name: file prefix for the Arrow snapshot (see utils.snapshot_cache)
+    read_options: extra keyword arguments for pd.read_csv
+    dtypes: column dtypes applied while parsing ("category" for repeated strings and IDs)
+    datetimes: datetime columns to build, parsed from a column with the given format plus
+        optional time-of-day columns (e.g. "12:30:00") added on top
+    dates: columns replaced by the calendar day of a parsed datetime column
+    products: numeric columns computed as the product of other columns
+    downcast_integers: integer columns stored in the smallest integer dtype that fits
+    required_columns: rows with nulls in any of these columns are dropped
+    drop_duplicates: whether fully duplicated rows are dropped
+    date_column, user_column: default columns for cohort analysis
+    default_value_column: suggested value column, or None
+    value_columns: columns offered as value columns in the sidebar
+"""
+
+DATASET_REGISTRY = {
+    "E-commerce Data 1": {
+        "source_path": "data/ecommerce_data_1.csv",
+        "snapshot_name": "ecommerce_data_1",
+        "read_options": {"encoding": "ISO-8859-1"},
+        "dtypes": {
+            "InvoiceNo": "category",
+            "StockCode": "category",
+            "Description": "category",
+            "InvoiceDate": "category",
+            "UnitPrice": "float64",
+            "CustomerID": "category",
+            "Country": "category",
+        },
+        "datetimes": {
+            "InvoiceDateTime": {"columns": ["InvoiceDate"], "format": "%m/%d/%Y %H:%M"},
+        },
+        "dates": {"InvoiceDate": "InvoiceDateTime"},
+        "products": {"TotalPrice": ["Quantity", "UnitPrice"]},
+        "downcast_integers": ["Quantity"],
+        "required_columns": ["CustomerID"],
+        "drop_duplicates": True,
+        "date_column": "InvoiceDateTime",
+        "user_column": "CustomerID",
+        "default_value_column": "TotalPrice",
+        "value_columns": ["InvoiceNo", "Quantity", "StockCode", "TotalPrice"],
+    },
+    "E-commerce Data 2": {
+        "source_path": "data/ecommerce_data_2.csv",
+        "snapshot_name": "ecommerce_data_2",
+        "read_options": {},
+        "dtypes": {
+            "Order_Date": "category",
+            "Time": "category",
+            "Gender": "category",
+            "Device_Type": "category",
+            "Customer_Login_type": "category",
+            "Product_Category": "category",
+            "Product": "category",
+            "Order_Priority": "category",
+            "Payment_method": "category",
+        },
+        "datetimes": {
+            "OrderedDateTime": {"columns": ["Order_Date", "Time"], "format": "%Y-%m-%d"},
+        },
+        "dates": {"Order_Date": "OrderedDateTime"},
+        "products": {},
+        "downcast_integers": ["Customer_Id"],
+        "required_columns": ["OrderedDateTime", "Customer_Id"],
+        "drop_duplicates": True,
+        "date_column": "OrderedDateTime",
+        "user_column": "Customer_Id",
+        "default_value_column": None,
+        "value_columns": ["Sales", "Profit", "Product"],
+    },
+}
+
+
+def get_dataset_schema(dataset_name):
+    """
+    Get the registered schema for a dataset.
+
+    Args:
+        dataset_name (str): Name of the dataset as shown in the dashboard
+
+    Returns:
+        dict or None: The dataset schema, or None if the dataset is not registered
+    """
+    return DATASET_REGISTRY.get(dataset_name)
+
+
+def get_auto_columns(dataset_name, columns):
+    """
+    Get the date, customer, and value columns for a dataset from its schema.
+
+    Args:
+        dataset_name (str): Name of the dataset
+        columns (list): Column names available in the loaded dataset
+
+    Returns:
+        tuple: (date_column, customer_column, value_column), any of which may be None
+    """
+    schema = get_dataset_schema(dataset_name)
+    if not columns or schema is None:
+        return None, None, None
+    date_col = schema["date_column"] if schema["date_column"] in columns else columns[0]
+    cust_col = schema["user_column"] if schema["user_column"] in columns else columns[0]
+    value_col = schema["default_value_column"] if schema["default_value_column"] in columns else None
+    return date_col, cust_col, value_col
+
+
+def get_value_columns(dataset_name, columns):
+    """
+    Get the value columns offered for a dataset that are present in its loaded columns.
+
+    Args:
+        dataset_name (str): Name of the dataset
+        columns (list): Column names available in the loaded dataset
+
+    Returns:
+        list: Allowed value column names
+    """
+    schema = get_dataset_schema(dataset_name)
+    if schema is None:
+        return []
+    return [col for col in schema["value_columns"] if col in columns]
@@ -0,0 +1,239 @@
+"""
+Out-of-core cohort backend on DuckDB.
+
+The pandas engine (utils.cohort_engine) needs the whole transaction table in memory.
+compute_cohort_tables_duckdb instead pushes the first-seen dates, the cohort and period
+bucketing and the aggregations down to DuckDB, which scans Parquet or CSV files (or globs
+of them) on disk in parallel on all cores and spills to disk beyond its memory limit, so
+only the cohort tables themselves are ever materialized in Python. It returns the same
+tables as compute_cohort_tables.
+
+    python -m utils.duckdb_cohorts "transactions/*.parquet" InvoiceDate CustomerID --period M --duration 30 --output tables/
+
+The input must already be clean transactions: a timestamp column (or a string column
+parsed with date_format), a user column and optionally a value column. Files written by
+utils.synthetic_data.write_synthetic_parquet can be used as they are.
+
+The dashboard uses this backend instead of the pandas engine when REPEATRADAR_COHORT_BACKEND
+is set to duckdb (see cached_cohort_tables). It then scans the cleaned dataset that is
+already in memory, in place and on all cores, so there it saves CPU time but not memory;
+the out-of-core case is this module's command line on the files themselves.
+
+DuckDB is an optional dependency (pip install "repeatradar-demo[duckdb]", or uv run --with
+duckdb); the rest of the dashboard does not need it.
+"""
+
+import argparse
+import os
+import re
+
+import numpy as np
+import pandas as pd
+from utils.cohort_engine import COHORT_PERIODS, aggregated_dtype, format_cohort_matrix, period_duration_days, retention_percentages
+from utils.precompute import write_cohort_table
+
+# DuckDB date_trunc units of the cohort periods; weeks start on Monday like pandas' 'W'
+DATE_TRUNC_UNITS = {'D': 'day', 'W': 'week', 'M': 'month', 'Q': 'quarter', 'Y': 'year'}
+
+# SQL of the value aggregations, matching pandas' groupby aggregations of the same name
+SQL_AGGREGATIONS = {
+    'sum': "coalesce(sum(value), 0)",
+    'mean': "avg(value)",
+    'count': "count(value)",
+    'median': "median(value)",
+    'nunique': "count(DISTINCT value)",
+}
+
+MICROSECONDS_PER_DAY = 86_400_000_000
+
+# DuckDB memory limits, e.g. '4GB' or '500 MiB'; SET does not take bound parameters
+_MEMORY_LIMIT_PATTERN = re.compile(r"\d+(\.\d+)?\s*([KMGT]i?B|bytes)", re.IGNORECASE)
+
+
+def import_duckdb():
+    """Import duckdb, explaining how to install it if it is missing."""
+    try:
+        import duckdb
+    except ImportError as e:
+        raise ImportError("The DuckDB cohort backend needs the duckdb package: pip install duckdb") from e
+    return duckdb
+
+
+def _quote(identifier):
+    """Quote a column name for SQL."""
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _scan(source):
+    """
+    SQL table expression reading the source, and the parameters it binds.
+
+    Args:
+        source (str or list or pd.DataFrame): Parquet or CSV path or glob, a list of
+            them, or a DataFrame (scanned in place)
+
+    Returns:
+        tuple: (SQL expression, list of parameters)
+    """
+    if isinstance(source, pd.DataFrame):
+        return "source_frame", []
+    paths = [source] if isinstance(source, str) else list(source)
+    if all(path.lower().endswith(".parquet") for path in paths):
+        return "read_parquet(?)", [paths]
+    if all(path.lower().endswith((".csv", ".csv.gz")) for path in paths):
+        return "read_csv(?)", [paths]
+    raise ValueError("source must be Parquet or CSV files (by .parquet or .csv extension) or a DataFrame")
+
+
+def compute_cohort_tables_duckdb(source, date_column, user_column, cohort_period='M', period_duration=30,
+                                 value_column=None, aggregation_function='sum', output_format='pivot',
+                                 date_format=None, threads=None, memory_limit=None):
+    """
+    Compute the active-user, retention and optional value cohort tables with DuckDB.
+
+    Args:
+        source (str or list or pd.DataFrame): Parquet or CSV path or glob, a list of
+            them, or a DataFrame
+        date_column (str): Timestamp column, or string column if date_format is given
+        user_column (str): User column
+        cohort_period (str): Cohort grouping period ('D', 'W', 'M', 'Q', 'Y')
+        period_duration (int or str): Period duration in days, or a period string
+        value_column (str, optional): Column to aggregate for the value table
+        aggregation_function (str): One of SQL_AGGREGATIONS
+        output_format (str): 'pivot' or 'long'
+        date_format (str, optional): strptime format of a string date_column
+        threads (int, optional): DuckDB threads; defaults to all cores
+        memory_limit (str, optional): DuckDB memory limit, e.g. '4GB'; beyond it DuckDB
+            spills to disk
+
+    Returns:
+        dict: counts, retention and values tables (values is None without value_column),
+        as compute_cohort_tables returns them
+
+    Raises:
+        ImportError: If duckdb is not installed
+        ValueError: If a parameter or the source is invalid
+        TypeError: If the value column does not support the aggregation
+    """
+    duckdb = import_duckdb()
+    if cohort_period not in DATE_TRUNC_UNITS:
+        raise ValueError(f"cohort_period must be one of {', '.join(DATE_TRUNC_UNITS)}")
+    if output_format not in ['long', 'pivot']:
+        raise ValueError("output_format must be either 'long' or 'pivot'")
+    if value_column is not None and aggregation_function not in SQL_AGGREGATIONS:
+        raise ValueError(f"aggregation_function must be one of {', '.join(SQL_AGGREGATIONS)}")
+    if memory_limit is not None and not _MEMORY_LIMIT_PATTERN.fullmatch(str(memory_limit)):
+        raise ValueError("memory_limit must be a size such as '4GB' or '500MiB'")
+
+    scan, parameters = _scan(source)
+    connection = duckdb.connect()
+    try:
+        if threads is not None:
+            connection.execute(f"SET threads = {int(threads)}")
+        if memory_limit is not None:
+            connection.execute(f"SET memory_limit = '{memory_limit}'")  # validated above
+        if isinstance(source, pd.DataFrame):
+            connection.register("source_frame", source)
+
+        columns = connection.execute(f"SELECT * FROM {scan} LIMIT 0", parameters).df().columns
+        for column in [date_column, user_column] + ([value_column] if value_column is not None else []):
+            if column not in columns:
+                raise ValueError(f"Column '{column}' not found in data")
+
+        date = _quote(date_column)
+        # The format is bound as a parameter; it comes before those of the scan in the query
+        timestamp = f"strptime(CAST({date} AS VARCHAR), ?)" if date_format else f"CAST({date} AS TIMESTAMP)"
+        query_parameters = ([date_format] if date_format else []) + parameters
+        value, value_aggregation, sample = "", "", None
+        if value_column is not None:
+            sample = connection.execute(f"SELECT {_quote(value_column)} FROM {scan} LIMIT 1", parameters).df()[value_column]
+            value = f", {_quote(value_column)} AS value"
+            value_aggregation = f", {SQL_AGGREGATIONS[aggregation_function]} AS value"
+            if aggregation_function == 'sum' and pd.api.types.is_integer_dtype(sample):
+                # DuckDB sums integers into 128 bits; pandas sums them in 64
+                value_aggregation = f", CAST({SQL_AGGREGATIONS['sum']} AS BIGINT) AS value"
+        # Days since first seen are floored from the exact elapsed time, like the pandas engine
+        query = f"""
+            WITH transactions AS (
+                SELECT {_quote(user_column)} AS user_id, {timestamp} AS ts{value}
+                FROM {scan}
+            ),
+            kept AS (
+                SELECT * FROM transactions WHERE user_id IS NOT NULL AND ts IS NOT NULL
+            ),
+            first_seen AS (
+                SELECT user_id, min(ts) AS first_ts FROM kept GROUP BY user_id
+            ),
+            cells AS (
+                SELECT
+                    date_trunc('{DATE_TRUNC_UNITS[cohort_period]}', first_seen.first_ts) AS cohort,
+                    (epoch_us(kept.ts) - epoch_us(first_seen.first_ts))
+                        // {MICROSECONDS_PER_DAY * int(period_duration_days(period_duration))} AS period_number,
+                    kept.*
+                FROM kept JOIN first_seen USING (user_id)
+            )
+            SELECT cohort, period_number, count(DISTINCT user_id) AS users{value_aggregation}
+            FROM cells
+            GROUP BY cohort, period_number
+        """
+        try:
+            cells = connection.execute(query, query_parameters).df()
+        except duckdb.BinderException as e:
+            # e.g. summing a text column, which pandas rejects with a TypeError too
+            raise TypeError(str(e)) from e
+    finally:
+        connection.close()
+
+    cohorts = pd.DatetimeIndex(np.sort(cells["cohort"].unique()), name='cohort_period').as_unit('ns')
+    n_periods = int(cells["period_number"].max()) + 1 if len(cells) else 0
+    cohort_index = cohorts.get_indexer(cells["cohort"])
+    period_number = cells["period_number"].to_numpy(np.int64)
+
+    counts = np.zeros((len(cohorts), n_periods), dtype=np.int64)
+    counts[cohort_index, period_number] = cells["users"].to_numpy(np.int64)
+    tables = {
+        "counts": format_cohort_matrix(counts, cohorts, output_format, np.int32),
+        "retention": format_cohort_matrix(retention_percentages(counts), cohorts, output_format, np.float32),
+        "values": None,
+    }
+
+    if value_column is not None:
+        values = cells["value"].to_numpy()
+        matrix = np.zeros((len(cohorts), n_periods), dtype=values.dtype)
+        matrix[cohort_index, period_number] = values
+        matrix = matrix.astype(aggregated_dtype(sample, aggregation_function, matrix))
+        # repeatradar keeps count/nunique of non-float columns as integers in the pivot
+        integer_result = aggregation_function in ['count', 'nunique'] and not pd.api.types.is_float_dtype(sample)
+        tables["values"] = format_cohort_matrix(matrix, cohorts, output_format, np.int32 if integer_result else None)
+
+    return tables
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute cohort tables of Parquet or CSV files out of core with DuckDB.")
+    parser.add_argument("source", nargs="+", help="Parquet or CSV files or globs")
+    parser.add_argument("date_column")
+    parser.add_argument("user_column")
+    parser.add_argument("--period", choices=COHORT_PERIODS, default="M", help="Cohort period")
+    parser.add_argument("--duration", type=int, default=30, help="Period duration in days")
+    parser.add_argument("--value-column", help="Column to aggregate for a value table")
+    parser.add_argument("--aggregation", choices=list(SQL_AGGREGATIONS), default="sum", help="Aggregation of the value column")
+    parser.add_argument("--date-format", help="strptime format of a string date column")
+    parser.add_argument("--threads", type=int, help="DuckDB threads (default: all cores)")
+    parser.add_argument("--memory-limit", help="DuckDB memory limit, e.g. 4GB")
+    parser.add_argument("--output", default=".", help="Directory receiving counts.parquet, retention.parquet and values.parquet")
+    args = parser.parse_args(argv)
+
+    tables = compute_cohort_tables_duckdb(
+        args.source, args.date_column, args.user_column, args.period, args.duration,
+        value_column=args.value_column, aggregation_function=args.aggregation,
+        date_format=args.date_format, threads=args.threads, memory_limit=args.memory_limit,
+    )
+    for name, table in tables.items():
+        if table is not None:
+            write_cohort_table(table, os.path.join(args.output, f"{name}.parquet"))
+            print(f"{name}: {table.shape[0]} cohorts x {table.shape[1]} periods")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,422 @@
+import hashlib
+import os
+import time
+import weakref
+from concurrent.futures import CancelledError, wait
+
+import numpy as np
+import pyarrow as pa
+from plotly.colors import cyclical, diverging, qualitative, sequential
 import streamlit as st
 import pandas as pd
-from repeatradar import generate_cohort_data, plot_cohort_heatmap
- 
-def handle_generate_cohort_data(data, date_column, customer_id_column, cohort_period, period_duration, value_column=None, aggregation_function=None, output_format='pivot', **kwargs):
+from repeatradar import plot_cohort_heatmap
+from utils.cohort_engine import check_cancelled, compute_cohort_tables
+from utils.duckdb_cohorts import compute_cohort_tables_duckdb, import_duckdb
+from utils.precompute import load_precomputed_tables
+from utils.result_cache import cohort_cache_key, get_result_cache
+from utils.result_store import get_result_store
+
+# Engine computing the cohort tables that are not cached: "pandas" (utils.cohort_engine)
+# or "duckdb" (utils.duckdb_cohorts, which needs the optional duckdb package)
+COHORT_BACKEND = os.environ.get("REPEATRADAR_COHORT_BACKEND", "pandas")
+if COHORT_BACKEND not in ("pandas", "duckdb"):
+    raise ValueError(f"REPEATRADAR_COHORT_BACKEND must be 'pandas' or 'duckdb', not {COHORT_BACKEND!r}")
+if COHORT_BACKEND == "duckdb":
+    # Fail at startup rather than on the first analysis
+    import_duckdb()
+
+# How often a caller waiting for tables another caller computes checks for its own cancellation
+IN_FLIGHT_POLL_SECONDS = 0.1
+
+# Heatmaps with more cells than this are drawn without per-cell value labels
+HEATMAP_ANNOTATION_MAX_CELLS = 2500
+
+# Result tables are shown in pages of this many cohorts and periods
+TABLE_ROWS_PER_PAGE = 50
+TABLE_COLUMNS_PER_PAGE = 40
+
+# Display-ready Arrow tables by id of the result table they show, dropped with the result
+_display_tables = {}
+
+# Lower-cased names of the colour scales plot_cohort_heatmap accepts, reversed ('_r') ones included
+COLOR_SCALE_NAMES = frozenset(
+    name.lower() + suffix
+    for module in (sequential, diverging, cyclical, qualitative)
+    for name, value in vars(module).items()
+    if not name.startswith("_") and isinstance(value, list)
+    for suffix in ("", "_r")
+)
+
+# Longer heatmap axes are averaged in blocks down to at most this many rows or columns,
+# which keeps the browser payload and render time flat however long the history is
+HEATMAP_MAX_AXIS_LENGTH = 150
+
+
+def format_bytes(num_bytes):
+    """Format a byte count for display, e.g. 1536 -> '1.5 KB'."""
+    for unit in ["B", "KB", "MB", "GB"]:
+        if abs(num_bytes) < 1024 or unit == "GB":
+            return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+def matrix_fingerprint(cohort_data):
+    """
+    Compute a content hash of a cohort table, covering its values, index and columns.
+
+    Args:
+        cohort_data (pd.DataFrame): Cohort table in pivot format
+
+    Returns:
+        str: Hex digest of the table's SHA-256 hash
+    """
+    values = cohort_data.to_numpy()
+    if values.dtype == object:
+        digest = hashlib.sha256(pd.util.hash_pandas_object(cohort_data, index=False).to_numpy().tobytes())
+    else:
+        # Hashing the raw buffer is much faster than hashing each value
+        digest = hashlib.sha256(np.ascontiguousarray(values).view(np.uint8))
+        digest.update(str(values.dtype).encode())
+    digest.update(pd.util.hash_pandas_object(cohort_data.index).to_numpy().tobytes())
+    digest.update(repr(cohort_data.columns.tolist()).encode())
+    return digest.hexdigest()
 
-        # Handle the case where value_column is provided but aggregation_function is None
-        if value_column and value_column != "None" and aggregation_function is None:
-            aggregation_function = "sum"  # Default to sum when value column is used
+def downsample_cohort_table(cohort_data, max_length=HEATMAP_MAX_AXIS_LENGTH):
+    """
+    Average blocks of neighbouring cohorts and periods so that neither axis exceeds max_length.
+    
+    Args:
+        cohort_data (pd.DataFrame): Cohort table in pivot format
+        max_length (int): Maximum number of rows and of columns
         
-        # If no value column, set both to None
-        if not value_column or value_column == "None":
-            value_column = None
-            aggregation_function = None
+    Returns:
+        tuple: (table, (row_block, column_block)) where each row of table is labelled with
+        the first cohort of its block and each column with its period range, e.g. '0-6'
+    """
+    n_rows, n_columns = cohort_data.shape
+    row_block = max(-(-n_rows // max_length), 1)
+    column_block = max(-(-n_columns // max_length), 1)
+    if row_block == 1 and column_block == 1:
+        return cohort_data, (1, 1)
 
-        # Dataframe output
-        with st.spinner("Generating cohort analysis..."):
-            st.session_state.cohort_data = generate_cohort_data(
+    # Block means skip missing cells, like pandas' mean: sum the present values of each
+    # block, padded with zeros to whole blocks, and divide by the number of present cells
+    n_row_blocks, n_column_blocks = -(-n_rows // row_block), -(-n_columns // column_block)
+    data = cohort_data.to_numpy(dtype=np.float64)
+    missing = np.isnan(data)
+    values = np.zeros((n_row_blocks * row_block, n_column_blocks * column_block))
+    values[:n_rows, :n_columns] = np.where(missing, 0, data) if missing.any() else data
+    sums = values.reshape(n_row_blocks, row_block, n_column_blocks, column_block).sum(axis=(1, 3))
+    row_sizes = np.diff(np.minimum(np.arange(n_row_blocks + 1) * row_block, n_rows))
+    column_sizes = np.diff(np.minimum(np.arange(n_column_blocks + 1) * column_block, n_columns))
+    cells = np.outer(row_sizes, column_sizes)
+    if missing.any():
+        missing_cells = np.zeros(values.shape)
+        missing_cells[:n_rows, :n_columns] = missing
+        cells = cells - missing_cells.reshape(n_row_blocks, row_block, n_column_blocks, column_block).sum(axis=(1, 3))
+    with np.errstate(invalid="ignore"):
+        means = sums / cells
+
+    if column_block > 1:
+        periods = cohort_data.columns
+        columns = [f"{periods[start]}-{periods[min(start + column_block, n_columns) - 1]}" for start in range(0, n_columns, column_block)]
+    else:
+        columns = cohort_data.columns
+    return pd.DataFrame(means, index=cohort_data.index[::row_block], columns=columns), (row_block, column_block)
+
+def validate_color_scale(color_scale):
+    """
+    Check a colour scale name the way plot_cohort_heatmap does.
+
+    Raises:
+        ValueError: If color_scale is not a Plotly colour scale name, optionally with '_r'
+    """
+    if color_scale.lower() not in COLOR_SCALE_NAMES:
+        raise ValueError(f"Invalid color scale '{color_scale}'. Must be one of the valid Plotly color scales.")
+
+def cached_cohort_heatmap(figure_key, cohort_data, title, color_scale="Blues", show_colorscale=True, **layout_options):
+    """
+    Get a cohort heatmap figure, building it only when its data, title or layout change.
+    Colour scale and legend changes restyle the session's existing figure instead of rebuilding it.
+    Large tables are drawn compactly: block averages beyond HEATMAP_MAX_AXIS_LENGTH rows or
+    columns, and beyond HEATMAP_ANNOTATION_MAX_CELLS cells no value labels and float32 cell values.
+    
+    Args:
+        figure_key (str): Name of the chart slot on the page, e.g. "main" or "retention"
+        cohort_data (pd.DataFrame): Cohort table in pivot format
+        title (str): Heatmap title
+        color_scale (str): Plotly colour scale name, optionally with an '_r' suffix
+        show_colorscale (bool): Whether to show the colour bar
+        **layout_options: Other plot_cohort_heatmap arguments (show_values, width, ...)
+        
+    Returns:
+        go.Figure: The session's figure for this slot; pass it straight to st.plotly_chart
+    """
+    validate_color_scale(color_scale)
+    # Figures are kept per session, as restyling mutates them
+    figures = st.session_state.setdefault("heatmap_figures", {})
+    layout_key = (title, tuple(sorted(layout_options.items())))
+    entry = figures.get(figure_key)
+    # Cached tables are shared read-only, so the same object means the same matrix; other
+    # objects are only hashed, once per figure, when they could still hold the same matrix
+    if entry is not None and entry["layout"] == layout_key and entry["data"] is not cohort_data:
+        if entry["fingerprint"] is None:
+            entry["fingerprint"] = matrix_fingerprint(entry["data"])
+        if entry["fingerprint"] != matrix_fingerprint(cohort_data):
+            entry = None
+    if entry is None or entry["layout"] != layout_key:
+        table, (row_block, column_block) = downsample_cohort_table(cohort_data)
+        plot_options = dict(layout_options)
+        show_values = plot_options.get("show_values", True) and table.size <= HEATMAP_ANNOTATION_MAX_CELLS
+        plot_options["show_values"] = show_values
+        if (row_block, column_block) != (1, 1):
+            title = f"{title} (averages of {row_block}×{column_block} cell blocks)"
+        if not show_values:
+            # Plotly sends numpy arrays base64-encoded, so float32 halves the payload of
+            # float64 cells. Tables with value labels keep their exact values, which the
+            # labels show; they have at most HEATMAP_ANNOTATION_MAX_CELLS cells anyway.
+            table = table.astype(np.float32)
+        figure = plot_cohort_heatmap(cohort_data=table, title=title, color_scale=color_scale,
+                                     show_colorscale=show_colorscale, **plot_options)
+        entry = {
+            "data": cohort_data,
+            "fingerprint": None,
+            "layout": layout_key,
+            "figure": figure,
+        }
+        figures[figure_key] = entry
+    else:
+        entry["data"] = cohort_data
+        entry["figure"].update_traces(colorscale=color_scale, showscale=show_colorscale)
+    return entry["figure"]
+
+def display_ready_table(cohort_data):
+    """
+    Get a result table as an Arrow table ready for st.dataframe, converting it only once.
+    
+    The cohort_period index becomes a leading date column. Conversions are cached for as
+    long as the result table itself is alive, so reruns reuse them without copying.
+    
+    Args:
+        cohort_data (pd.DataFrame): Cohort table in pivot format; treated as read-only
+        
+    Returns:
+        pa.Table: Cohort dates followed by one column per period
+    """
+    key = id(cohort_data)
+    entry = _display_tables.get(key)
+    if entry is not None and entry[0]() is cohort_data:
+        return entry[1]
+
+    table = pa.Table.from_pandas(cohort_data.reset_index(), preserve_index=False)
+    if pa.types.is_timestamp(table.schema.field(0).type):
+        table = table.set_column(0, table.schema.field(0).name, table.column(0).cast(pa.date32()))
+    _display_tables[key] = (weakref.ref(cohort_data, lambda _: _display_tables.pop(key, None)), table)
+    return table
+
+def show_paginated_table(key, table, rows_per_page=TABLE_ROWS_PER_PAGE, columns_per_page=TABLE_COLUMNS_PER_PAGE):
+    """
+    Show a display-ready table one page of cohorts and periods at a time.
+    Only the visible window is sliced (without copying) and sent to the browser.
+    
+    Args:
+        key (str): Unique widget key prefix for the page selectors
+        table (pa.Table): Output of display_ready_table
+        rows_per_page (int): Cohorts per page
+        columns_per_page (int): Periods per page; the cohort column is always shown
+    """
+    n_periods = table.num_columns - 1
+    row_pages = max(-(-table.num_rows // rows_per_page), 1)
+    column_pages = max(-(-n_periods // columns_per_page), 1)
+    row_page, column_page = 1, 1
+    if row_pages > 1 or column_pages > 1:
+        nav_col1, nav_col2 = st.columns(2)
+        with nav_col1:
+            if row_pages > 1:
+                row_page = st.number_input(f"Cohort page (of {row_pages})", min_value=1, max_value=row_pages, value=1, key=f"{key}_row_page")
+        with nav_col2:
+            if column_pages > 1:
+                column_page = st.number_input(f"Period page (of {column_pages})", min_value=1, max_value=column_pages, value=1, key=f"{key}_column_page")
+
+    first_row = (row_page - 1) * rows_per_page
+    first_column = 1 + (column_page - 1) * columns_per_page
+    window = table.slice(first_row, rows_per_page).select(
+        [0] + list(range(first_column, min(first_column + columns_per_page, table.num_columns))))
+    st.dataframe(window, use_container_width=True, hide_index=True)
+    if row_pages > 1 or column_pages > 1:
+        st.caption(
+            f"Showing cohorts {first_row + 1}-{first_row + window.num_rows} of {table.num_rows} "
+            f"and periods {window.column_names[1]}-{window.column_names[-1]} of {n_periods}"
+        )
+
+def cached_cohort_tables(data, dataset_version, date_column, user_column, cohort_period, period_duration, value_column=None, aggregation_function=None, output_format='pivot', user_activity=None, cancel_event=None, background=False):
+    """
+    Get the main and retention cohort tables through the result cache shared by all sessions.
+    Tables missing from the cache are read from the precomputed tables of utils.precompute
+    or the persistent result store (utils.result_store) if they are there, and otherwise
+    all computed in a single pass of the cohort engine, or of DuckDB if COHORT_BACKEND is
+    "duckdb", and saved to both caches. Callers asking for tables another caller is
+    computing wait for that computation instead of repeating it.
+    
+    Args:
+        data (pd.DataFrame): Transaction data
+        dataset_version (str or None): Version of data (see get_dataset_version); results
+            for data without a version are computed but not cached
+        user_activity (dict, optional): Precomputed user first-seen dates and day offsets
+            of data (see precompute_user_activity), re-binned instead of recomputed
+        cancel_event (threading.Event, optional): Stops the computation with
+            CancelledError once set (see compute_cohort_tables)
+        background (bool): For the warm-up: cache lookups are left out of the hit and miss
+            statistics, and tables another caller is computing are skipped, not waited for
+        Remaining arguments are as for repeatradar's generate_cohort_data.
+        
+    Returns:
+        tuple or None: (main_table, retention_table), where main_table holds the value
+        aggregation if value_column is set and active-user counts otherwise; treat both as
+        read-only. None if background is set and the tables are being computed elsewhere.
+    """
+    cache, store = get_result_cache(), get_result_store()
+    main_key = cohort_cache_key(dataset_version, date_column, user_column, cohort_period, period_duration,
+                                value_column, aggregation_function, False, output_format)
+    counts_key = cohort_cache_key(dataset_version, date_column, user_column, cohort_period, period_duration,
+                                  None, None, False, output_format)
+    retention_key = cohort_cache_key(dataset_version, date_column, user_column, cohort_period, period_duration,
+                                     None, None, True, output_format)
+
+    def compute():
+        """Compute the tables in one pass and save them to both caches."""
+        started_at = time.perf_counter()
+        if COHORT_BACKEND == "duckdb":
+            # A DuckDB query cannot be stopped halfway, so cancellation is checked around it
+            check_cancelled(cancel_event)
+            tables = compute_cohort_tables_duckdb(
+                source=data,
+                date_column=date_column,
+                user_column=user_column,
+                cohort_period=cohort_period,
+                period_duration=period_duration,
+                value_column=value_column,
+                aggregation_function=aggregation_function,
+                output_format=output_format,
+            )
+            check_cancelled(cancel_event)
+        else:
+            tables = compute_cohort_tables(
                 data=data,
                 date_column=date_column,
-                user_column=customer_id_column,
+                user_column=user_column,
                 cohort_period=cohort_period,
                 period_duration=period_duration,
-                calculate_retention_rate=False,
                 value_column=value_column,
                 aggregation_function=aggregation_function,
                 output_format=output_format,
+                user_activity=user_activity,
+                cancel_event=cancel_event,
             )
+        main_table = tables["values"] if value_column is not None else tables["counts"]
+        if dataset_version is not None:
+            # A hit serves the main and retention tables together, so the compute time it
+            # saves is credited once, on the main table
+            compute_seconds = time.perf_counter() - started_at
+            cache.put(counts_key, tables["counts"])
+            cache.put(retention_key, tables["retention"])
+            cache.put(main_key, main_table, compute_seconds=compute_seconds)
+            store.put(retention_key, tables["retention"])
+            store.put(main_key, main_table, compute_seconds=compute_seconds)
+        return main_table, tables["retention"]
+
+    if dataset_version is None:
+        return compute()
+
+    record = not background
+    main_table, retention_table = cache.get(main_key, record=record), cache.get(retention_key, record=record)
+    if main_table is not None and retention_table is not None:
+        return main_table, retention_table
+    if output_format == 'pivot':
+        precomputed = load_precomputed_tables(dataset_version, date_column, user_column, cohort_period, period_duration,
+                                              value_column, aggregation_function, record=record)
+        if precomputed is not None:
+            cache.put(main_key, precomputed[0])
+            cache.put(retention_key, precomputed[1])
+            return precomputed
+    main_table, retention_table = store.get(main_key, record=record), store.get(retention_key, record=record)
+    if main_table is not None and retention_table is not None:
+        cache.put(main_key, main_table)
+        cache.put(retention_key, retention_table)
+        return main_table, retention_table
+
+    future, is_owner = cache.claim(main_key)
+    while not is_owner:
+        if background:
+            return None
+        # Wait for the caller computing these tables, e.g. the warm-up
+        while not wait([future], timeout=IN_FLIGHT_POLL_SECONDS).done:
+            check_cancelled(cancel_event)
+        try:
+            return future.result()
+        except CancelledError:
+            # That caller's analysis was cancelled, not this one: compute it here
+            check_cancelled(cancel_event)
+        future, is_owner = cache.claim(main_key)
+    try:
+        tables = compute()
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(tables)
+    finally:
+        cache.release(main_key, future)
+    return tables
 
-            # Always generate retention rate data regardless of value column
-            # This provides additional insights even for value-based analysis
-            st.session_state.cohort_data_percent = generate_cohort_data(
+def resolve_value_analysis(data, value_column, aggregation_function):
+    """
+    Turn the sidebar's value column and aggregation selection into cohort arguments.
+
+    Args:
+        data (pd.DataFrame): Transaction data
+        value_column (str or None): Selected value column ("None" or None for user counts)
+        aggregation_function (str or None): Selected aggregation; defaults to sum
+
+    Returns:
+        tuple: (value_column, aggregation_function), both None for a user count analysis
+
+    Raises:
+        ValueError: If the aggregation is not supported for the column
+    """
+    # Handle the case where value_column is provided but aggregation_function is None
+    if value_column and value_column != "None" and aggregation_function is None:
+        aggregation_function = "sum"  # Default to sum when value column is used
+
+    # If no value column, set both to None
+    if not value_column or value_column == "None":
+        return None, None
+
+    # Categorical columns (IDs, product names) only support counting aggregations
+    if isinstance(data[value_column].dtype, pd.CategoricalDtype) and aggregation_function not in ("count", "nunique"):
+        raise ValueError(f"'{aggregation_function}' is not supported for the categorical column '{value_column}'. Use 'count' or 'nunique' instead.")
+    return value_column, aggregation_function
+
+def handle_generate_cohort_data(data, date_column, customer_id_column, cohort_period, period_duration, value_column=None, aggregation_function=None, output_format='pivot', dataset_version=None, user_activity=None, **kwargs):
+
+        try:
+            value_column, aggregation_function = resolve_value_analysis(data, value_column, aggregation_function)
+        except ValueError as e:
+            st.error(f"⚠️ {e}")
+            return
+
+        # Dataframe output
+        # Retention rates are always generated regardless of value column, this provides
+        # additional insights even for value-based analysis
+        with st.spinner("Generating cohort analysis..."):
+            st.session_state.cohort_data, st.session_state.cohort_data_percent = cached_cohort_tables(
                 data=data,
+                dataset_version=dataset_version,
                 date_column=date_column,
                 user_column=customer_id_column,
                 cohort_period=cohort_period,
                 period_duration=period_duration,
-                calculate_retention_rate=True,
-                value_column=None,  # Always None for retention rate
-                aggregation_function=None,  # Always None for retention rate
+                value_column=value_column,
+                aggregation_function=aggregation_function,
                 output_format=output_format,
-            )
\ No newline at end of file
+                user_activity=user_activity,
+            )
@@ -0,0 +1,115 @@
+import io
+
+import numpy as np
+import pandas as pd
+from utils.load_progress import ProgressReader
+
+
+def _map_categories(series, parse):
+    """
+    Apply a vectorized parser to the distinct values of a column only.
+
+    Date and time strings repeat heavily in transaction data, so parsing the categories and
+    mapping them back through the category codes is much cheaper than parsing every row.
+
+    Args:
+        series (pd.Series): Column to parse
+        parse (callable): Function parsing an Index of strings into a datetime-like Index
+
+    Returns:
+        np.ndarray: Parsed values, with NaT where the input was null
+    """
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype("category")
+    parsed = parse(series.cat.categories.astype(str)).to_numpy()
+    # Code -1 marks a null value and picks the NaT appended at the end
+    parsed = np.append(parsed, np.array(["NaT"], dtype=parsed.dtype))
+    return parsed[series.cat.codes.to_numpy()]
+
+
+def build_datetime(data, columns, date_format):
+    """
+    Build a datetime column from a date column and optional time-of-day columns.
+
+    Args:
+        data (pd.DataFrame): Frame holding the source columns
+        columns (list): Source column names; the first is parsed with date_format, the rest as
+            time-of-day offsets such as "12:30:00"
+        date_format (str): strftime format of the first column
+
+    Returns:
+        pd.Series: The parsed datetime64 column
+    """
+    values = _map_categories(data[columns[0]], lambda x: pd.to_datetime(x, format=date_format))
+    for time_column in columns[1:]:
+        values = values + _map_categories(data[time_column], pd.to_timedelta)
+    return pd.Series(values, index=data.index)
+
+
+def _report(progress, message, stage):
+    """Send a progress message for a pipeline stage to the optional progress callback."""
+    if progress is not None:
+        progress(message, stage=stage)
+
+
+def clean_dataset(data, schema, progress=None):
+    """
+    Apply the typing and cleaning rules of a dataset schema to a freshly read frame.
+
+    Args:
+        data (pd.DataFrame): Frame read with the schema's dtypes
+        schema (dict): Dataset schema from utils.dataset_registry
+        progress (callable, optional): Progress callback (see utils.load_progress)
+
+    Returns:
+        pd.DataFrame: The cleaned DataFrame
+    """
+    _report(progress, "Parsing dates", "parse")
+    for column, spec in schema["datetimes"].items():
+        data[column] = build_datetime(data, spec["columns"], spec["format"])
+    for column, source in schema["dates"].items():
+        data[column] = data[source].dt.normalize()
+    for column, factors in schema["products"].items():
+        product = data[factors[0]]
+        for factor in factors[1:]:
+            product = product * data[factor]
+        data[column] = product
+
+    _report(progress, "Cleaning rows", "clean")
+    data = data.dropna(axis=0, subset=schema["required_columns"])
+
+    for column in schema["downcast_integers"]:
+        if column in data.columns:
+            data[column] = pd.to_numeric(data[column], downcast="integer")
+
+    if schema["drop_duplicates"]:
+        _report(progress, "Removing duplicates", "dedup")
+        data = data.drop_duplicates()
+
+    # Dropped rows can leave categories behind that no longer occur in the data
+    for column in data.select_dtypes("category").columns:
+        data[column] = data[column].cat.remove_unused_categories()
+
+    return data.reset_index(drop=True)
+
+
+def ingest_csv(schema, source_path=None, progress=None):
+    """
+    Read a dataset CSV and clean it according to its schema in one vectorized pass.
+
+    Args:
+        schema (dict): Dataset schema from utils.dataset_registry
+        source_path (str, optional): CSV path overriding the schema's source_path
+        progress (callable, optional): Progress callback (see utils.load_progress)
+
+    Returns:
+        pd.DataFrame: The typed and cleaned DataFrame
+    """
+    source_path = source_path or schema["source_path"]
+    if progress is None:
+        data = pd.read_csv(source_path, dtype=schema["dtypes"], **schema["read_options"])
+    else:
+        # Report the bytes and rows read while the parser consumes the file
+        with io.BufferedReader(ProgressReader(source_path, progress)) as source:
+            data = pd.read_csv(source, dtype=schema["dtypes"], **schema["read_options"])
+    return clean_dataset(data, schema, progress)
@@ -1,52 +1,79 @@
-import pandas as pd
-import streamlit as st
+from utils.dataset_metadata import get_dataset_metadata
+from utils.dataset_registry import get_dataset_schema
+from utils.ingest import ingest_csv
+from utils.snapshot_cache import file_fingerprint, load_with_snapshot
 
+# Bump whenever the cleaning steps (utils.ingest or a dataset schema) change, so existing snapshots are rebuilt
+CLEANING_VERSION = 3
+
+
+def load_dataset(dataset_name, progress=None):
+    """
+    Load a registered dataset.
+    The cleaned frame is read from an Arrow snapshot when one matches the CSV,
+    otherwise it is ingested from the CSV following the dataset's schema.
+    Loaded datasets are kept in memory by utils.dataset_manager, not here.
+    
+    Args:
+        dataset_name (str): Name of the dataset in utils.dataset_registry
+        progress (callable, optional): Progress callback (see utils.load_progress)
+        
+    Returns:
+        pd.DataFrame: The cleaned dataset.
+    """
+    schema = get_dataset_schema(dataset_name)
+    return load_with_snapshot(
+        schema["snapshot_name"], schema["source_path"], CLEANING_VERSION,
+        lambda: ingest_csv(schema, progress=progress), schema["date_column"], progress,
+        user_column=schema["user_column"]
+    )
 
-@st.cache_data(ttl=86400)  # Cache for 24 hours (86400 seconds)
 def load_ecommerce_data_sample1():
     """
-    Load a sample e-commerce dataset with 24-hour caching.
+    Load a sample e-commerce dataset.
     
     Returns:
         pd.DataFrame: A DataFrame containing the sample e-commerce data.
     """
-    ecommerce_data = pd.read_csv('data/ecommerce_data_1.csv',
-                             encoding='ISO-8859-1',
-                             dtype={'CustomerID': str, 'InvoiceID': str})
-    
-    ecommerce_data['InvoiceDateTime'] = ecommerce_data['InvoiceDate'].apply(lambda x: pd.to_datetime(x, format='%m/%d/%Y %H:%M'))
-    ecommerce_data['InvoiceDate'] = ecommerce_data['InvoiceDateTime'].dt.date
-    ecommerce_data['TotalPrice'] = ecommerce_data['Quantity'] * ecommerce_data['UnitPrice'] 
-
-    ecommerce_data = ecommerce_data.dropna(axis = 0, subset = ['CustomerID'])
-    ecommerce_data.drop_duplicates(inplace = True)
+    return load_dataset("E-commerce Data 1")
 
-    return ecommerce_data
-
-@st.cache_data(ttl=86400)  # Cache for 24 hours (86400 seconds)
 def load_ecommerce_data_sample2():
     """
-    Load a second sample e-commerce dataset with 24-hour caching.
+    Load a second sample e-commerce dataset.
     
     Returns:
         pd.DataFrame: A DataFrame containing the second sample e-commerce data.
     """
-    ecommerce_data = pd.read_csv('data/ecommerce_data_2.csv')
-    
-    ecommerce_data['OrderedDateTime'] = ecommerce_data['Order_Date'] + ' ' + ecommerce_data['Time']
-    ecommerce_data['OrderedDateTime'] = pd.to_datetime(ecommerce_data['OrderedDateTime'], format='%Y-%m-%d %H:%M:%S')
+    return load_dataset("E-commerce Data 2")
 
-    ecommerce_data = ecommerce_data.dropna(axis = 0, subset = ['OrderedDateTime'])
-    ecommerce_data = ecommerce_data.dropna(axis = 0, subset = ['Customer_Id'])
+def get_dataset_version(dataset_name):
+    """
+    Get a version string that changes whenever a dataset's source file or cleaning code changes.
     
-    ecommerce_data.drop_duplicates(inplace = True)
+    Args:
+        dataset_name (str): Name of the dataset in utils.dataset_registry
+        
+    Returns:
+        str: Version made of the source file hash and the cleaning-code version
+    """
+    schema = get_dataset_schema(dataset_name)
+    return f"{file_fingerprint(schema['source_path'])[:16]}-v{CLEANING_VERSION}"
 
-    return ecommerce_data
+def get_dataset_info(dataset_name):
+    """
+    Get column names, dtypes, row count and date range of a dataset without loading it.
+    
+    Args:
+        dataset_name (str): Name of the dataset
+        
+    Returns:
+        dict or None: Dataset metadata (see utils.dataset_metadata), or None if unknown
+    """
+    return get_dataset_metadata(dataset_name, CLEANING_VERSION)
 
-@st.cache_data(ttl=86400)  # Cache for 24 hours
 def get_dataset_columns(dataset_name):
     """
-    Get the column list for a specific dataset with caching.
+    Get the column list for a specific dataset from its metadata, without loading it.
     
     Args:
         dataset_name (str): Name of the dataset
@@ -54,33 +81,9 @@ def get_dataset_columns(dataset_name):
     Returns:
         list: List of column names with None prepended
     """
-    if dataset_name == "E-commerce Data 1":
-        data = load_ecommerce_data_sample1()
-    elif dataset_name == "E-commerce Data 2":
-        data = load_ecommerce_data_sample2()
-    else:
+    metadata = get_dataset_info(dataset_name)
+    if metadata is None:
         return [None]
     
-    return [None] + data.columns.tolist()
-
+    return [None] + metadata["columns"]
 
-
-def load_ecommerce_data(selected_dataset):
-    """
-    Function to load the selected e-commerce dataset using cached data loaders.
-    This function efficiently loads data with 24-hour caching across sessions.
-    
-    Args:
-        selected_dataset (str): Name of the dataset to load
-    """
-    if selected_dataset == "E-commerce Data 1":
-        # Load the first sample dataset using cached function
-        st.session_state.ecommerce_data_raw = load_ecommerce_data_sample1()
-        st.session_state.ecommerce_data_raw_columns = get_dataset_columns("E-commerce Data 1")
-    elif selected_dataset == "E-commerce Data 2":
-        # Load the second sample dataset using cached function
-        st.session_state.ecommerce_data_raw = load_ecommerce_data_sample2()
-        st.session_state.ecommerce_data_raw_columns = get_dataset_columns("E-commerce Data 2")
-    else:
-        st.session_state.ecommerce_data_raw = None
-        st.session_state.ecommerce_data_raw_columns = None
\ No newline at end of file
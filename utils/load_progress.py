@@ -0,0 +1,141 @@
+"""
+Staged progress reporting for dataset loads.
+
+The ingest pipeline reports each stage it enters by calling its progress callback as
+progress(message, stage=..., rows=..., fraction=...): stage is one of LOAD_STAGES, rows
+the rows processed so far (when known) and fraction the share of the stage done (when
+measurable, e.g. the bytes of the CSV read so far).
+
+utils.dataset_manager wraps every load in a LoadProgress, which turns those calls into
+event dicts with the elapsed time, rows per second, an overall fraction and the estimated
+time remaining, keeps the latest one so other sessions waiting for the same load can show
+it, and forwards each event to the listener of the session that started the load (see
+utils.loading_screen).
+"""
+
+import io
+import logging
+import time
+
+# Stages of a load in order, with their rough share of the time of a load from CSV
+LOAD_STAGES = {
+    "read": 0.5,
+    "parse": 0.15,
+    "clean": 0.1,
+    "dedup": 0.1,
+    "snapshot": 0.1,
+    "activity": 0.05,
+    "done": 0.0,
+}
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between two read progress reports
+READ_REPORT_INTERVAL = 0.2
+
+
+class LoadProgress:
+    """
+    Tracks the progress of one dataset load and forwards it as events.
+
+    Args:
+        dataset_name (str): Name of the dataset being loaded
+        listener (callable, optional): Called with every event dict; its exceptions are
+            logged, not raised into the load
+    """
+
+    def __init__(self, dataset_name, listener=None):
+        self.dataset_name = dataset_name
+        self.listener = listener
+        self.latest = None
+        self._started_at = time.perf_counter()
+        self._stage = None
+        self._stage_started_at = self._started_at
+
+    def __call__(self, message, stage=None, rows=None, fraction=None):
+        """
+        Record a progress report of the pipeline.
+
+        Args:
+            message (str): Human-readable description of what is happening
+            stage (str, optional): Stage of LOAD_STAGES; defaults to the current stage
+            rows (int, optional): Rows processed so far
+            fraction (float, optional): Share of the stage done, between 0 and 1
+        """
+        now = time.perf_counter()
+        stage = stage or self._stage or "read"
+        if stage != self._stage:
+            self._stage, self._stage_started_at = stage, now
+        elapsed = now - self._started_at
+        stage_elapsed = now - self._stage_started_at
+        stage_names = list(LOAD_STAGES)
+        overall = sum(LOAD_STAGES[name] for name in stage_names[:stage_names.index(stage)])
+        overall += LOAD_STAGES[stage] * (fraction or 0.0)
+
+        event = {
+            "dataset": self.dataset_name,
+            "stage": stage,
+            "message": message,
+            "elapsed_seconds": elapsed,
+            "rows": rows,
+            "rows_per_second": None,
+            "fraction": 1.0 if stage == "done" else min(overall, 0.99),
+            "eta_seconds": None,
+        }
+        if rows is not None:
+            duration = elapsed if stage == "done" else stage_elapsed
+            event["rows_per_second"] = rows / duration if duration > 0 else None
+        if fraction is not None and 0 < fraction < 1 and stage_elapsed > 0:
+            # Time left in this stage at its current rate
+            event["eta_seconds"] = stage_elapsed * (1 - fraction) / fraction
+        self.latest = event
+        if self.listener is not None:
+            try:
+                self.listener(event)
+            except Exception:
+                # The load is shared with other sessions; a failing display must not fail it
+                logger.exception("Progress listener of the %s load failed", self.dataset_name)
+
+
+class ProgressReader(io.RawIOBase):
+    """
+    Binary file reader that reports the bytes and lines read as the CSV parser consumes it.
+
+    Args:
+        path (str): Path of the file
+        progress (callable): Progress callback of the load (see LoadProgress)
+    """
+
+    def __init__(self, path, progress):
+        self._file = open(path, "rb")
+        self._progress = progress
+        self._total_bytes = max(self._file.seek(0, io.SEEK_END), 1)
+        self._file.seek(0)
+        self._bytes_read = 0
+        self._lines_read = 0
+        self._reported_at = 0.0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = self._file.readinto(buffer)
+        self._bytes_read += count
+        self._lines_read += bytes(memoryview(buffer)[:count]).count(b"\n")
+        now = time.perf_counter()
+        # Report at most every READ_REPORT_INTERVAL seconds, and once at the end of the file
+        at_end = count == 0 and self._reported_at != float("inf")
+        if now - self._reported_at >= READ_REPORT_INTERVAL or at_end:
+            self._reported_at = float("inf") if at_end else now
+            self._progress(
+                f"Reading CSV file: {self._bytes_read / 1e6:,.1f} of {self._total_bytes / 1e6:,.1f} MB",
+                stage="read",
+                # The header line is not a row
+                rows=max(self._lines_read - 1, 0),
+                fraction=self._bytes_read / self._total_bytes,
+            )
+        return count
+
+    def close(self):
+        self._file.close()
+        super().close()
@@ -1,59 +1,84 @@
 import streamlit as st
 
-def show_simple_loading():
+# Readable names of the load stages of utils.load_progress
+STAGE_LABELS = {
+    "read": "📂 Reading",
+    "parse": "📅 Parsing dates",
+    "clean": "🧹 Cleaning",
+    "dedup": "🔁 Removing duplicates",
+    "snapshot": "💾 Writing snapshot",
+    "activity": "👥 Indexing users",
+    "done": "✅ Ready",
+}
+
+
+def show_author_card():
     """
-    Alternative super simple loading screen if the main one has issues.
+    Show a short introduction of the author while a dataset loads.
     """
     st.markdown("""
-    <div style="
-        position: fixed; top: 0; left: 0; width: 100vw; height: 100vh;
-        background: rgba(255,255,255,0.7); z-index: 999999;
-        display: flex; flex-direction: column; justify-content: center; align-items: center;
-        font-family: system-ui; text-align: center; pointer-events: all;
-        backdrop-filter: blur(2px);
-    ">
-        <style>
-        @keyframes spin {
-            0% { transform: rotate(0deg);}
-            100% { transform: rotate(360deg);}
-        }
-        .rotating {
-            display: inline-block;
-            animation: spin 1.2s linear infinite;
-        }
-        </style>
-        <h1 class="rotating" style="font-size: 40px; margin-bottom: 20px;">📡</h1>
-        <h2 style="color: #1f2937; margin-bottom: 20px;">Loading RepeatRadar Demo</h2>
-        <p style="color: #6b7280; margin-bottom: 40px;">Preparing cohort analysis tools...</p>
-        <div style="padding: 20px; background: #f8fafc; border-radius: 10px; border-left: 4px solid #3b82f6;">
-            <h3 style="margin: 0 0 10px 0; color: #1f2937;">👋 Hi, I'm Kristof</h3>
-            <p style="margin: 0 0 10px 0; color: #6b7280;">Data Scientist</p>
-            <p style="margin: 0 0 15px 0; color: #1f2937; font-weight: bold;">💼 Open to Work</p>
-            <a href="https://www.linkedin.com/in/kristof-menyhert/" target="_blank" 
-               style="color: #3b82f6; text-decoration: none; font-weight: 500;">
-               Let's connect on LinkedIn →
-            </a>
-            <p style="margin-top: 10px; color: #3b82f6; font-size: 14px;">
-                📧 menyhert.kristof@gmail.com
-            </p>
-        </div>
-        <p style="margin-top: 30px; color: #9ca3af; font-size: 14px;">
-            This may take up to 1 minute because the hardware behind the free version of Streamlit Cloud is slow.
-            <span id="countdown" style="margin-left:10px; color:#3b82f6;"></span>
+    <div style="padding: 20px; background: #f8fafc; border-radius: 10px; border-left: 4px solid #3b82f6; font-family: system-ui;">
+        <h3 style="margin: 0 0 10px 0; color: #1f2937;">👋 Hi, I'm Kristof</h3>
+        <p style="margin: 0 0 10px 0; color: #6b7280;">Data Scientist</p>
+        <p style="margin: 0 0 15px 0; color: #1f2937; font-weight: bold;">💼 Open to Work</p>
+        <a href="https://www.linkedin.com/in/kristof-menyhert/" target="_blank"
+           style="color: #3b82f6; text-decoration: none; font-weight: 500;">
+           Let's connect on LinkedIn →
+        </a>
+        <p style="margin-top: 10px; color: #3b82f6; font-size: 14px;">
+            📧 menyhert.kristof@gmail.com
         </p>
-        <p style="margin-top: 5px; color: #6b7280; font-size: 15px;">Please wait a moment while the data loads.</p>
-        <script>
-        let seconds = 60;
-        function updateCountdown() {
-            let m = Math.floor(seconds / 60);
-            let s = seconds % 60;
-            document.getElementById('countdown').textContent = `(${m}:${s.toString().padStart(2, '0')})`;
-            if (seconds > 0) {
-                seconds--;
-                setTimeout(updateCountdown, 1000);
-            }
-        }
-        updateCountdown();
-        </script>
     </div>
     """, unsafe_allow_html=True)
+
+
+def format_load_event(event):
+    """
+    Describe a load progress event in one line.
+
+    Args:
+        event (dict): Event of utils.load_progress.LoadProgress
+
+    Returns:
+        str: Stage, message, throughput and time remaining where known
+    """
+    parts = [f"{STAGE_LABELS.get(event['stage'], event['stage'])}: {event['message']}"]
+    if event["rows"] is not None:
+        parts.append(f"{event['rows']:,} rows")
+    if event["rows_per_second"] is not None:
+        parts.append(f"{event['rows_per_second']:,.0f} rows/s")
+    if event["eta_seconds"] is not None:
+        parts.append(f"about {event['eta_seconds']:.0f}s left")
+    parts.append(f"{event['elapsed_seconds']:.1f}s elapsed")
+    return " · ".join(parts)
+
+
+def show_loading_progress(dataset_name):
+    """
+    Show the live progress of a dataset load.
+
+    Args:
+        dataset_name (str): Name of the dataset being loaded
+
+    Returns:
+        callable: Progress listener to pass to load_ecommerce_data; it renders every event
+        and marks the load complete on the final one
+    """
+    status = st.status(f"🔄 Loading {dataset_name}...", expanded=True)
+    finished_stages = status.container()
+    progress_bar = status.progress(0.0)
+    current_line = status.empty()
+    shown_stages = []
+
+    def report(event):
+        # One line per finished stage, then the live line of the current stage
+        if event["stage"] not in shown_stages:
+            if shown_stages:
+                finished_stages.write(f"{STAGE_LABELS.get(shown_stages[-1], shown_stages[-1])} done")
+            shown_stages.append(event["stage"])
+        progress_bar.progress(event["fraction"], text=f"{event['fraction']:.0%}")
+        current_line.caption(format_load_event(event))
+        if event["stage"] == "done":
+            status.update(label=f"✅ {dataset_name} loaded in {event['elapsed_seconds']:.1f}s", state="complete", expanded=False)
+
+    return report
@@ -0,0 +1,234 @@
+"""
+Multi-core cohort computation.
+
+A user belongs to exactly one cohort, so cohort cells are additive across disjoint sets
+of users: active-user counts (and with them the retention numerators), sums, non-null
+counts and row counts of a cell are the sums of the same figures over any partition of
+the users. Transactions are hash-partitioned by user code, a process pool computes the
+partial matrices of each partition and the partials are summed.
+
+The per-row inputs are copied once into shared memory, grouped by partition, and each
+worker reads the contiguous row range of its partition from there, so nothing
+proportional to the data is pickled and no worker scans the rows of the others; only
+the small partial matrices travel back. Worker processes are started with spawn, as
+forking a threaded Streamlit server is unsafe, and are kept for reuse.
+"""
+
+import os
+import threading
+from concurrent.futures import CancelledError, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+import pandas as pd
+
+# Number of processes used for a cohort computation; 1 keeps everything in-process
+COHORT_WORKERS = int(os.environ.get("REPEATRADAR_COHORT_WORKERS", "1"))
+
+# Smaller inputs are computed in-process, where they finish before a pool round trip would
+PARALLEL_MIN_ROWS = int(os.environ.get("REPEATRADAR_PARALLEL_MIN_ROWS", "1000000"))
+
+# Value aggregations that can be merged from per-partition sums and counts
+PARALLEL_AGGREGATIONS = ('sum', 'count', 'mean')
+
+# How often a computation waiting for its partitions checks whether it was cancelled
+CANCEL_POLL_SECONDS = 0.1
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    """Get the shared process pool, (re)creating it for a new worker count or after a crash."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+def _reset_pool():
+    """Forget a broken pool so the next computation starts a new one."""
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+def _share(arrays, order=None):
+    """
+    Copy arrays into shared memory blocks.
+
+    Args:
+        arrays (dict): Arrays by name
+        order (np.ndarray, optional): Row order to copy the arrays in
+
+    Returns:
+        tuple: (blocks, spec) with the blocks to close and unlink, and a picklable
+        dict of name -> (block name, dtype, shape) to attach to them
+    """
+    blocks, spec = [], {}
+    for name, array in arrays.items():
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        blocks.append(block)
+        shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+        if order is None:
+            shared[:] = array
+        else:
+            np.take(array, order, out=shared)
+        spec[name] = (block.name, array.dtype.str, array.shape)
+    return blocks, spec
+
+
+def _partial_matrices(spec, start, end, n_cells, n_periods, value_dtype):
+    """
+    Compute the partial cohort matrices of one user partition, in a worker process.
+
+    The partition's rows are rows start to end of the shared arrays. The shared cancel
+    flag is checked between the steps of the computation.
+
+    Returns:
+        dict or None: counts (active users per cell) and, with values, sums, value_counts
+        (non-null values) and sizes (rows) per cell, as flat arrays of n_cells; None if
+        the computation was cancelled
+    """
+    blocks = {}
+    try:
+        for name, (block_name, _, _) in spec.items():
+            blocks[name] = shared_memory.SharedMemory(name=block_name)
+    except FileNotFoundError:
+        # The computation was cancelled and its blocks removed before this partition started
+        for block in blocks.values():
+            block.close()
+        return None
+    try:
+        arrays = {
+            name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=blocks[name].buf)
+            for name, (_, dtype, shape) in spec.items()
+        }
+        cancelled = arrays["cancelled"]
+        user_codes = arrays["user_codes"][start:end]
+        period_number = arrays["period_number"][start:end]
+        cells = arrays["cohort_index"][start:end] * n_periods + period_number
+
+        # A user belongs to exactly one cohort, so distinct (user, period) pairs give the counts
+        _, first_rows = np.unique(user_codes.astype(np.int64) * n_periods + period_number, return_index=True)
+        if cancelled[0]:
+            return None
+        result = {"counts": np.bincount(cells[first_rows], minlength=n_cells)}
+
+        if "values" in arrays:
+            values = pd.Series(arrays["values"][start:end])
+            grouped = values.groupby(cells)
+            sums = np.zeros(n_cells, dtype=value_dtype)
+            summed = grouped.sum()
+            if cancelled[0]:
+                return None
+            sums[summed.index.to_numpy()] = summed.to_numpy()
+            result["sums"] = sums
+            result["value_counts"] = np.bincount(cells, weights=values.notna().to_numpy(), minlength=n_cells).astype(np.int64)
+            result["sizes"] = np.bincount(cells, minlength=n_cells)
+        return result
+    finally:
+        for block in blocks.values():
+            block.close()
+
+
+def supports_parallel_values(column, aggregation_function):
+    """
+    Check whether a value aggregation can be merged from per-partition results.
+
+    Args:
+        column (pd.Series): Value column
+        aggregation_function (str): pandas aggregation name
+
+    Returns:
+        bool: True for sums, counts and means of plain integer or float columns
+    """
+    dtype = column.dtype
+    numeric = isinstance(dtype, np.dtype) and (np.issubdtype(dtype, np.integer) or np.issubdtype(dtype, np.floating))
+    return numeric and aggregation_function in PARALLEL_AGGREGATIONS
+
+
+def parallel_cohort_matrices(assignment, workers, values=None, cancel_event=None):
+    """
+    Compute cohort matrices over user partitions in a process pool and merge them.
+
+    Args:
+        assignment (dict): Output of utils.cohort_engine.assign_cohorts
+        workers (int): Number of processes (and user partitions)
+        values (np.ndarray, optional): Value column of the kept rows, integer or float
+        cancel_event (threading.Event, optional): Checked while waiting for the
+            partitions; once set, partitions not started yet are dropped, running ones
+            are told to stop and stop at their next step, and the computation returns
+            without waiting for them
+
+    Returns:
+        dict: counts (int64 active users), and with values: sums (int64/uint64 for
+        integer values, float64 otherwise), value_counts and sizes, all of shape
+        (cohorts, periods)
+
+    Raises:
+        CancelledError: If cancel_event is set before all partitions are done
+    """
+    n_cohorts, n_periods = len(assignment["cohorts"]), assignment["n_periods"]
+    n_cells = n_cohorts * n_periods
+    arrays = {
+        "user_codes": assignment["user_codes"],
+        "cohort_index": assignment["cohort_index"],
+        "period_number": assignment["period_number"],
+    }
+    value_dtype = None
+    if values is not None:
+        arrays["values"] = values
+        if np.issubdtype(values.dtype, np.unsignedinteger):
+            value_dtype = np.dtype(np.uint64)
+        elif np.issubdtype(values.dtype, np.integer):
+            value_dtype = np.dtype(np.int64)
+        else:
+            value_dtype = np.dtype(np.float64)
+
+    # Group the rows by partition once, so each worker reads a contiguous range; a stable
+    # sort of 16-bit keys is a linear-time radix sort and keeps each partition's row order
+    partitions = (assignment["user_codes"] % workers).astype(np.uint16)
+    order = np.argsort(partitions, kind="stable")
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(partitions, minlength=workers))])
+    blocks, spec = _share(arrays, order)
+    cancel_block = shared_memory.SharedMemory(create=True, size=1)
+    blocks.append(cancel_block)
+    cancel_block.buf[0] = 0
+    spec["cancelled"] = (cancel_block.name, np.dtype(np.uint8).str, (1,))
+    try:
+        pool = _get_pool(workers)
+        futures = [pool.submit(_partial_matrices, spec, int(bounds[partition]), int(bounds[partition + 1]),
+                               n_cells, n_periods, value_dtype)
+                   for partition in range(workers)]
+        try:
+            partials = []
+            for future in futures:
+                while not wait([future], timeout=CANCEL_POLL_SECONDS).done:
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise CancelledError()
+                partials.append(future.result())
+        except BrokenProcessPool:
+            _reset_pool()
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+            # Running partitions stop at their next check; they keep their own mappings
+            # of the blocks, so unlinking the blocks below does not affect them
+            cancel_block.buf[0] = 1
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    merged = {name: np.sum([partial[name] for partial in partials], axis=0) for name in partials[0]}
+    if "sums" in merged:
+        merged["sums"] = merged["sums"].astype(value_dtype)
+    return {name: matrix.reshape(n_cohorts, n_periods) for name, matrix in merged.items()}
@@ -0,0 +1,403 @@
+"""
+Headless batch precomputation of cohort tables, without a Streamlit runtime.
+
+    python -m utils.precompute [--datasets NAME ...] [--workers N] [--output DIR]
+
+Every registered dataset is loaded with the same loaders as the dashboard (reusing its
+Arrow snapshot), and the active-user, retention and value tables of every cohort period,
+period duration, value column and aggregation offered in Home.py are computed on a pool
+of worker processes. Each table is written as a Parquet file under the output directory,
+and a manifest.json lists them with the dataset version (source file hash and cleaning
+version, see get_dataset_version) and parameters they were computed for. Combinations
+that fail to compute are listed with their error instead of a path.
+
+The dashboard reads the manifest in PRECOMPUTED_DIR (see load_precomputed_tables) and
+serves matching tables from disk instead of computing them. Tables of another dataset
+version are never served, so running the command again after the data changes (e.g.
+from cron) is all it takes to keep them current: a run replaces the tables of the datasets
+it precomputes, deletes those of their older versions and keeps those of other datasets.
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+from utils.cohort_engine import AGGREGATION_FUNCTIONS, COHORT_PERIODS, PERIOD_DURATIONS, compute_cohort_tables, precompute_user_activity
+from utils.dataset_registry import DATASET_REGISTRY, get_dataset_schema
+from utils.load_and_clean_sample_data import get_dataset_version, load_dataset
+
+logger = logging.getLogger(__name__)
+
+# Directory holding the precomputed tables and their manifest
+PRECOMPUTED_DIR = os.environ.get("REPEATRADAR_PRECOMPUTED_DIR", os.path.join("data", ".precomputed"))
+
+MANIFEST_NAME = "manifest.json"
+
+# Datasets loaded by this worker process, with their user activity precomputation
+_worker_datasets = {}
+
+# Index of the manifest last read by the dashboard, with its path and the modification time it was read at
+_manifest_index = {"path": None, "mtime": None, "entries": {}, "bytes": 0}
+_manifest_lock = threading.Lock()
+# Lookups of precomputed tables by the dashboard, and the compute time their hits saved
+_lookup_stats = {"hits": 0, "misses": 0, "compute_seconds_saved": 0.0}
+
+
+def write_cohort_table(table, path):
+    """
+    Write a pivot cohort table to Parquet.
+
+    Parquet needs string column names, so the period numbers are stored as strings.
+
+    Args:
+        table (pd.DataFrame): Pivot table from compute_cohort_tables
+        path (str): Output path
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    table.rename(columns=str).to_parquet(temporary_path)
+    os.replace(temporary_path, path)
+
+
+def read_cohort_table(path):
+    """
+    Read a pivot cohort table written by write_cohort_table.
+
+    Args:
+        path (str): Parquet path
+
+    Returns:
+        pd.DataFrame: The table, with integer period_number columns as computed
+    """
+    table = pd.read_parquet(path)
+    table.columns = pd.Index(table.columns.astype(np.int64), name="period_number")
+    return table
+
+
+def _value_analyses(dataset_name, aggregation_functions):
+    """All (value_column, aggregation_function) pairs of a dataset, starting with user counts."""
+    schema = get_dataset_schema(dataset_name)
+    return [(None, None)] + [
+        (value_column, aggregation_function)
+        for value_column in schema["value_columns"]
+        for aggregation_function in aggregation_functions
+    ]
+
+
+def _table_path(dataset_name, version, cohort_period, period_duration, value_column, aggregation_function, table_name):
+    """Path of a table relative to the output directory."""
+    schema = get_dataset_schema(dataset_name)
+    file_name = table_name if value_column is None else f"{table_name}-{aggregation_function}-{value_column}"
+    return os.path.join(schema["snapshot_name"], version, f"{cohort_period}-{period_duration}", f"{file_name}.parquet")
+
+
+def _load_for_worker(dataset_name):
+    """Load a dataset and its user activity once per worker process."""
+    if dataset_name not in _worker_datasets:
+        schema = get_dataset_schema(dataset_name)
+        data = load_dataset(dataset_name)
+        _worker_datasets[dataset_name] = (data, precompute_user_activity(data, schema["date_column"], schema["user_column"]))
+    return _worker_datasets[dataset_name]
+
+
+def _compute_group(dataset_name, version, cohort_period, period_duration, analyses, output_dir):
+    """
+    Compute and write the tables of one dataset, cohort period and period duration.
+
+    Runs in a worker process.
+
+    Returns:
+        list: Manifest entries of the tables written, or of the analyses that failed
+    """
+    data, user_activity = _load_for_worker(dataset_name)
+    schema = get_dataset_schema(dataset_name)
+    entries = []
+    for value_column, aggregation_function in analyses:
+        # The dashboard only offers counting aggregations of categorical columns (IDs, product names)
+        if value_column is not None and isinstance(data[value_column].dtype, pd.CategoricalDtype) \
+                and aggregation_function not in ("count", "nunique"):
+            continue
+        entry = {
+            "dataset": dataset_name,
+            "version": version,
+            "date_column": schema["date_column"],
+            "user_column": schema["user_column"],
+            "cohort_period": cohort_period,
+            "period_duration": period_duration,
+            "value_column": value_column,
+            "aggregation_function": aggregation_function,
+        }
+        started_at = time.perf_counter()
+        try:
+            tables = compute_cohort_tables(
+                data, schema["date_column"], schema["user_column"], cohort_period, period_duration,
+                value_column=value_column, aggregation_function=aggregation_function or "sum",
+                user_activity=user_activity, workers=1,
+            )
+        except (TypeError, ValueError) as e:
+            entries.append({**entry, "table": "values", "path": None, "error": f"{type(e).__name__}: {e}"})
+            continue
+        seconds = time.perf_counter() - started_at
+        table_names = ["counts", "retention"] if value_column is None else ["values"]
+        for table_name in table_names:
+            path = _table_path(dataset_name, version, cohort_period, period_duration, value_column, aggregation_function, table_name)
+            write_cohort_table(tables[table_name], os.path.join(output_dir, path))
+            entries.append({**entry, "table": table_name, "path": path, "shape": list(tables[table_name].shape), "seconds": seconds})
+    return entries
+
+
+def precompute_all(dataset_names=None, cohort_periods=COHORT_PERIODS, period_durations=PERIOD_DURATIONS,
+                   aggregation_functions=AGGREGATION_FUNCTIONS, output_dir=PRECOMPUTED_DIR, workers=None, progress=None):
+    """
+    Compute every configured cohort table and write them with a manifest.
+
+    Args:
+        dataset_names (list, optional): Datasets to precompute; all registered ones by default
+        cohort_periods (list): Cohort periods to compute
+        period_durations (list): Period durations to compute, in days
+        aggregation_functions (list): Aggregations applied to every registered value column
+        output_dir (str): Directory receiving the tables and manifest.json
+        workers (int, optional): Worker processes; defaults to the number of CPUs
+        progress (callable, optional): Called with a message as each group of tables is done
+
+    Returns:
+        dict: The manifest written to output_dir, which keeps the previous manifest's
+        tables of other datasets; tables of older versions of the datasets precomputed
+        are deleted
+    """
+    dataset_names = list(DATASET_REGISTRY) if dataset_names is None else dataset_names
+    workers = workers or os.cpu_count() or 1
+    started_at = time.perf_counter()
+
+    datasets = {}
+    for dataset_name in dataset_names:
+        # Loading once here builds the snapshot every worker then reads
+        data = load_dataset(dataset_name)
+        datasets[dataset_name] = {"version": get_dataset_version(dataset_name), "rows": len(data)}
+        del data
+
+    groups = [
+        (dataset_name, datasets[dataset_name]["version"], cohort_period, period_duration,
+         _value_analyses(dataset_name, aggregation_functions), output_dir)
+        for dataset_name in dataset_names
+        for cohort_period in cohort_periods
+        for period_duration in period_durations
+    ]
+    entries = []
+    # Workers are spawned, not forked, as the parent may already run pandas and Arrow threads
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as executor:
+        futures = [executor.submit(_compute_group, *group) for group in groups]
+        for done, future in enumerate(as_completed(futures), start=1):
+            entries.extend(future.result())
+            if progress is not None:
+                progress(f"{done} of {len(groups)} period combinations done")
+
+    # Keep the tables of other datasets, and those of the same dataset versions this run
+    # did not recompute (e.g. other periods), from the previous manifest
+    previous = _read_manifest(output_dir)
+    computed = {_entry_key(entry) for entry in entries}
+    entries += [
+        entry for entry in previous["tables"]
+        if entry["dataset"] not in datasets
+        or (entry["version"] == datasets[entry["dataset"]]["version"] and _entry_key(entry) not in computed)
+    ]
+    manifest = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "seconds": time.perf_counter() - started_at,
+        "datasets": {**previous["datasets"], **datasets},
+        "tables": sorted(entries, key=lambda entry: (entry["dataset"], entry["cohort_period"], entry["period_duration"],
+                                                     entry["value_column"] or "", entry["aggregation_function"] or "", entry["table"])),
+    }
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    temporary_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(temporary_path, manifest_path)
+    _remove_old_versions(output_dir, datasets)
+    return manifest
+
+
+def _entry_key(entry):
+    """Identity of a manifest entry, regardless of the run that computed it."""
+    return (entry["dataset"], entry["version"], entry["cohort_period"], entry["period_duration"],
+            entry["value_column"], entry["aggregation_function"], entry["table"])
+
+
+def _read_manifest(output_dir):
+    """Read the manifest in output_dir, or an empty one if there is none or it is unreadable."""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+        return {"datasets": manifest["datasets"], "tables": manifest["tables"]}
+    except (OSError, ValueError, KeyError):
+        return {"datasets": {}, "tables": []}
+
+
+def _remove_old_versions(output_dir, datasets):
+    """
+    Delete the table directories of other versions of the datasets just precomputed.
+
+    Called once the new manifest is in place, so no reader is directed to them anymore.
+    A dashboard reading one of them meanwhile recomputes the table instead.
+    """
+    for dataset_name, dataset in datasets.items():
+        dataset_dir = os.path.join(output_dir, get_dataset_schema(dataset_name)["snapshot_name"])
+        try:
+            versions = os.listdir(dataset_dir)
+        except OSError:
+            continue
+        for version in versions:
+            if version != dataset["version"]:
+                shutil.rmtree(os.path.join(dataset_dir, version), ignore_errors=True)
+
+
+def _manifest_key(dataset_version, date_column, user_column, cohort_period, period_duration, value_column, aggregation_function, table_name):
+    """Lookup key of a precomputed table."""
+    return (dataset_version, date_column, user_column, cohort_period, int(period_duration),
+            value_column, aggregation_function if value_column is not None else None, table_name)
+
+
+def _precomputed_paths(output_dir=PRECOMPUTED_DIR):
+    """
+    Map lookup keys to (table path, compute seconds), rereading the manifest only when it changed.
+
+    A manifest that cannot be read or parsed counts as no precomputed tables until it is
+    replaced, so analyses are computed instead.
+    """
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    try:
+        mtime = os.path.getmtime(manifest_path)
+    except OSError:
+        return {}
+    with _manifest_lock:
+        if _manifest_index["path"] != manifest_path or _manifest_index["mtime"] != mtime:
+            try:
+                with open(manifest_path) as f:
+                    manifest = json.load(f)
+                entries = {
+                    _manifest_key(entry["version"], entry["date_column"], entry["user_column"], entry["cohort_period"],
+                                  entry["period_duration"], entry["value_column"], entry["aggregation_function"], entry["table"]):
+                    (os.path.join(output_dir, entry["path"]), entry.get("seconds", 0.0))
+                    for entry in manifest["tables"] if entry["path"] is not None
+                }
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.warning("Ignoring the precomputed tables: could not read %s: %s", manifest_path, e)
+                entries = {}
+            _manifest_index["entries"] = entries
+            _manifest_index["bytes"] = sum(_file_size(path) for path, _ in entries.values())
+            _manifest_index["path"] = manifest_path
+            _manifest_index["mtime"] = mtime
+        return _manifest_index["entries"]
+
+
+def _file_size(path):
+    """Size of a file in bytes, or 0 if it is gone."""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def load_precomputed_tables(dataset_version, date_column, user_column, cohort_period, period_duration,
+                            value_column=None, aggregation_function=None, output_dir=PRECOMPUTED_DIR, record=True):
+    """
+    Read the precomputed main and retention tables of an analysis, if they exist.
+
+    Args:
+        dataset_version (str): Version of the dataset (see get_dataset_version)
+        date_column (str): Date column
+        user_column (str): User column
+        cohort_period (str): Cohort grouping period
+        period_duration (int): Period duration in days
+        value_column (str, optional): Value column of the main table
+        aggregation_function (str, optional): Aggregation of the value column
+        output_dir (str): Directory of the precomputed tables
+        record (bool): Count the lookup in the hit and miss statistics (see
+            get_precomputed_stats); lookups made while no tables are precomputed are not counted
+
+    Returns:
+        tuple or None: (main_table, retention_table) as compute_cohort_tables returns them,
+        with main_table holding the values if value_column is set and user counts
+        otherwise; None if either is not precomputed for this dataset version
+    """
+    if dataset_version is None or isinstance(period_duration, str):
+        return None
+    paths = _precomputed_paths(output_dir)
+    if not paths:
+        return None
+    main_name = "values" if value_column is not None else "counts"
+    main = paths.get(_manifest_key(dataset_version, date_column, user_column, cohort_period, period_duration,
+                                   value_column, aggregation_function, main_name))
+    retention = paths.get(_manifest_key(dataset_version, date_column, user_column, cohort_period, period_duration,
+                                        None, None, "retention"))
+    tables = None
+    if main is not None and retention is not None:
+        try:
+            tables = read_cohort_table(main[0]), read_cohort_table(retention[0])
+        except (OSError, ValueError):
+            # Tables being replaced by a new run are recomputed instead
+            pass
+    if record:
+        with _manifest_lock:
+            if tables is None:
+                _lookup_stats["misses"] += 1
+            else:
+                _lookup_stats["hits"] += 1
+                _lookup_stats["compute_seconds_saved"] += main[1]
+    return tables
+
+
+def get_precomputed_stats(output_dir=PRECOMPUTED_DIR):
+    """
+    Get the lookup counters of the precomputed tables, in the shape of the caches' stats.
+
+    Returns:
+        dict: hits, misses, evictions (always 0), entries (tables in the manifest),
+        current_bytes (their size on disk), max_bytes (None, the directory is not
+        size-bounded) and compute_seconds_saved (precompute time of the tables served)
+    """
+    paths = _precomputed_paths(output_dir)
+    with _manifest_lock:
+        return {
+            "hits": _lookup_stats["hits"],
+            "misses": _lookup_stats["misses"],
+            "evictions": 0,
+            "entries": len(paths),
+            "current_bytes": _manifest_index["bytes"] if paths else 0,
+            "max_bytes": None,
+            "compute_seconds_saved": _lookup_stats["compute_seconds_saved"],
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute every cohort table of the registered datasets to Parquet.")
+    parser.add_argument("--datasets", nargs="+", choices=list(DATASET_REGISTRY), help="Datasets to precompute (default: all)")
+    parser.add_argument("--periods", nargs="+", choices=COHORT_PERIODS, default=COHORT_PERIODS, help="Cohort periods")
+    parser.add_argument("--durations", nargs="+", type=int, default=PERIOD_DURATIONS, help="Period durations in days")
+    parser.add_argument("--aggregations", nargs="*", choices=AGGREGATION_FUNCTIONS, default=AGGREGATION_FUNCTIONS,
+                        help="Aggregations of the value columns (none for user counts only)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: number of CPUs)")
+    parser.add_argument("--output", default=PRECOMPUTED_DIR, help="Output directory")
+    args = parser.parse_args(argv)
+
+    manifest = precompute_all(args.datasets, args.periods, args.durations, args.aggregations, args.output,
+                              args.workers, progress=lambda message: print(message, file=sys.stderr))
+    written = [entry for entry in manifest["tables"] if entry["path"] is not None]
+    failed = [entry for entry in manifest["tables"] if entry["path"] is None]
+    print(f"Wrote {len(written)} tables to {args.output} in {manifest['seconds']:.1f}s "
+          f"({len(failed)} combinations could not be computed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Opt-in per-rerun profiling of the dashboard's hot path.
+
+Profiling is enabled for a session by the ?profile=1 query parameter, or for every session
+by REPEATRADAR_PROFILE=1. Pages call profiler = start_rerun_profile(page) at the top,
+wrap each stage (dataset retrieval, analysis start, heatmaps, tables) in profiler.span
+and call profiler.finish() at the end: the spans are shown as a waterfall in an expander
+and reruns slower than REPEATRADAR_SLOW_RERUN_SECONDS are logged. Work done off the
+script thread, such as a background cohort computation, is added with record_span once
+its duration is known.
+
+A rerun interrupted by st.rerun or st.switch_page, which raise to stop the script, never
+reaches finish(); the session's next rerun discards its profile, dumping any cProfile
+stats but showing no waterfall, as the rerun discarded the page anyway.
+
+With REPEATRADAR_PROFILE=cprofile every rerun also runs under cProfile and its stats are
+dumped to REPEATRADAR_PROFILE_DIR, one .pstats file per rerun, for snakeviz or python -m
+pstats. Only one cProfile can run in a process, so a rerun starting one stops (and dumps)
+any still running, e.g. that of a rerun whose session went away. This is only available
+to the operator, not through the query parameter, as it slows the whole process and
+writes a file per rerun.
+
+When profiling is off, start_rerun_profile returns a no-op profiler whose spans are
+empty context managers, so the instrumentation costs a few attribute lookups per stage.
+"""
+
+import contextlib
+import cProfile
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import plotly.graph_objects as go
+import streamlit as st
+
+logger = logging.getLogger(__name__)
+
+# "1" profiles every session, "cprofile" also dumps cProfile stats; empty leaves it to ?profile=1
+PROFILE_MODE = os.environ.get("REPEATRADAR_PROFILE", "")
+
+# Directory receiving the .pstats files of profiled reruns
+PROFILE_DIR = os.environ.get("REPEATRADAR_PROFILE_DIR", "profiles")
+
+# Reruns taking longer than this are logged, whether profiling is on or off
+SLOW_RERUN_SECONDS = float(os.environ.get("REPEATRADAR_SLOW_RERUN_SECONDS", "2.0"))
+
+# Session state key of the session's profiler of the current rerun, until it is finished
+_SESSION_KEY = "_rerun_profiler"
+
+# The profiler whose cProfile is running, if any
+_cprofile_owner = None
+_cprofile_lock = threading.Lock()
+
+
+class _DisabledProfiler:
+    """Profiler used when profiling is off: spans do nothing, finish only logs slow reruns."""
+
+    enabled = False
+
+    def __init__(self):
+        self._started_at = time.perf_counter()
+
+    def span(self, name):
+        return contextlib.nullcontext()
+
+    def record_span(self, name, seconds):
+        pass
+
+    def discard(self):
+        pass
+
+    def finish(self, show=True):
+        if st.session_state.get(_SESSION_KEY) is self:
+            del st.session_state[_SESSION_KEY]
+        total = time.perf_counter() - self._started_at
+        if total > SLOW_RERUN_SECONDS:
+            logger.warning("Slow rerun: %.2fs (add ?profile=1 to the URL for a breakdown)", total)
+
+
+class RerunProfiler:
+    """
+    Records timing spans of one rerun.
+
+    Args:
+        page (str): Name of the profiled page, used in logs and dump file names
+        dump_stats (bool): Run the rerun under cProfile and dump its stats on finish
+    """
+
+    enabled = True
+
+    def __init__(self, page, dump_stats=False):
+        self.page = page
+        self.spans = []
+        self._depth = 0
+        self._started_at = time.perf_counter()
+        self._cprofile = None
+        self.stats_path = None
+        if dump_stats:
+            self._start_cprofile()
+
+    def _start_cprofile(self):
+        """Run the rerun under cProfile, stopping the one of an earlier rerun if it still runs."""
+        global _cprofile_owner
+        with _cprofile_lock:
+            if _cprofile_owner is not None:
+                _cprofile_owner._dump_stats()
+            self._cprofile = cProfile.Profile()
+            try:
+                self._cprofile.enable()
+            except ValueError:
+                # A profiler outside the dashboard is active
+                logger.warning("cProfile is busy; not dumping stats for this rerun")
+                self._cprofile = None
+                return
+            _cprofile_owner = self
+
+    def _dump_stats(self):
+        """Stop cProfile and dump its stats, if this rerun runs under it; call with _cprofile_lock held."""
+        global _cprofile_owner
+        if self._cprofile is None:
+            return
+        self._cprofile.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        self.stats_path = os.path.join(PROFILE_DIR, f"{self.page}-{datetime.now():%Y%m%d-%H%M%S-%f}.pstats")
+        self._cprofile.dump_stats(self.stats_path)
+        self._cprofile = None
+        if _cprofile_owner is self:
+            _cprofile_owner = None
+
+    @contextlib.contextmanager
+    def span(self, name):
+        """
+        Time a stage of the rerun; spans can be nested.
+
+        Args:
+            name (str): Stage name shown in the waterfall
+        """
+        span = {"name": name, "depth": self._depth, "start": time.perf_counter() - self._started_at}
+        self.spans.append(span)
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            span["seconds"] = time.perf_counter() - self._started_at - span["start"]
+
+    def record_span(self, name, seconds):
+        """
+        Add work done outside the script thread, e.g. in a background pool, as a span.
+
+        The span is drawn from the moment it is recorded and is not counted in the
+        rerun's own time.
+
+        Args:
+            name (str): Stage name shown in the waterfall
+            seconds (float): Duration of the work
+        """
+        self.spans.append({"name": name, "depth": self._depth, "start": time.perf_counter() - self._started_at,
+                           "seconds": seconds, "background": True})
+
+    def discard(self):
+        """Stop the profile of an interrupted rerun: dump its cProfile stats, but log and show nothing."""
+        with _cprofile_lock:
+            self._dump_stats()
+
+    def finish(self, show=True):
+        """
+        Stop profiling, dump cProfile stats if requested, log a slow rerun and show the waterfall.
+
+        Args:
+            show (bool): Render the waterfall expander
+
+        Returns:
+            float: Total rerun time in seconds
+        """
+        if st.session_state.get(_SESSION_KEY) is self:
+            del st.session_state[_SESSION_KEY]
+        total = time.perf_counter() - self._started_at
+        with _cprofile_lock:
+            self._dump_stats()
+        if total > SLOW_RERUN_SECONDS:
+            breakdown = ", ".join(f"{span['name']} {span['seconds']:.2f}s" for span in self.spans
+                                  if "seconds" in span and span["depth"] == 0 and not span.get("background"))
+            logger.warning("Slow rerun of %s: %.2fs (%s)", self.page, total, breakdown)
+        if show:
+            self._show(total)
+        return total
+
+    def _show(self, total):
+        """Render the spans as a waterfall chart in an expander."""
+        spans = [span for span in self.spans if "seconds" in span]
+        with st.expander(f"⏱️ Rerun Profile: {total * 1000:,.0f} ms", expanded=False):
+            figure = go.Figure(go.Bar(
+                y=[f"{'  ' * span['depth']}{span['name']}" for span in spans],
+                x=[span["seconds"] * 1000 for span in spans],
+                base=[span["start"] * 1000 for span in spans],
+                orientation="h",
+                text=[f"{span['seconds'] * 1000:,.1f} ms" for span in spans],
+                textposition="auto",
+            ))
+            figure.update_layout(
+                xaxis_title="Milliseconds since rerun start",
+                yaxis={"autorange": "reversed"},
+                height=120 + 28 * len(spans),
+                margin={"l": 10, "r": 10, "t": 10, "b": 40},
+            )
+            st.plotly_chart(figure, use_container_width=True)
+            untracked = total - sum(span["seconds"] for span in spans if span["depth"] == 0 and not span.get("background"))
+            st.caption(f"{untracked * 1000:,.0f} ms of the rerun was spent outside the recorded stages.")
+            if self.stats_path is not None:
+                st.caption(f"cProfile stats written to `{self.stats_path}`")
+
+
+def _requested_mode():
+    """Profiling mode requested by the environment or the ?profile= query parameter."""
+    if PROFILE_MODE:
+        return PROFILE_MODE
+    # Visitors can only turn on the timing spans; cProfile dumps are for the operator
+    return "1" if st.query_params.get("profile", "") not in ("", "0") else ""
+
+
+def start_rerun_profile(page):
+    """
+    Start profiling the current rerun if profiling is enabled.
+
+    Args:
+        page (str): Name of the page, used in logs and dump file names
+
+    Returns:
+        RerunProfiler or a no-op profiler with the same span, record_span, discard and
+        finish methods; call finish at the end of the script
+    """
+    previous = st.session_state.get(_SESSION_KEY)
+    if previous is not None:
+        # The session's previous rerun was interrupted before it finished its profile
+        previous.discard()
+    mode = _requested_mode()
+    profiler = _DisabledProfiler() if mode in ("", "0") else RerunProfiler(page, dump_stats=mode == "cprofile")
+    st.session_state[_SESSION_KEY] = profiler
+    return profiler
@@ -0,0 +1,215 @@
+"""
+Process-wide cache of cohort analysis results shared by all sessions.
+
+Results are keyed on everything that determines them (see cohort_cache_key), kept in
+least-recently-used order and evicted once their total size exceeds a memory budget.
+Cached DataFrames are shared by reference, so callers must treat them as read-only
+(copy-on-write is enabled in Home.py).
+
+Besides hits, misses and evictions, the cache records how long each entry took to compute
+and when it was stored, so it can report the compute time its hits saved and the age of
+every entry (see utils.cache_info).
+
+Missing results being computed are tracked as in-flight futures (see claim), so callers
+asking for the same result meanwhile wait for that computation instead of repeating it.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import pandas as pd
+
+# Memory budget for cached results, in megabytes
+RESULT_CACHE_MAX_MB = float(os.environ.get("REPEATRADAR_RESULT_CACHE_MB", "256"))
+
+
+def estimate_size(value):
+    """
+    Estimate the resident size of a cached value in bytes.
+
+    Args:
+        value: A DataFrame, Series, or a dict/list/tuple of them
+
+    Returns:
+        int: Approximate size in bytes
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        size = value.memory_usage(deep=True)
+        return int(size.sum() if isinstance(value, pd.DataFrame) else size)
+    if isinstance(value, dict):
+        return sum(estimate_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(item) for item in value)
+    return 0
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache bounded by the total byte size of its entries.
+
+    Args:
+        max_bytes (int): Memory budget; least recently used entries are evicted beyond it
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        # Futures of the results being computed, by key
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self.compute_seconds_saved = 0.0
+
+    def get(self, key, record=True):
+        """
+        Look up a cached value, marking it as recently used.
+
+        Args:
+            key (tuple): Cache key
+            record (bool): Count the lookup in the hit and miss statistics; background
+                lookups such as the warm-up's are not requests users made
+
+        Returns:
+            The cached value, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += record
+                return None
+            self._entries.move_to_end(key)
+            if record:
+                entry[4] += 1
+                self.hits += 1
+                self.compute_seconds_saved += entry[2]
+            return entry[0]
+
+    def claim(self, key):
+        """
+        Claim the computation of a missing value, or find the computation in flight.
+
+        The owner must resolve the future with the value (or the exception that stopped
+        the computation) and then call release.
+
+        Args:
+            key (tuple): Cache key
+
+        Returns:
+            tuple: (future, is_owner), where is_owner is False if another caller is
+            already computing the value, whose future then resolves with it
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._in_flight[key] = future
+            return future, True
+
+    def release(self, key, future):
+        """End the claim of a computation once its future is resolved."""
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def put(self, key, value, compute_seconds=0.0):
+        """
+        Store a value, evicting least recently used entries to stay within the budget.
+
+        Values larger than the whole budget are not cached.
+
+        Args:
+            key (tuple): Cache key
+            value: Value to cache
+            compute_seconds (float): Time it took to compute the value, credited as saved
+                on every hit
+        """
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            # value, size, compute seconds, stored at, hits
+            self._entries[key] = [value, size, compute_seconds, time.time(), 0]
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted[1]
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all entries; counters are kept."""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """
+        Get the cache counters.
+
+        Returns:
+            dict: hits, misses, evictions, entries, current_bytes, max_bytes and
+            compute_seconds_saved
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "compute_seconds_saved": self.compute_seconds_saved,
+            }
+
+    def entry_stats(self):
+        """
+        Describe every cached entry, least recently used first.
+
+        Returns:
+            list: Dicts with key, bytes, age_seconds, compute_seconds and hits
+        """
+        now = time.time()
+        with self._lock:
+            return [
+                {"key": key, "bytes": size, "age_seconds": now - stored_at, "compute_seconds": compute_seconds, "hits": hits}
+                for key, (_, size, compute_seconds, stored_at, hits) in self._entries.items()
+            ]
+
+
+_result_cache = ResultCache(int(RESULT_CACHE_MAX_MB * 1024 * 1024))
+
+
+def get_result_cache():
+    """Get the process-wide cohort result cache."""
+    return _result_cache
+
+
+def cohort_cache_key(dataset_version, date_column, user_column, cohort_period, period_duration,
+                     value_column, aggregation_function, calculate_retention_rate, output_format):
+    """
+    Build the cache key of one cohort computation.
+
+    Args:
+        dataset_version (str): Version of the input dataset (see get_dataset_version)
+        date_column (str): Date column name
+        user_column (str): User column name
+        cohort_period (str): Cohort grouping period
+        period_duration (int or str): Period duration
+        value_column (str or None): Value column name
+        aggregation_function (str or None): Aggregation applied to the value column
+        calculate_retention_rate (bool): Whether retention percentages were requested
+        output_format (str): 'pivot' or 'long'
+
+    Returns:
+        tuple: Hashable cache key
+    """
+    return (dataset_version, date_column, user_column, cohort_period, period_duration,
+            value_column, aggregation_function, bool(calculate_retention_rate), output_format)
@@ -0,0 +1,215 @@
+"""
+Persistent on-disk store of cohort analysis results that survives restarts.
+
+The in-memory result cache (utils.result_cache) starts empty in every new process, so
+after a redeploy or worker recycle the first users would pay for every cohort table
+again. The store keeps each computed table as an Arrow IPC file in RESULT_STORE_DIR,
+named after a hash of its cache key (see cohort_cache_key), which includes the dataset
+version, i.e. the source file's content hash and the cleaning version. A changed dataset
+therefore never serves stale tables; its old files are simply no longer read and age out.
+
+Files are written to a temporary name and moved into place atomically, so concurrent
+readers (other sessions, other worker processes sharing the directory) never see a
+partial file. Reading a file refreshes its modification time, and once the files exceed
+REPEATRADAR_RESULT_STORE_MB the least recently used ones are deleted.
+
+Cleaned datasets are persisted separately, as memory-mapped snapshots (see
+utils.snapshot_cache).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+# Directory of the stored results, shared by all processes serving the dashboard
+RESULT_STORE_DIR = os.environ.get("REPEATRADAR_RESULT_STORE_DIR", os.path.join("data", ".results"))
+
+# Disk budget for stored results, in megabytes; 0 disables the store
+RESULT_STORE_MAX_MB = float(os.environ.get("REPEATRADAR_RESULT_STORE_MB", "1024"))
+
+# Key of the compute time stored in each file's schema metadata
+METADATA_KEY = b"repeatradar"
+
+
+class ResultStore:
+    """
+    Size-bounded store of DataFrames in a directory of Arrow IPC files.
+
+    Args:
+        directory (str): Directory holding the files
+        max_bytes (int): Disk budget; least recently used files are deleted beyond it
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.compute_seconds_saved = 0.0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _path(self, key):
+        """File path of a cache key."""
+        digest = hashlib.sha256(json.dumps(list(key), default=str).encode()).hexdigest()
+        return os.path.join(self.directory, f"{digest[:32]}.arrow")
+
+    def get(self, key, record=True):
+        """
+        Read a stored DataFrame, marking it as recently used.
+
+        Args:
+            key (tuple): Cache key
+            record (bool): Count the lookup in the hit and miss statistics
+
+        Returns:
+            pd.DataFrame or None: The stored value, or None if missing or unreadable
+        """
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with pa.memory_map(path, "r") as source:
+                table = pa.ipc.open_file(source).read_all()
+            os.utime(path)
+        except (OSError, pa.ArrowException) as e:
+            if os.path.exists(path):
+                logger.warning("Ignoring unreadable stored result %s: %s", path, e)
+            with self._lock:
+                self.misses += record
+            return None
+        compute_seconds = json.loads((table.schema.metadata or {}).get(METADATA_KEY, b"{}")).get("compute_seconds", 0.0)
+        if record:
+            with self._lock:
+                self.hits += 1
+                self.compute_seconds_saved += compute_seconds
+        return table.to_pandas()
+
+    def put(self, key, value, compute_seconds=0.0):
+        """
+        Store a DataFrame atomically, then evict least recently used files beyond the budget.
+
+        Failures are logged and ignored: the caller already holds the value.
+
+        Args:
+            key (tuple): Cache key
+            value (pd.DataFrame): Value to store
+            compute_seconds (float): Time it took to compute the value, credited as saved
+                on every hit
+        """
+        if not self.enabled:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            table = pa.Table.from_pandas(value)
+            metadata = dict(table.schema.metadata or {})
+            metadata[METADATA_KEY] = json.dumps({"compute_seconds": compute_seconds}).encode()
+            table = table.replace_schema_metadata(metadata)
+            with pa.OSFile(tmp_path, "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_path, path)
+        except (OSError, pa.ArrowException) as e:
+            logger.warning("Could not store result %s: %s", path, e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._evict()
+
+    def _files(self):
+        """Stored files as (path, size, modification time), least recently used first."""
+        files = []
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return files
+        for entry in entries:
+            if not entry.name.endswith(".arrow"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                # Evicted by another process meanwhile
+                continue
+            files.append((entry.path, stat.st_size, stat.st_mtime))
+        return sorted(files, key=lambda file: file[2])
+
+    def _evict(self):
+        """Delete least recently used files until the store fits its budget."""
+        files = self._files()
+        total = sum(size for _, size, _ in files)
+        for path, size, _ in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def clear(self):
+        """Delete all stored files; counters are kept."""
+        for path, _, _ in self._files():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        """
+        Get the store counters.
+
+        Returns:
+            dict: hits, misses, evictions, entries, current_bytes, max_bytes and
+            compute_seconds_saved
+        """
+        files = self._files()
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(files),
+                "current_bytes": sum(size for _, size, _ in files),
+                "max_bytes": self.max_bytes,
+                "compute_seconds_saved": self.compute_seconds_saved,
+            }
+
+    def entry_stats(self):
+        """
+        Describe every stored file, least recently used first.
+
+        Stored files are named by key hash, so the key is the file name, and hits and
+        compute times per file are not tracked (both are reported as 0).
+
+        Returns:
+            list: Dicts with key, bytes, age_seconds (since last use), compute_seconds and hits
+        """
+        now = time.time()
+        return [
+            {"key": os.path.basename(path), "bytes": size, "age_seconds": now - modified_at, "compute_seconds": 0.0, "hits": 0}
+            for path, size, modified_at in self._files()
+        ]
+
+
+_result_store = ResultStore(RESULT_STORE_DIR, int(RESULT_STORE_MAX_MB * 1024 * 1024))
+
+
+def get_result_store():
+    """Get the process-wide persistent result store."""
+    return _result_store
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import logging
+import os
+
+import pyarrow as pa
+from utils.dataset_profile import profile_dataset
+
+logger = logging.getLogger(__name__)
+
+# Snapshots live next to the source CSVs unless overridden (e.g. for a read-only checkout)
+SNAPSHOT_DIR = os.environ.get("REPEATRADAR_SNAPSHOT_DIR", os.path.join("data", ".snapshots"))
+
+# Key of the dataset summary stored in the snapshot's schema metadata
+METADATA_KEY = b"repeatradar"
+
+# File hashes by (path, size, modification time), so unchanged files are hashed only once per process
+_fingerprints = {}
+
+
+def file_fingerprint(path, chunk_size=1 << 20):
+    """
+    Compute a content hash of a source file.
+
+    Args:
+        path (str): Path of the file to hash
+        chunk_size (int): Number of bytes read per iteration
+
+    Returns:
+        str: Hex digest of the file's SHA-256 hash
+    """
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if key not in _fingerprints:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        _fingerprints[key] = digest.hexdigest()
+    return _fingerprints[key]
+
+
+def snapshot_path(name, source_path, cleaning_version):
+    """
+    Build the snapshot file path for a dataset.
+
+    The path is keyed on the source file hash and the cleaning-code version, so a changed
+    CSV or a changed cleaning step never picks up an old snapshot.
+
+    Args:
+        name (str): Short dataset name used as the file prefix
+        source_path (str): Path of the source CSV file
+        cleaning_version (int): Version of the cleaning code that produced the frame
+
+    Returns:
+        str: Path of the Arrow IPC snapshot file
+    """
+    source_hash = file_fingerprint(source_path)[:16]
+    return os.path.join(SNAPSHOT_DIR, f"{name}-{source_hash}-v{cleaning_version}.arrow")
+
+
+def read_snapshot(path):
+    """
+    Read a cleaned DataFrame from an Arrow IPC snapshot, memory-mapping the file.
+
+    Args:
+        path (str): Path of the snapshot file
+
+    Returns:
+        pd.DataFrame or None: The snapshot contents, or None if it is missing or unreadable
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        return table.to_pandas()
+    except (OSError, pa.ArrowException) as e:
+        logger.warning("Ignoring unreadable snapshot %s: %s", path, e)
+        return None
+
+
+def read_snapshot_metadata(path):
+    """
+    Read the schema and dataset summary of a snapshot from its footer, without loading rows.
+
+    Args:
+        path (str): Path of the snapshot file
+
+    Returns:
+        dict or None: Dict with columns, dtypes, row_count, date_min, date_max and profile
+        (see utils.dataset_profile, None for snapshots written without one), or None if
+        the snapshot is missing or unreadable
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with pa.memory_map(path, "r") as source:
+            schema = pa.ipc.open_file(source).schema
+    except (OSError, pa.ArrowException) as e:
+        logger.warning("Ignoring unreadable snapshot %s: %s", path, e)
+        return None
+
+    # An empty table carries the pandas metadata, so categoricals and datetimes map back exactly
+    dtypes = schema.empty_table().to_pandas().dtypes
+    summary = json.loads((schema.metadata or {}).get(METADATA_KEY, b"{}"))
+    return {
+        "columns": dtypes.index.tolist(),
+        "dtypes": {column: str(dtype) for column, dtype in dtypes.items()},
+        "row_count": summary.get("row_count"),
+        "date_min": summary.get("date_min"),
+        "date_max": summary.get("date_max"),
+        "profile": summary if "column_stats" in summary else None,
+    }
+
+
+def summarize_frame(data, date_column=None, user_column=None):
+    """
+    Build the dataset summary stored in a snapshot's metadata.
+
+    Args:
+        data (pd.DataFrame): Cleaned DataFrame
+        date_column (str, optional): Datetime column whose range is recorded
+        user_column (str, optional): Column whose distinct values are counted as users
+
+    Returns:
+        dict: The dataset profile (see utils.dataset_profile.profile_dataset), which
+        includes row_count, date_min and date_max
+    """
+    return profile_dataset(data, date_column, user_column)
+
+
+def write_snapshot(data, path, date_column=None, user_column=None):
+    """
+    Write a cleaned DataFrame to an Arrow IPC snapshot and remove stale snapshots of it.
+
+    The file is written uncompressed so it can be memory-mapped, and is moved into place
+    atomically so concurrent readers never see a partial file. Failures are logged and
+    ignored: the caller already holds the cleaned frame.
+
+    Args:
+        data (pd.DataFrame): Cleaned DataFrame to store
+        path (str): Destination path from snapshot_path
+        date_column (str, optional): Datetime column whose range is recorded in the metadata
+        user_column (str, optional): User column whose distinct count is recorded in the metadata
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(data, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[METADATA_KEY] = json.dumps(summarize_frame(data, date_column, user_column)).encode()
+        table = table.replace_schema_metadata(metadata)
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+    except (OSError, pa.ArrowException) as e:
+        logger.warning("Could not write snapshot %s: %s", path, e)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+
+    # Drop snapshots of older source files or cleaning versions for the same dataset
+    prefix = os.path.basename(path).split("-")[0] + "-"
+    for file_name in os.listdir(os.path.dirname(path)):
+        stale_path = os.path.join(os.path.dirname(path), file_name)
+        if file_name.startswith(prefix) and file_name.endswith(".arrow") and stale_path != path:
+            try:
+                os.remove(stale_path)
+            except OSError:
+                pass
+
+
+def load_with_snapshot(name, source_path, cleaning_version, build_function, date_column=None, progress=None, user_column=None):
+    """
+    Load a cleaned dataset from its snapshot, rebuilding it from CSV when stale or missing.
+
+    Args:
+        name (str): Short dataset name used as the snapshot file prefix
+        source_path (str): Path of the source CSV file
+        cleaning_version (int): Version of the cleaning code in build_function
+        build_function (callable): Function returning the cleaned DataFrame from the CSV
+        date_column (str, optional): Datetime column whose range is recorded in the metadata
+        progress (callable, optional): Progress callback (see utils.load_progress)
+        user_column (str, optional): User column whose distinct count is recorded in the metadata
+
+    Returns:
+        pd.DataFrame: The cleaned dataset
+    """
+    if progress is not None:
+        progress("Looking for a cached snapshot", stage="read")
+    path = snapshot_path(name, source_path, cleaning_version)
+    data = read_snapshot(path)
+    if data is not None:
+        return data
+
+    data = build_function()
+    if progress is not None:
+        progress("Profiling and writing snapshot", stage="snapshot")
+    write_snapshot(data, path, date_column, user_column)
+    return data
@@ -0,0 +1,324 @@
+"""
+Synthetic transactions shaped like the sample datasets, for load tests and benchmarks.
+
+Transactions come from a small generative model, drawn with vectorized NumPy:
+
+- users are acquired over the history, at a daily rate that grows by a configurable
+  factor from the first day to the last (acquisition_growth)
+- each user has a purchase frequency (lognormal, spread activity_sigma) and an active
+  lifetime (exponential, mean churn_lifetime_days) after which they stop buying
+- purchase volume follows a yearly cycle peaking on peak_day_of_year and a weekday
+  cycle with quieter weekends (yearly_seasonality, weekly_seasonality)
+- order values are lognormal (order_value_median, order_value_sigma)
+
+Rows are generated chunk_rows at a time, each chunk from its own random stream, so the
+same seed, row count and chunk size always give the same data, and memory is bounded by
+one chunk plus the per-user table (about 16 bytes per user) however many rows are written.
+Output frames have the columns and value formats of the sample CSVs, so they go through
+the same loaders; write_synthetic_csv and write_synthetic_parquet stream them to disk:
+
+    python -m utils.synthetic_data "E-commerce Data 1" 100M data/synthetic_1.parquet
+"""
+
+import argparse
+import functools
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from utils.dataset_registry import DATASET_REGISTRY
+
+# Rows generated and written at a time
+SYNTHETIC_CHUNK_ROWS = int(os.environ.get("REPEATRADAR_SYNTHETIC_CHUNK_ROWS", "1000000"))
+
+SYNTHETIC_DEFAULTS = {
+    "n_users": None,  # By default one user per 20 rows
+    "start": "2010-12-01",
+    "days": 730,
+    "acquisition_growth": 2.0,
+    "activity_sigma": 1.0,
+    "churn_lifetime_days": 120.0,
+    "yearly_seasonality": 0.3,
+    "peak_day_of_year": 330,
+    "weekly_seasonality": 0.2,
+    "order_value_median": 15.0,
+    "order_value_sigma": 0.9,
+    "guest_share": 0.2,  # Share of E-commerce Data 1 rows without a CustomerID
+}
+
+# Weekday (Monday first) factors of the weekly cycle
+_WEEKDAY_PROFILE = np.array([1.0, 1.0, 1.0, 1.0, 0.5, -1.5, -1.5])
+
+_COUNTRIES = ["United Kingdom", "Germany", "France", "EIRE", "Spain", "Netherlands", "Belgium", "Switzerland"]
+_COUNTRY_WEIGHTS = [0.82, 0.05, 0.04, 0.03, 0.02, 0.02, 0.01, 0.01]
+_PRODUCTS = [
+    "WHITE HANGING HEART T-LIGHT HOLDER", "REGENCY CAKESTAND 3 TIER", "JUMBO BAG RED RETROSPOT",
+    "PARTY BUNTING", "LUNCH BAG RED RETROSPOT", "ASSORTED COLOUR BIRD ORNAMENT",
+    "SET OF 3 CAKE TINS PANTRY DESIGN", "PACK OF 72 RETROSPOT CAKE CASES",
+    "NATURAL SLATE HEART CHALKBOARD", "HEART OF WICKER SMALL",
+]
+_CATEGORY_PRODUCTS = {
+    "Fashion": ["T - Shirts", "Shirts", "Jeans", "Sneakers", "Watches"],
+    "Home & Furniture": ["Sofa Covers", "Bed Sheets", "Curtains", "Towels", "Table Lamps"],
+    "Auto & Accessories": ["Car Speakers", "Tyre", "Car Media Players", "Car Pillow & Neck Rest"],
+    "Electronic": ["Mobile Covers", "Headphones", "Smart Watches", "Speakers", "Fans"],
+}
+
+
+def _settings(overrides):
+    """Merge keyword overrides into SYNTHETIC_DEFAULTS, rejecting unknown settings."""
+    unknown = set(overrides) - set(SYNTHETIC_DEFAULTS)
+    if unknown:
+        raise TypeError(f"Unknown synthetic data settings: {', '.join(sorted(unknown))}")
+    return {**SYNTHETIC_DEFAULTS, **overrides}
+
+
+def _generate_users(n_users, seed, settings):
+    """
+    Draw the per-user acquisition days, purchase frequencies and lifetimes.
+
+    Returns:
+        dict: acquisition_day (int32), lifetime (float32, days) and cumulative_weight
+        (float64, running sum of purchase frequencies for sampling users)
+    """
+    rng = np.random.default_rng([seed, 0])
+    days = settings["days"]
+    # Inverse CDF of an exponentially growing daily acquisition rate
+    growth_rate = np.log(settings["acquisition_growth"]) / days
+    u = rng.random(n_users)
+    if abs(growth_rate) < 1e-12:
+        acquisition_day = u * days
+    else:
+        acquisition_day = np.log1p(u * np.expm1(growth_rate * days)) / growth_rate
+    return {
+        "acquisition_day": np.minimum(acquisition_day, days - 1).astype(np.int32),
+        "lifetime": rng.exponential(settings["churn_lifetime_days"], n_users).astype(np.float32),
+        "cumulative_weight": np.cumsum(rng.lognormal(0.0, settings["activity_sigma"], n_users)),
+    }
+
+
+def _seasonal_intensity(day, settings):
+    """Relative purchase volume on each day index, between 0 and its maximum."""
+    dates = np.datetime64(settings["start"], "D") + day
+    day_of_year = (dates - dates.astype("datetime64[Y]")).astype(np.int64)
+    weekday = (dates.astype(np.int64) + 3) % 7
+    yearly = 1 + settings["yearly_seasonality"] * np.cos(2 * np.pi * (day_of_year - settings["peak_day_of_year"]) / 365.25)
+    weekly = 1 + settings["weekly_seasonality"] * _WEEKDAY_PROFILE[weekday]
+    return np.clip(yearly, 0, None) * np.clip(weekly, 0, None)
+
+
+def _draw_purchases(rng, users, n, settings):
+    """
+    Draw the user code and day index of n purchases.
+
+    Candidates are drawn by user frequency, placed uniformly within the user's lifetime
+    and thinned by the seasonal intensity; purchases past the end of the history are
+    dropped, so late cohorts are censored as in real data.
+    """
+    max_intensity = (1 + abs(settings["yearly_seasonality"])) * (1 + abs(settings["weekly_seasonality"]) * np.abs(_WEEKDAY_PROFILE).max())
+    total_weight = users["cumulative_weight"][-1]
+    user_codes, purchase_days = [], []
+    remaining, acceptance = n, 0.5
+    while remaining > 0:
+        m = int(remaining / acceptance * 1.1) + 64
+        candidate = np.searchsorted(users["cumulative_weight"], rng.random(m) * total_weight, side="right")
+        candidate = np.minimum(candidate, len(users["cumulative_weight"]) - 1)
+        day = users["acquisition_day"][candidate] + (rng.random(m) * users["lifetime"][candidate]).astype(np.int64)
+        in_history = day < settings["days"]
+        candidate, day = candidate[in_history], day[in_history]
+        accepted = rng.random(len(day)) * max_intensity < _seasonal_intensity(day, settings)
+        acceptance = max(accepted.sum() / m, 0.01)
+        user_codes.append(candidate[accepted][:remaining])
+        purchase_days.append(day[accepted][:remaining])
+        remaining -= len(user_codes[-1])
+    return np.concatenate(user_codes), np.concatenate(purchase_days)
+
+
+def _order_values(rng, n, settings):
+    """Draw n lognormal order values."""
+    return rng.lognormal(np.log(settings["order_value_median"]), settings["order_value_sigma"], n)
+
+
+def _choice(rng, categories, n, p=None):
+    """Draw n categorical values without building Python strings."""
+    return pd.Categorical.from_codes(rng.choice(len(categories), n, p=p), categories=categories)
+
+
+def _sample1_chunk(rng, users, n, first_row, settings):
+    """Rows shaped like E-commerce Data 1: invoices of several items bought together."""
+    # Each invoice is one purchase of a geometric number of items
+    basket_size = rng.geometric(0.25, n)
+    baskets = np.searchsorted(np.cumsum(basket_size), n) + 1
+    basket_size = basket_size[:baskets]
+    basket_size[-1] -= basket_size.sum() - n
+    user_codes, day = _draw_purchases(rng, users, baskets, settings)
+    minute = rng.integers(7 * 60, 20 * 60, baskets)
+    timestamp = (np.datetime64(settings["start"], "m") + (day * 1440 + minute).astype("timedelta64[m]")).astype("datetime64[s]")
+    guest = rng.random(baskets) < settings["guest_share"]
+    customer = pd.array(np.where(guest, 0, user_codes + 12346), dtype="Int64")
+    customer[guest] = pd.NA
+
+    basket_of_row = np.repeat(np.arange(baskets), basket_size)
+    quantity = rng.geometric(0.2, n).astype(np.int64)
+    unit_price = np.maximum(np.round(_order_values(rng, n, settings) / np.sqrt(quantity), 2), 0.01)
+    return pd.DataFrame({
+        "InvoiceNo": 536365 + first_row + basket_of_row,
+        "StockCode": rng.integers(20000, 24000, n),
+        "Description": _choice(rng, _PRODUCTS, n),
+        "Quantity": quantity,
+        "InvoiceDate": timestamp[basket_of_row],
+        "UnitPrice": unit_price,
+        "CustomerID": customer.take(basket_of_row),
+        "Country": _choice(rng, _COUNTRIES, baskets, _COUNTRY_WEIGHTS).take(basket_of_row),
+    })
+
+
+def _sample2_chunk(rng, users, n, first_row, settings):
+    """Rows shaped like E-commerce Data 2: one order per row, dates and times in separate columns."""
+    user_codes, day = _draw_purchases(rng, users, n, settings)
+    category_names = list(_CATEGORY_PRODUCTS)
+    category = rng.choice(len(category_names), n, p=[0.5, 0.2, 0.15, 0.15])
+    products = [product for name in category_names for product in _CATEGORY_PRODUCTS[name]]
+    product_offset = np.cumsum([0] + [len(_CATEGORY_PRODUCTS[name]) for name in category_names])
+    product_count = np.diff(product_offset)
+    product = product_offset[category] + (rng.random(n) * product_count[category]).astype(np.int64)
+
+    sales = np.round(_order_values(rng, n, settings) * 10, 0)
+    discount = np.round(rng.integers(1, 6, n) * 0.1, 1)
+    profit = np.round(sales * rng.uniform(0.05, 0.5, n), 1)
+    return pd.DataFrame({
+        "Order_Date": np.datetime64(settings["start"], "D") + day.astype("timedelta64[D]"),
+        "Time": pd.Categorical.from_codes(rng.integers(0, 86400, n), categories=_times_of_day()),
+        "Aging": rng.integers(1, 11, n).astype(np.float64),
+        "Customer_Id": user_codes + 10000,
+        "Gender": _choice(rng, ["Male", "Female"], n, [0.55, 0.45]),
+        "Device_Type": _choice(rng, ["Web", "Mobile"], n, [0.93, 0.07]),
+        "Customer_Login_type": _choice(rng, ["Member", "Guest", "First SignUp", "New"], n, [0.95, 0.03, 0.015, 0.005]),
+        "Product_Category": pd.Categorical.from_codes(category, categories=category_names),
+        "Product": pd.Categorical.from_codes(product, categories=products),
+        "Sales": sales,
+        "Quantity": rng.integers(1, 6, n).astype(np.float64),
+        "Discount": discount,
+        "Profit": profit,
+        "Shipping_Cost": np.round(profit * 0.1, 1),
+        "Order_Priority": _choice(rng, ["Medium", "High", "Critical", "Low"], n, [0.57, 0.3, 0.08, 0.05]),
+        "Payment_method": _choice(rng, ["credit_card", "money_order", "e_wallet", "debit_card"], n, [0.74, 0.19, 0.05, 0.02]),
+    })
+
+
+@functools.lru_cache(maxsize=1)
+def _times_of_day():
+    """All 86,400 times of day formatted as HH:MM:SS."""
+    seconds = np.arange(86400)
+    return pd.Index([f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in seconds])
+
+
+# Chunk builders and the date format of their datetime column in the sample CSVs
+_LAYOUTS = {
+    "E-commerce Data 1": (_sample1_chunk, "%m/%d/%Y %H:%M"),
+    "E-commerce Data 2": (_sample2_chunk, "%Y-%m-%d"),
+}
+
+
+def _layout(dataset_name):
+    """Look up the chunk builder and date format of a dataset."""
+    if dataset_name not in _LAYOUTS:
+        raise ValueError(f"No synthetic layout for dataset {dataset_name!r}; choose one of {', '.join(_LAYOUTS)}")
+    return _LAYOUTS[dataset_name]
+
+
+def generate_transactions(dataset_name, n_rows, seed=0, chunk_rows=SYNTHETIC_CHUNK_ROWS, **settings):
+    """
+    Generate synthetic transactions shaped like a sample dataset, chunk by chunk.
+
+    Args:
+        dataset_name (str): "E-commerce Data 1" or "E-commerce Data 2"
+        n_rows (int): Total number of rows
+        seed (int): Random seed
+        chunk_rows (int): Rows per generated chunk
+        **settings: Overrides of SYNTHETIC_DEFAULTS
+
+    Yields:
+        pd.DataFrame: Chunks of at most chunk_rows rows with the dataset's raw columns;
+        date columns are datetimes, written in the CSV's format by write_synthetic_csv
+    """
+    build_chunk, _ = _layout(dataset_name)
+    settings = _settings(settings)
+    n_users = settings["n_users"] or max(n_rows // 20, 1)
+    users = _generate_users(n_users, seed, settings)
+    for chunk_index, first_row in enumerate(range(0, n_rows, chunk_rows)):
+        rng = np.random.default_rng([seed, chunk_index + 1])
+        yield build_chunk(rng, users, min(chunk_rows, n_rows - first_row), first_row, settings)
+
+
+def write_synthetic_csv(path, dataset_name, n_rows, seed=0, chunk_rows=SYNTHETIC_CHUNK_ROWS, **settings):
+    """
+    Stream synthetic transactions to a CSV readable by the dataset's loader.
+
+    Args:
+        path (str): Output CSV path
+        dataset_name (str): "E-commerce Data 1" or "E-commerce Data 2"
+        n_rows (int): Total number of rows
+        seed (int): Random seed
+        chunk_rows (int): Rows generated and written at a time
+        **settings: Overrides of SYNTHETIC_DEFAULTS
+    """
+    _, date_format = _layout(dataset_name)
+    encoding = DATASET_REGISTRY[dataset_name]["read_options"].get("encoding", "utf-8")
+    with open(path, "w", encoding=encoding, newline="") as f:
+        for chunk_index, chunk in enumerate(generate_transactions(dataset_name, n_rows, seed, chunk_rows, **settings)):
+            chunk.to_csv(f, index=False, header=chunk_index == 0, date_format=date_format)
+
+
+def write_synthetic_parquet(path, dataset_name, n_rows, seed=0, chunk_rows=SYNTHETIC_CHUNK_ROWS, **settings):
+    """
+    Stream synthetic transactions to a Parquet file, one row group per chunk.
+
+    Args:
+        path (str): Output Parquet path
+        dataset_name (str): "E-commerce Data 1" or "E-commerce Data 2"
+        n_rows (int): Total number of rows
+        seed (int): Random seed
+        chunk_rows (int): Rows generated and written at a time
+        **settings: Overrides of SYNTHETIC_DEFAULTS
+    """
+    writer = None
+    try:
+        for chunk in generate_transactions(dataset_name, n_rows, seed, chunk_rows, **settings):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def parse_row_count(text):
+    """Parse a row count such as '100k', '1M' or '25000'."""
+    multipliers = {"k": 1_000, "m": 1_000_000}
+    text = text.strip().lower()
+    if text[-1] in multipliers:
+        return int(float(text[:-1]) * multipliers[text[-1]])
+    return int(text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic transactions shaped like a sample dataset.")
+    parser.add_argument("dataset", choices=list(_LAYOUTS), help="Dataset whose shape is generated")
+    parser.add_argument("rows", type=parse_row_count, help="Number of rows, e.g. 100k or 100M")
+    parser.add_argument("output", help="Output path; .parquet files are written as Parquet, anything else as CSV")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--chunk-rows", type=int, default=SYNTHETIC_CHUNK_ROWS, help="Rows generated at a time")
+    parser.add_argument("--users", type=int, default=None, help="Number of users (default: one per 20 rows)")
+    args = parser.parse_args(argv)
+
+    write = write_synthetic_parquet if args.output.endswith(".parquet") else write_synthetic_csv
+    write(args.output, args.dataset, args.rows, args.seed, args.chunk_rows, n_users=args.users)
+    print(f"Wrote {args.rows:,} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
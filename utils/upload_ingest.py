@@ -0,0 +1,230 @@
+"""
+Streaming ingest of user-uploaded transaction files.
+
+An upload is never loaded whole. The CSV is read in chunks of at most UPLOAD_CHUNK_ROWS
+rows, only the columns the analysis needs are parsed, and every chunk is folded into a
+CohortState (see utils.cohort_engine), which keeps the per-user first-seen dates and the
+cohort cell aggregates. Peak memory is one chunk plus that state, which grows with the
+number of users, their active (user, period) pairs and, for nunique, the distinct values
+of each cell, but not with the number of rows.
+
+The schema (date, user and optional value column, and the date format) is inferred from
+the first rows or supplied by the caller. Dates are parsed with one format for the whole
+column, which is fast and reads every value with the same day and month order; only
+when no single format fits the sample is each value parsed on its own ("mixed").
+"""
+
+import os
+import warnings
+
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+from utils.cohort_engine import CohortState
+
+# Rows read and parsed at a time
+UPLOAD_CHUNK_ROWS = int(os.environ.get("REPEATRADAR_UPLOAD_CHUNK_ROWS", "200000"))
+
+# Rows read to preview an upload and infer its schema
+UPLOAD_SAMPLE_ROWS = 1000
+
+# Sample values whose guessed formats are tried when inferring a date format
+_DATE_FORMAT_CANDIDATE_VALUES = 20
+
+# Column name fragments that suggest a column holds user identifiers or timestamps
+_USER_COLUMN_HINTS = ("customer", "user", "client", "member", "account", "buyer")
+_DATE_COLUMN_HINTS = ("date", "time", "timestamp", "created", "ordered")
+
+
+def _rewind(source):
+    """Move a file-like source back to its start; paths need nothing."""
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+
+def read_upload_sample(source, nrows=UPLOAD_SAMPLE_ROWS):
+    """
+    Read the first rows of an upload, leaving a file-like source rewound.
+
+    Args:
+        source (str or file-like): Path or binary file object of the CSV
+        nrows (int): Number of rows to read
+
+    Returns:
+        pd.DataFrame: The first rows, every column read as a string
+    """
+    _rewind(source)
+    sample = pd.read_csv(source, nrows=nrows, dtype=str, encoding_errors="replace")
+    _rewind(source)
+    return sample
+
+
+def _datetime_share(values, date_format=None):
+    """Share of non-empty values that parse as datetimes."""
+    values = values.dropna()
+    if values.empty:
+        return 0.0
+    parsed = pd.to_datetime(values, format=date_format or "mixed", errors="coerce")
+    return parsed.notna().mean()
+
+
+def infer_date_format(values):
+    """
+    Find one strftime format that parses every value of a sample.
+
+    Formats are guessed from the first values, month first and then day first, so a
+    column with e.g. "13/09/2011" among its values is read day first throughout.
+
+    Args:
+        values (pd.Series): Date strings
+
+    Returns:
+        str or None: The format, or None if no single guessed format fits every value
+    """
+    values = values.dropna()
+    candidates = []
+    for value in values.head(_DATE_FORMAT_CANDIDATE_VALUES).tolist():
+        for dayfirst in (False, True):
+            with warnings.catch_warnings():
+                # pandas warns when the guess contradicts dayfirst, which is expected here
+                warnings.simplefilter("ignore", UserWarning)
+                date_format = guess_datetime_format(value, dayfirst=dayfirst)
+            if date_format is not None and date_format not in candidates:
+                candidates.append(date_format)
+    return next((date_format for date_format in candidates if _datetime_share(values, date_format) == 1.0), None)
+
+
+def infer_upload_schema(sample):
+    """
+    Guess the cohort analysis columns of an upload from its first rows.
+
+    Args:
+        sample (pd.DataFrame): Output of read_upload_sample
+
+    Returns:
+        dict: date_column and user_column (None when nothing fits), value_columns (the
+        numeric columns) and date_format (None when no single format fits, so values
+        are parsed one by one)
+    """
+    columns = list(sample.columns)
+
+    def hinted_first(hints):
+        return sorted(columns, key=lambda column: not any(hint in column.lower() for hint in hints))
+
+    date_column = next(
+        (column for column in hinted_first(_DATE_COLUMN_HINTS) if _datetime_share(sample[column]) >= 0.9),
+        None,
+    )
+    numeric_columns = [
+        column for column in columns
+        if column != date_column and pd.to_numeric(sample[column].dropna(), errors="coerce").notna().all()
+        and sample[column].notna().any()
+    ]
+    user_candidates = [column for column in hinted_first(_USER_COLUMN_HINTS) if column != date_column]
+    user_column = next(
+        (column for column in user_candidates if any(hint in column.lower() for hint in _USER_COLUMN_HINTS)),
+        user_candidates[0] if user_candidates else None,
+    )
+    return {
+        "date_column": date_column,
+        "user_column": user_column,
+        "value_columns": [column for column in numeric_columns if column != user_column],
+        "date_format": infer_date_format(sample[date_column]) if date_column is not None else None,
+    }
+
+
+def parse_upload_chunk(chunk, schema, value_column=None):
+    """
+    Parse the analysis columns of one chunk of an upload.
+
+    Users stay strings, so identifiers read as numbers in one chunk and with missing
+    values in another still match.
+
+    Args:
+        chunk (pd.DataFrame): Rows read with every column as a string
+        schema (dict): date_column, user_column and optional date_format
+        value_column (str, optional): Column parsed as numbers
+
+    Returns:
+        pd.DataFrame: The date, user and value columns; unparseable dates and values are missing
+    """
+    parsed = pd.DataFrame({
+        schema["date_column"]: pd.to_datetime(chunk[schema["date_column"]], format=schema.get("date_format") or "mixed", errors="coerce"),
+        schema["user_column"]: chunk[schema["user_column"]].str.strip(),
+    })
+    if parsed[schema["date_column"]].dt.tz is not None:
+        # Keep local wall-clock times, as the cohort engine does
+        parsed[schema["date_column"]] = parsed[schema["date_column"]].dt.tz_localize(None)
+    if value_column is not None:
+        parsed[value_column] = pd.to_numeric(chunk[value_column], errors="coerce")
+    return parsed
+
+
+def _source_size(source):
+    """Total size in bytes of a path or file-like source, or None if unknown."""
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    return getattr(source, "size", None)
+
+
+def _read_chunks(source, usecols, chunk_rows):
+    """Yield (chunk, fraction of the file read) for a path or file-like source."""
+    total_bytes = _source_size(source)
+    _rewind(source)
+    handle = open(source, "rb") if isinstance(source, (str, os.PathLike)) else source
+    try:
+        reader = pd.read_csv(handle, usecols=usecols, dtype=str, chunksize=chunk_rows, encoding_errors="replace")
+        for chunk in reader:
+            yield chunk, (min(handle.tell() / total_bytes, 1.0) if total_bytes else None)
+    finally:
+        if handle is not source:
+            handle.close()
+        _rewind(source)
+
+
+def stream_upload(source, schema, cohort_period='M', period_duration=30, value_column=None,
+                  aggregation_function='sum', chunk_rows=UPLOAD_CHUNK_ROWS, progress=None):
+    """
+    Build the cohort state of an upload by streaming it chunk by chunk.
+
+    Uploads need not be sorted by date, so the file is streamed twice: the first pass
+    collects every user's first-seen date, the second folds the rows into the cohort cells.
+
+    Args:
+        source (str or file-like): Path or binary file object of the CSV
+        schema (dict): date_column, user_column and optional date_format
+        cohort_period (str): Cohort grouping period ('D', 'W', 'M', 'Q', 'Y')
+        period_duration (int): Period duration in days
+        value_column (str, optional): Numeric column to aggregate
+        aggregation_function (str): One of utils.cohort_engine.INCREMENTAL_AGGREGATIONS
+        chunk_rows (int): Maximum number of rows held in memory at a time
+        progress (callable, optional): Called after each chunk with a message and the
+            fraction of the work done so far (None if the file size is unknown)
+
+    Returns:
+        CohortState: State whose tables() are the cohort tables of the whole upload
+    """
+    date_column, user_column = schema["date_column"], schema["user_column"]
+    state = CohortState(date_column, user_column, cohort_period, period_duration, value_column, aggregation_function)
+
+    first_seen = None
+    rows_read = 0
+    for chunk_number, (chunk, fraction) in enumerate(_read_chunks(source, [date_column, user_column], chunk_rows), start=1):
+        parsed = parse_upload_chunk(chunk, schema)
+        chunk_first_seen = parsed.dropna().groupby(user_column)[date_column].min()
+        first_seen = chunk_first_seen if first_seen is None else pd.concat([first_seen, chunk_first_seen]).groupby(level=0).min()
+        rows_read += len(chunk)
+        if progress is not None:
+            progress(f"Pass 1/2, chunk {chunk_number}: {rows_read:,} rows read, {len(first_seen):,} users found",
+                     fraction / 2 if fraction is not None else None)
+    if first_seen is not None:
+        state.seed_first_seen(first_seen)
+
+    usecols = [date_column, user_column] + ([value_column] if value_column is not None else [])
+    rows_read = 0
+    for chunk_number, (chunk, fraction) in enumerate(_read_chunks(source, usecols, chunk_rows), start=1):
+        state.update(parse_upload_chunk(chunk, schema, value_column))
+        rows_read += len(chunk)
+        if progress is not None:
+            progress(f"Pass 2/2, chunk {chunk_number}: {rows_read:,} rows aggregated",
+                     0.5 + fraction / 2 if fraction is not None else None)
+    return state
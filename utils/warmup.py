@@ -0,0 +1,135 @@
+"""
+Background warm-up of the cohort result cache.
+
+After a dataset loads, the active-user and retention tables of every cohort period and
+period duration offered in Home.py are computed on a small thread pool and stored in the
+result cache, most popular combinations first, so a user's first visit to a combination
+is a cache hit instead of a spinner. The pool is capped at WARMUP_WORKERS threads so the
+warm-up never competes with more than that many cores against interactive requests, and
+pending combinations of a dataset version that is no longer loaded, or that a session is
+already computing, are skipped. Warm-up lookups are not counted in the cache statistics,
+and failures are logged.
+"""
+
+import logging
+import math
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.cohort_engine import COHORT_PERIODS, PERIOD_DAYS, PERIOD_DURATIONS
+from utils.dataset_manager import get_dataset_entry
+from utils.helper_functions import cached_cohort_tables
+
+logger = logging.getLogger(__name__)
+
+# Set REPEATRADAR_WARMUP=0 to only compute the combinations users ask for
+WARMUP_ENABLED = os.environ.get("REPEATRADAR_WARMUP", "1") == "1"
+
+# Maximum number of warm-up computations running at the same time
+WARMUP_WORKERS = int(os.environ.get("REPEATRADAR_WARMUP_WORKERS", "1"))
+
+# Periods in order of expected use, for combinations nobody has selected yet
+_PERIOD_RANK = {"M": 0, "W": 1, "Q": 2, "D": 3, "Y": 4}
+
+# How often each (cohort_period, period_duration) combination was analysed in this process
+_selection_counts = Counter()
+# Warm-up progress by (dataset_version, date_column, user_column): [done, total]
+_progress = {}
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=max(WARMUP_WORKERS, 1), thread_name_prefix="cohort-warmup")
+
+
+def record_selection(cohort_period, period_duration):
+    """
+    Count an analysis of a period combination, so warm-ups compute popular ones first.
+
+    Args:
+        cohort_period (str): Cohort grouping period
+        period_duration (int): Period duration in days
+    """
+    with _lock:
+        _selection_counts[(cohort_period, period_duration)] += 1
+
+
+def get_warmup_order():
+    """
+    Get all period combinations, most popular first.
+
+    Combinations are ranked by how often they were analysed, then by how natural the
+    duration is for the period (e.g. monthly cohorts with 30-day periods) and the period.
+
+    Returns:
+        list: (cohort_period, period_duration) tuples
+    """
+    with _lock:
+        counts = dict(_selection_counts)
+
+    def rank(combination):
+        cohort_period, period_duration = combination
+        distance = abs(math.log(period_duration / PERIOD_DAYS[cohort_period]))
+        return (-counts.get(combination, 0), distance, _PERIOD_RANK[cohort_period])
+
+    combinations = [(period, duration) for period in COHORT_PERIODS for duration in PERIOD_DURATIONS]
+    return sorted(combinations, key=rank)
+
+
+def _warm(dataset_name, data, dataset_version, date_column, user_column, cohort_period, period_duration, user_activity):
+    """Compute one combination into the result cache unless its dataset version is gone."""
+    key = (dataset_version, date_column, user_column)
+    try:
+        entry = get_dataset_entry(dataset_name)
+        if entry is not None and entry["version"] == dataset_version:
+            cached_cohort_tables(
+                data=data,
+                dataset_version=dataset_version,
+                date_column=date_column,
+                user_column=user_column,
+                cohort_period=cohort_period,
+                period_duration=period_duration,
+                user_activity=user_activity,
+                background=True,
+            )
+    except Exception:
+        logger.exception("Warm-up of %s cohorts over %s-day periods failed for dataset %s", cohort_period, period_duration, dataset_name)
+    finally:
+        with _lock:
+            _progress[key][0] += 1
+
+
+def schedule_warmup(dataset_name, data, dataset_version, date_column, user_column, user_activity=None):
+    """
+    Start warming the result cache for a loaded dataset, once per version and columns.
+
+    Args:
+        dataset_name (str): Name of the dataset
+        data (pd.DataFrame): The loaded dataset
+        dataset_version (str): Its version (see get_dataset_version)
+        date_column (str): Datetime column
+        user_column (str): User column
+        user_activity (dict, optional): Precomputed user activity of data and these columns
+    """
+    if not WARMUP_ENABLED or dataset_version is None:
+        return
+    key = (dataset_version, date_column, user_column)
+    combinations = get_warmup_order()
+    with _lock:
+        if key in _progress:
+            return
+        _progress[key] = [0, len(combinations)]
+    for cohort_period, period_duration in combinations:
+        _executor.submit(_warm, dataset_name, data, dataset_version, date_column, user_column,
+                         cohort_period, period_duration, user_activity)
+
+
+def get_warmup_progress(dataset_version, date_column, user_column):
+    """
+    Get how far the warm-up of a dataset version has got.
+
+    Returns:
+        tuple or None: (done, total) combinations, or None if no warm-up was scheduled
+    """
+    with _lock:
+        progress = _progress.get((dataset_version, date_column, user_column))
+        return tuple(progress) if progress is not None else None